@@ -1,32 +1,174 @@
+"""
+Generates a corpus of random lowercase words (one word per line), used as the input of the parallel task.
+
+Words are generated in large vectorized chunks (using numpy when it is installed), and every chunk is written with a
+single write call. Since all lines have the same length, the offset of every chunk is known in advance, so chunks are
+generated by a pool of processes and written in parallel into their place in the output file(s).
+
+Every chunk is seeded by (seed, chunk index), so the same seed produces the same corpus, regardless of the number of
+processes and shards (shards are parts of the same stream of words - concatenating them gives the single file output).
+The numpy and the pure python engines produce different words for the same seed.
+
+Usage:
+    python3 generate_random_words.py [number_of_words] [len_of_word] [file_name] [-s SEED] [-n SHARDS] [-p PROCESSES]
+"""
+import argparse
+import math
+import os
 import random
 import string
-import sys
+from multiprocessing import Pool
+from pathlib import Path
+from typing import List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 NUMBER_OF_WORDS = 10 * (2 ** 20)
 LEN_OF_WORD = 5
 FILE_NAME = "input.txt"
+# Number of words generated (and written) at once
+WORDS_PER_CHUNK = 2 ** 20
 
+ALPHABET = string.ascii_lowercase.encode()
+# Random bytes below this value are mapped to letters uniformly (the rest are discarded)
+UNBIASED_BYTE_LIMIT = 256 - 256 % len(ALPHABET)
+BYTE_TO_LETTER = bytes(ALPHABET[i % len(ALPHABET)] for i in range(256))
+BIASED_BYTES = bytes(range(UNBIASED_BYTE_LIMIT, 256))
 
-def generate_word(word_l: int) -> string:
-    return "".join(random.choices(string.ascii_lowercase, k=word_l))
+# (output file, offset in the file, chunk index, number of words)
+ChunkTask = Tuple[Path, int, int, int]
 
 
-def write_to_file(n_words: int, len_word: int, f_name: str):
-    with open(f_name, "w") as f:
-        for _ in range(n_words):
-            f.write(generate_word(len_word) + "\n")
+def generate_letters_python(rng: random.Random, number_of_letters: int) -> bytes:
+    letters = bytearray()
+    while len(letters) < number_of_letters:
+        missing = number_of_letters - len(letters)
+        # Draw a bit more than needed, since ~9% of the bytes are discarded
+        random_bytes = rng.randbytes(missing + missing // 8 + 16)
+        letters += random_bytes.translate(BYTE_TO_LETTER, BIASED_BYTES)
+    return bytes(letters[:number_of_letters])
 
 
-if __name__ == "__main__":
-    args = sys.argv[1:]
-    if len(args) > 3:
-        num_of_words = int(args[0])
-        len_of_word = int(args[1])
-        file_name = args[2]
+def generate_chunk(seed: int, chunk_index: int, n_words: int, len_word: int) -> bytes:
+    """
+    :return: n_words random words of length len_word, each followed by a newline
+    """
+    line_length = len_word + 1
+    if np is not None:
+        rng = np.random.default_rng([seed, chunk_index])
+        lines = rng.integers(ord("a"), ord("z") + 1, size=(n_words, line_length), dtype=np.uint8)
+        lines[:, -1] = ord("\n")
+        return lines.tobytes()
+
+    rng = random.Random(f"{seed}-{chunk_index}")
+    letters = generate_letters_python(rng, n_words * len_word)
+    chunk = bytearray(n_words * line_length)
+    for position in range(len_word):
+        chunk[position::line_length] = letters[position::len_word]
+    chunk[len_word::line_length] = b"\n" * n_words
+    return bytes(chunk)
+
+
+def shard_paths(f_name: str, n_shards: int) -> List[Path]:
+    path = Path(f_name)
+    if n_shards == 1:
+        return [path]
+    return [path.with_name(f"{path.stem}-{i:05d}{path.suffix}") for i in range(n_shards)]
+
+
+def plan_chunks(n_words: int, len_word: int, paths: List[Path]) -> List[ChunkTask]:
+    """
+    Divides the words into chunks, and the chunks into contiguous ranges, one per output file. The chunks are spread
+    evenly: the sizes of the ranges differ by at most one chunk (there must not be more files than chunks).
+    """
+    number_of_chunks = math.ceil(n_words / WORDS_PER_CHUNK)
+    number_of_shards = len(paths)
+    if number_of_shards > max(number_of_chunks, 1):
+        raise ValueError(f"Cannot divide {number_of_chunks} chunks of words into {number_of_shards} files")
+    line_length = len_word + 1
+
+    tasks = []
+    for chunk_index in range(number_of_chunks):
+        first_word = chunk_index * WORDS_PER_CHUNK
+        chunk_words = min(WORDS_PER_CHUNK, n_words - first_word)
+        shard_index = chunk_index * number_of_shards // number_of_chunks
+        first_chunk_of_shard = -(-shard_index * number_of_chunks // number_of_shards)
+        offset = (chunk_index - first_chunk_of_shard) * WORDS_PER_CHUNK * line_length
+        tasks.append((paths[shard_index], offset, chunk_index, chunk_words))
+    return tasks
+
+
+def write_chunk(task: ChunkTask, seed: int, len_word: int) -> int:
+    path, offset, chunk_index, n_words = task
+    chunk = generate_chunk(seed, chunk_index, n_words, len_word)
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        view = memoryview(chunk)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
+    return len(chunk)
+
+
+def _write_chunk_worker(args: Tuple[ChunkTask, int, int]) -> int:
+    return write_chunk(*args)
+
+
+def write_to_file(
+        n_words: int, len_word: int, f_name: str, seed: int, n_shards: int = 1, n_processes: int = 1
+) -> List[Path]:
+    # Every file gets at least one chunk of words
+    n_shards = min(n_shards, max(math.ceil(n_words / WORDS_PER_CHUNK), 1))
+    paths = shard_paths(f_name, n_shards)
+    tasks = plan_chunks(n_words, len_word, paths)
+
+    # Create every file in its final size, so chunks can be written in any order
+    file_sizes = {path: 0 for path in paths}
+    for path, offset, _, chunk_words in tasks:
+        file_sizes[path] = max(file_sizes[path], offset + chunk_words * (len_word + 1))
+    for path, size in file_sizes.items():
+        with open(path, "wb") as f:
+            f.truncate(size)
+
+    worker_arguments = [(task, seed, len_word) for task in tasks]
+    if n_processes == 1:
+        for arguments in worker_arguments:
+            _write_chunk_worker(arguments)
     else:
-        num_of_words = NUMBER_OF_WORDS
-        len_of_word = LEN_OF_WORD
-        file_name = "input.txt"
+        with Pool(n_processes) as pool:
+            for _ in pool.imap_unordered(_write_chunk_worker, worker_arguments):
+                pass
+
+    return paths
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate a corpus of random words")
+    parser.add_argument("number_of_words", type=int, nargs="?", default=NUMBER_OF_WORDS)
+    parser.add_argument("len_of_word", type=int, nargs="?", default=LEN_OF_WORD)
+    parser.add_argument("file_name", type=str, nargs="?", default=FILE_NAME)
+    parser.add_argument("-s", "--seed", type=int, default=None,
+                        help="Seed for a reproducible corpus (default: a random seed, printed at the end)")
+    parser.add_argument("-n", "--shards", type=int, default=1,
+                        help="Number of output files (named <file_name stem>-00000<suffix>, ...), "
+                             f"at most one per {WORDS_PER_CHUNK} words")
+    parser.add_argument("-p", "--processes", type=int, default=os.cpu_count(),
+                        help="Number of worker processes (default: number of cores)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
 
-    write_to_file(num_of_words, len_of_word, file_name)
-    print(f"{num_of_words} random words written to {file_name}")
+    output_paths = write_to_file(
+        args.number_of_words, args.len_of_word, args.file_name, seed, args.shards, args.processes
+    )
+    destination = output_paths[0] if len(output_paths) == 1 else f"{len(output_paths)} files ({output_paths[0]}, ...)"
+    print(f"{args.number_of_words} random words written to {destination} (seed: {seed})")
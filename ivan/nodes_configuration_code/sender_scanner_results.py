@@ -1,11 +1,25 @@
+import gzip
+import hashlib
+import json
 import os
 import subprocess
 import sys
+import tarfile
 import zipfile
-from typing import List
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Dict, List, NamedTuple
 
 RESULTS_DIR_PREFIX = "results_"
-OUTPUT_ZIP_NAME = "./all_results.zip"
+# Every run archives only the results that are new or changed since the previous runs, according to the manifest
+OUTPUT_DIRECTORY = "./scanner_results"
+MANIFEST_PATH = "./scanner_results_manifest.json"
+ZIP_FORMAT = "zip"  # an archive per container: <output directory>/<run time>/results_<container>.zip
+TAR_FORMAT = "tar"  # a single streamed archive: <output directory>/results-<run time>.tar.gz (or stdout)
+STREAM_TO_STDOUT = "-"
+DEFAULT_COMPRESSION_LEVEL = 6
+HASH_CHUNK_SIZE = 1024 * 1024
 
 MAIN_CONTAINERS = ["resourcemanager-1", "namenode-1", "historyserver-1"]
 
@@ -53,15 +67,124 @@ def extract_container_names(results_paths: List[str]) -> List[str]:
     ]
 
 
-def zip_directories(directories: List[str], output_path: str) -> None:
-    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for directory in directories:
-            for root, _, files in os.walk(directory):
-                for file in files:
-                    full_path = os.path.join(root, file)
-                    arcname = os.path.relpath(full_path, start=os.path.dirname(directory))
-                    zipf.write(full_path, arcname=arcname)
-    print(f"Zipped output saved to: {output_path}")
+class FileState(NamedTuple):
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class ResultFile(NamedTuple):
+    path: str
+    arcname: str
+    state: FileState
+    # False if only its modification time changed (its content is the same as in the manifest)
+    is_changed: bool
+
+
+def load_manifest(manifest_path: str) -> Dict[str, FileState]:
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as manifest_file:
+        return {path: FileState(**state) for path, state in json.load(manifest_file).items()}
+
+
+def save_manifest(manifest: Dict[str, FileState], manifest_path: str) -> None:
+    # Replace the manifest at once, so an interrupted run does not leave it half written
+    temporary_path = manifest_path + ".tmp"
+    with open(temporary_path, "w") as manifest_file:
+        json.dump({path: state._asdict() for path, state in manifest.items()}, manifest_file)
+    os.replace(temporary_path, manifest_path)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_new_result_files(directory: str, manifest: Dict[str, FileState]) -> List[ResultFile]:
+    # Files whose size and modification time did not change are skipped without reading them
+    result_files = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            full_path = os.path.join(root, file)
+            stat = os.stat(full_path)
+            previous_state = manifest.get(full_path)
+            if previous_state and (previous_state.size, previous_state.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            state = FileState(stat.st_size, stat.st_mtime_ns, hash_file(full_path))
+            arcname = os.path.relpath(full_path, start=os.path.dirname(directory))
+            is_changed = previous_state is None or previous_state.sha256 != state.sha256
+            result_files.append(ResultFile(full_path, arcname, state, is_changed))
+    return result_files
+
+
+def new_run_path(output_directory: str, prefix: str = "", suffix: str = "") -> str:
+    # Named by the time of the run, so a run never overwrites the archives of a previous one
+    run_name = prefix + datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(output_directory, run_name + suffix)
+    number = 1
+    while os.path.exists(path):
+        path = os.path.join(output_directory, f"{run_name}-{number}{suffix}")
+        number += 1
+    return path
+
+
+def zip_files(result_files: List[ResultFile], output_path: str, compression_level: int) -> None:
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compression_level) as zipf:
+        for result_file in result_files:
+            zipf.write(result_file.path, arcname=result_file.arcname)
+
+
+def zip_containers(
+        directories: List[str],
+        manifest: Dict[str, FileState],
+        output_directory: str,
+        compression_level: int,
+        workers: int,
+) -> List[ResultFile]:
+    # The containers are scanned and compressed in parallel (hashing and compression release the GIL)
+    run_directory = new_run_path(output_directory)
+
+    def zip_container(directory: str) -> List[ResultFile]:
+        result_files = find_new_result_files(directory, manifest)
+        changed_files = [result_file for result_file in result_files if result_file.is_changed]
+        if changed_files:
+            os.makedirs(run_directory, exist_ok=True)
+            output_path = os.path.join(run_directory, os.path.basename(directory) + ".zip")
+            zip_files(changed_files, output_path, compression_level)
+            print(f"Zipped {len(changed_files)} new or changed files to: {output_path}")
+        return result_files
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        files_per_container = list(executor.map(zip_container, directories))
+    return [result_file for result_files in files_per_container for result_file in result_files]
+
+
+def tar_containers(
+        directories: List[str],
+        manifest: Dict[str, FileState],
+        output: BinaryIO,
+        compression_level: int,
+        workers: int,
+) -> List[ResultFile]:
+    # The containers are scanned in parallel, and their files are written to a single stream (so it can be piped)
+    def find_container_files(directory: str) -> List[ResultFile]:
+        return find_new_result_files(directory, manifest)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        files_per_container = list(executor.map(find_container_files, directories))
+    result_files = [result_file for result_files in files_per_container for result_file in result_files]
+
+    changed_files = [result_file for result_file in result_files if result_file.is_changed]
+    with gzip.GzipFile(fileobj=output, mode="wb", compresslevel=compression_level) as compressed_output:
+        with tarfile.open(fileobj=compressed_output, mode="w|") as tar:
+            for result_file in changed_files:
+                tar.add(result_file.path, arcname=result_file.arcname, recursive=False)
+    print(f"Archived {len(changed_files)} new or changed files")
+    return result_files
 
 
 def print_given_containers(results_dirs: List[str], num_of_containers: int) -> None:
@@ -77,7 +200,20 @@ def print_given_containers(results_dirs: List[str], num_of_containers: int) -> N
         print(f"Found all expected containers: \n{found_containers}")
 
 
-def main(number_of_containers: int):
+def main(
+        number_of_containers: int,
+        archive_format: str = ZIP_FORMAT,
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        output_directory: str = OUTPUT_DIRECTORY,
+        manifest_path: str = MANIFEST_PATH,
+        workers: int = 0,
+        full: bool = False,
+):
+    stream_to_stdout = archive_format == TAR_FORMAT and output_directory == STREAM_TO_STDOUT
+    if stream_to_stdout:
+        # The archive is written to stdout, so the messages go to stderr
+        output, sys.stdout = sys.stdout.buffer, sys.stderr
+
     volume_dirs = find_recent_volume_dirs(number_of_containers)
     results_dirs = find_results_dirs(volume_dirs, number_of_containers)
 
@@ -88,14 +224,42 @@ def main(number_of_containers: int):
 
     print_given_containers(results_dirs, number_of_containers)
 
-    print(f"Zipping results from: {results_dirs}")
-    zip_directories(results_dirs, OUTPUT_ZIP_NAME)
+    manifest = {} if full else load_manifest(manifest_path)
+    workers = workers or len(results_dirs) or 1
+    print(f"Archiving the new or changed results from: {results_dirs}")
+    if archive_format == ZIP_FORMAT:
+        result_files = zip_containers(results_dirs, manifest, output_directory, compression_level, workers)
+    elif stream_to_stdout:
+        result_files = tar_containers(results_dirs, manifest, output, compression_level, workers)
+    else:
+        os.makedirs(output_directory, exist_ok=True)
+        output_path = new_run_path(output_directory, prefix="results-", suffix=".tar.gz")
+        with open(output_path, "wb") as output_file:
+            result_files = tar_containers(results_dirs, manifest, output_file, compression_level, workers)
+        print(f"Archived output saved to: {output_path}")
 
+    # The manifest is updated only after the archives are complete, so failed runs are collected again
+    manifest.update((result_file.path, result_file.state) for result_file in result_files)
+    save_manifest(manifest, manifest_path)
+    if not any(result_file.is_changed for result_file in result_files):
+        print("No new or changed results since the previous run")
 
-if __name__ == "__main__":
-    args = sys.argv
-    if len(args) < 2:
-        raise Exception("Usage: sender_scanner_results.py <number of containers>")
 
-    n_containers = int(args[1])
-    main(n_containers)
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Archive the scanner results of the containers (only the files that are new or changed since "
+                    "the previous runs)"
+    )
+    parser.add_argument("number_of_containers", type=int)
+    parser.add_argument("--format", choices=[ZIP_FORMAT, TAR_FORMAT], default=ZIP_FORMAT, dest="archive_format",
+                        help="zip: an archive per container, tar: a single streamed .tar.gz")
+    parser.add_argument("--compression_level", type=int, choices=range(0, 10), default=DEFAULT_COMPRESSION_LEVEL)
+    parser.add_argument("--output_directory", default=OUTPUT_DIRECTORY,
+                        help=f"'{STREAM_TO_STDOUT}' streams the tar archive to stdout")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, dest="manifest_path",
+                        help="The files that were already archived (their sizes, modification times and hashes)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="The number of containers archived in parallel (default: all of them)")
+    parser.add_argument("--full", action="store_true", help="Archive all results, ignoring the manifest")
+    args = parser.parse_args()
+    main(**vars(args))
@@ -1,13 +1,25 @@
 import signal
 import subprocess
+import sys
 from argparse import ArgumentParser
-from time import sleep
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from time import perf_counter
+from itertools import islice
+from typing import Optional, Dict, Any, Tuple
 
 from automatic_experiments_parameters import experiments_config, scanner_trigger_sender
-from hadoop_job_config import HadoopJobConfig
+from config_rules import PreflightCheck, PreflightReport, SkippedExperiment
+from hadoop_job_config import HadoopJobConfig, SKIP_HDFS_VALIDATION_KEY
 from trigger_sender import TriggerSender
-from jobs_configurator import ExperimentMode
+from jobs_configurator import ExperimentMode, ExperimentsGrid
+from experiments_journal import ExperimentsJournal, JournalStatus, experiment_key
+from job_monitor import JobMonitor, create_run_log_directory
+from job_scheduler import CapacityScheduler
+from job_submitters import JobSubmitter, JobSubmitterType, SubmittedJob, create_submitter
+from launch_pacing import LaunchPacer, LaunchPacing, create_pacer
+from metrics_store import JobOutputCollector, JobRunMetrics, MetricsStore, start_job
+from sequential_pipeline import SequentialPipeline
+from search_strategies import SearchStrategy, SearchStrategyType, SearchBudget, GridSearch, create_search_strategy
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,6 +34,85 @@ def setup_logger():
         logger.addHandler(handler)
 
 
+@lru_cache(maxsize=None)
+def get_metrics_store() -> Optional[MetricsStore]:
+    """
+    :return: the database of the runs' metrics (see metrics_store.py), or None if disabled in experiments_config
+    (or in a dry run)
+    """
+    if experiments_config.metrics_database_path is None or experiments_config.job_submitter == JobSubmitterType.DRY_RUN:
+        return None
+    return MetricsStore(experiments_config.metrics_database_path)
+
+
+def record_metrics(metrics: JobRunMetrics):
+    metrics_store = get_metrics_store()
+    if metrics_store is not None:
+        run_id = metrics_store.record(metrics)
+        logger.info(f"Recorded the metrics of run {run_id} (application ID: {metrics.application_id})")
+
+
+@lru_cache(maxsize=None)
+def get_journal() -> Optional[ExperimentsJournal]:
+    """
+    :return: the journal of the sweep (see experiments_journal.py), or None if disabled in experiments_config
+    (or in a dry run)
+    """
+    if experiments_config.journal_path is None or experiments_config.job_submitter == JobSubmitterType.DRY_RUN:
+        return None
+    return ExperimentsJournal(experiments_config.journal_path)
+
+
+def record_status(experiment_config: HadoopJobConfig, status: JournalStatus, session_id: Optional[str]):
+    journal = get_journal()
+    if journal is not None:
+        journal.record(experiment_config, status, session_id)
+
+
+@lru_cache(maxsize=None)
+def get_job_submitter() -> JobSubmitter:
+    """
+    :return: the backend that submits the jobs (see job_submitters.py)
+    """
+    return create_submitter(
+        experiments_config.job_submitter,
+        experiments_config.resource_manager_address,
+        experiments_config.webhdfs_address,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_job_monitor() -> Optional[JobMonitor]:
+    """
+    :return: the (started) monitor that follows the output of the jobs into their log files (see job_monitor.py),
+    or None if disabled in experiments_config (or in a dry run).
+    In sequential mode, the output is printed as well. In parallel mode, a live view of the jobs is printed instead.
+    """
+    if experiments_config.job_logs_directory is None or experiments_config.job_submitter == JobSubmitterType.DRY_RUN:
+        return None
+    is_parallel = experiments_config.mode == ExperimentMode.PARALLEL
+    return JobMonitor(
+        create_run_log_directory(experiments_config.job_logs_directory),
+        echo_to=None if is_parallel else sys.stdout,
+        live_view=is_parallel,
+    ).start()
+
+
+def create_experiments_pacer() -> LaunchPacer:
+    """
+    :return: the pacer that decides when the next job may start (see launch_pacing.py)
+    """
+    if experiments_config.job_submitter == JobSubmitterType.DRY_RUN:
+        # Nothing runs on the cluster, so there is nothing to wait for
+        return create_pacer(LaunchPacing.SLEEP, 0)
+    return create_pacer(
+        experiments_config.launch_pacing,
+        experiments_config.sleep_between_launches,
+        experiments_config.resource_manager_address,
+        experiments_config.readiness_timeout_seconds,
+    )
+
+
 def run_single_job(
     job_index: int,
     number_of_all_experiments: int,
@@ -41,11 +132,18 @@ def run_single_job(
         print(experiment_config.format_user_selection(user_selected_fields))
         print()
 
-        subprocess.run(experiment_config.get_hadoop_job_args(), check=True)
+        record_status(experiment_config, JournalStatus.STARTED, session_id)
+        job = start_job(experiment_config, get_job_submitter(), get_job_monitor(), run_index=job_index)
+        metrics = job.metrics(experiment_config, session_id, user_selected_fields)
+        record_metrics(metrics)
+        if metrics.exit_code != 0:
+            raise subprocess.CalledProcessError(metrics.exit_code, job.submitted_job.args)
+        record_status(experiment_config, JournalStatus.SUCCEEDED, session_id)
 
         print(f"\nJob has terminated successfully. {'Session ID: ' + session_id if session_id else ''}")
         print(experiment_config)
     except subprocess.CalledProcessError as e:
+        record_status(experiment_config, JournalStatus.FAILED, session_id)
         logger.warning(
             f"The execution of a Hadoop job encountered an error.\n"
             f"The job:\n{experiment_config}\nThe error: {e}\n"
@@ -88,12 +186,18 @@ def run_single_job_with_scanner(
     return is_executed_successfully
 
 
-def handle_sequential_mode(shared_session_id: Optional[str]):
+def handle_sequential_mode(
+    experiments: ExperimentsGrid,
+    search_strategy: SearchStrategy,
+    shared_session_id: Optional[str],
+    should_keep_output_directories: bool = True
+):
     """
+    The search strategy decides which experiments run, and in what order (see search_strategies.py).
     If shared session ID is provided:
         This function:
         1. starts the resource measurement code across all nodes.
-        2. runs all Hadoop jobs one by one (as defined by the user). All jobs will share the same session ID.
+        2. runs the Hadoop jobs one by one (as defined by the user). All jobs will share the same session ID.
         3. stops the resource measurement code across all nodes.
     Otherwise:
         For each Hadoop job, this function:
@@ -101,106 +205,226 @@ def handle_sequential_mode(shared_session_id: Optional[str]):
         2. starts the resource measurement code across all nodes.
         3. runs the job
         4. stops the resource measurement code across all nodes.
+    With pipeline_sequential_mode, the next experiment is prepared, and the output of the previous one is removed,
+    while a job runs (see sequential_pipeline.py). The jobs and their measurements do not overlap.
     """
     if shared_session_id:
         scanner_trigger_sender.start_measurement(session_id=shared_session_id)
 
+    pacer = create_experiments_pacer()
+    pacer.start()
     is_executed_successfully = True
-    all_experiment_configurations = experiments_config.all_experiments_configurations()
-    for experiment_index, experiment_config in enumerate(all_experiment_configurations):
-        user_selected_fields = experiments_config.user_selected_fields(experiment_config)
-
-        if shared_session_id:
-            current_execution_status = run_single_job(
-                experiment_index,
-                len(all_experiment_configurations),
-                experiment_config,
-                user_selected_fields,
-                None
-            )
-        else:
-            current_execution_status = run_single_job_with_scanner(
-                experiment_index,
-                len(all_experiment_configurations),
-                experiment_config,
-                user_selected_fields,
-            )
+    run_index = 0
+    # position -> the configuration of its first run
+    experiment_configs: Dict[int, HadoopJobConfig] = {}
+    is_pipelined = experiments_config.pipeline_sequential_mode
+    remove_output = experiments_config.remove_output if is_pipelined and not should_keep_output_directories else None
+    with SequentialPipeline(experiments, get_job_submitter(), remove_output) as pipeline:
+        while (position := search_strategy.next_experiment()) is not None:
+            repetition = search_strategy.repetition(position)
+            try:
+                experiment_config = pipeline.config(position, repetition)
+            except SkippedExperiment as e:
+                logger.info(f"Skipping experiment {experiments.indices[position] + 1}: {e}")
+                search_strategy.skip(position)
+                continue
+            if repetition:
+                experiments_config.add_repetition_output_path(experiment_config.output_path)
+            else:
+                experiment_configs[position] = experiment_config
+            if is_pipelined:
+                upcoming_position = search_strategy.upcoming_experiment()
+                pipeline.prepare(upcoming_position, search_strategy.repetition(upcoming_position))
+            user_selected_fields = experiments_config.user_selected_fields(experiment_config)
 
-        is_executed_successfully = current_execution_status and is_executed_successfully
-        sleep(experiments_config.sleep_between_launches)
+            start_time = perf_counter()
+            if shared_session_id:
+                current_execution_status = run_single_job(
+                    run_index,
+                    search_strategy.planned_runs(),
+                    experiment_config,
+                    user_selected_fields,
+                    shared_session_id
+                )
+            else:
+                current_execution_status = run_single_job_with_scanner(
+                    run_index,
+                    search_strategy.planned_runs(),
+                    experiment_config,
+                    user_selected_fields,
+                )
+            search_strategy.report(position, perf_counter() - start_time, current_execution_status)
+
+            is_executed_successfully = current_execution_status and is_executed_successfully
+            run_index += 1
+            pipeline.remove_output(experiment_config.output_path)
+            pacer.after_job()
 
     if shared_session_id:
         print(f"Terminating resource measurements. Session ID: {shared_session_id}")
         scanner_trigger_sender.stop_measurement()
 
+    if not isinstance(search_strategy, GridSearch):
+        print(format_best_trials(experiment_configs, search_strategy))
+
     return is_executed_successfully
 
 
-def handle_parallel_mode(shared_session_id: Optional[str]):
+def format_best_trials(experiment_configs: Dict[int, HadoopJobConfig], search_strategy: SearchStrategy) -> str:
+    """
+    :param experiment_configs: the configurations that ran, by position (fetching them again from the grid would
+    validate their output paths, which exist by now)
+    """
+    lines = [
+        f"\nFastest experiments ({search_strategy.runs} runs, {search_strategy.total_runtime_seconds:.0f} seconds):"
+    ]
+    for trial in search_strategy.best_trials():
+        user_selected_fields = experiments_config.user_selected_fields(experiment_configs[trial.position])
+        lines.append(
+            f"  {trial.mean_runtime_seconds:.1f} seconds (mean of {len(trial.runtimes_seconds)} runs): "
+            + ", ".join(f"{name}={value}" for name, value in sorted(user_selected_fields.items()))
+        )
+    return "\n".join(lines)
+
+
+def handle_parallel_mode(
+    experiments: ExperimentsGrid,
+    shared_session_id: Optional[str],
+    max_concurrent_jobs: Optional[int] = None,
+    max_runs: Optional[int] = None
+):
     """
     This function starts the resource measurement code across all nodes.
-    Then, run Hadoop jobs in parallel (as defined by the user).
+    Then, run Hadoop jobs in parallel (as defined by the user): a job is launched only when its containers fit the free
+    capacity of the cluster, and at most max_concurrent_jobs jobs run at a time (see job_scheduler.py).
+    The experiments run in grid order (the skipped ones, e.g., pruned by the pre-flight check, are not counted in
+    max_runs).
     Eventually, it stops the resource measurement code across all nodes.
     """
-    jobs_processes = []
+    number_of_experiments = min(len(experiments), max_runs) if max_runs is not None else len(experiments)
     scanner_trigger_sender.start_measurement(session_id=shared_session_id)
     executed_successfully = True
+    running_jobs: Dict[int, Tuple[JobOutputCollector, Dict[str, Any]]] = {}
 
-    all_experiment_configurations = experiments_config.all_experiments_configurations()
-
-    for experiment_index, experiment_config in enumerate(all_experiment_configurations):
+    def launch_job(experiment_index: int, experiment_config: HadoopJobConfig) -> SubmittedJob:
+        user_selected_fields = experiments_config.user_selected_fields(experiment_config)
+        print(
+            f"Running a new job ({experiment_index + 1} / {number_of_experiments}):\n"
+            f"{experiment_config}\n"
+        )
+        print(experiment_config.format_user_selection(user_selected_fields))
+        record_status(experiment_config, JournalStatus.STARTED, shared_session_id)
         try:
-            user_selected_fields = experiments_config.user_selected_fields(experiment_config)
-            print(
-                f"Running a new job ({experiment_index + 1} / {len(all_experiment_configurations)}):\n"
-                f"{experiment_config}\n"
-            )
-            print(experiment_config.format_user_selection(user_selected_fields))
-
-            jobs_processes.append((experiment_config, subprocess.Popen(experiment_config.get_hadoop_job_args())))
+            job = start_job(experiment_config, get_job_submitter(), get_job_monitor(), run_index=experiment_index)
         except FileNotFoundError:
             logger.error("It seems like Hadoop is not installed on this device")
             raise
-        sleep(experiments_config.sleep_between_launches)
-
-    # TODO: we might think of an enhanced technique for waiting processes as they terminate (not necessary for now).
-    for experiment_config, job_process in jobs_processes:
-        job_return_code = job_process.wait()
+        running_jobs[experiment_index] = (job, user_selected_fields)
+        return job.submitted_job
+
+    def on_job_finish(
+        experiment_index: int, experiment_config: HadoopJobConfig, job_return_code: Optional[int], runtime: float
+    ):
+        nonlocal executed_successfully
+        if experiment_index in running_jobs:
+            job, user_selected_fields = running_jobs.pop(experiment_index)
+            record_metrics(job.metrics(experiment_config, shared_session_id, user_selected_fields))
+
+        record_status(
+            experiment_config,
+            JournalStatus.SUCCEEDED if job_return_code == 0 else JournalStatus.FAILED,
+            shared_session_id
+        )
         if job_return_code == 0:
-            logger.info(f"Job has terminated successfully:\n{experiment_config}")
+            logger.info(
+                f"Job {experiment_index + 1} has terminated successfully after {runtime:.0f} seconds:\n"
+                f"{experiment_config}"
+            )
+        elif job_return_code is None:
+            # the scheduler has already logged why YARN would reject this job
+            executed_successfully = False
         else:
             executed_successfully = False
             logger.warning(
-                f"Hadoop job exited with unexpected exit code: {job_return_code}.\n"
+                f"Hadoop job {experiment_index + 1} exited with unexpected exit code: {job_return_code}.\n"
                 f"Job configuration:\n{experiment_config}"
             )
 
+    pacer = create_experiments_pacer()
+    pacer.start()
+    scheduler = CapacityScheduler(
+        experiments_config.cluster_capacity,
+        max_concurrent_jobs=max_concurrent_jobs or experiments_config.max_concurrent_jobs,
+        pacer=pacer,
+        launcher_containers=get_job_submitter().launcher_containers,
+    )
+    scheduler.run(islice(experiments, max_runs), launch_job, on_job_finish)
+
     print(f"Terminating resource measurements. {'Session ID:' + shared_session_id if shared_session_id else ''}")
     scanner_trigger_sender.stop_measurement()
     return executed_successfully
 
 
-def _run_jobs_by_mode(mode: ExperimentMode, shared_session_id: Optional[str]):
+def _run_jobs_by_mode(
+    mode: ExperimentMode,
+    experiments: ExperimentsGrid,
+    search_strategy: SearchStrategy,
+    shared_session_id: Optional[str],
+    max_concurrent_jobs: Optional[int],
+    should_keep_output_directories: bool
+):
     executed_successfully = False
     if mode == ExperimentMode.SEQUENTIAL:
-        executed_successfully = handle_sequential_mode(shared_session_id)
+        executed_successfully = handle_sequential_mode(
+            experiments, search_strategy, shared_session_id, should_keep_output_directories
+        )
     elif mode == ExperimentMode.PARALLEL:
-        executed_successfully = handle_parallel_mode(shared_session_id)
+        # The parallel mode runs the grid in order, so a budget of runs keeps the first experiments
+        executed_successfully = handle_parallel_mode(
+            experiments, shared_session_id, max_concurrent_jobs, search_strategy.budget.max_runs
+        )
 
     print(f"\nFinished automatic experiments {'successfully' if executed_successfully else 'unsuccessfully'}\n")
 
 
-def run_jobs(mode: ExperimentMode, shared_session_id: Optional[str], should_keep_output_directories: bool):
+def run_jobs(
+    mode: ExperimentMode,
+    experiments: ExperimentsGrid,
+    search_strategy: SearchStrategy,
+    shared_session_id: Optional[str],
+    should_keep_output_directories: bool,
+    max_concurrent_jobs: Optional[int] = None,
+    resume: bool = False,
+    preflight_report: Optional[PreflightReport] = None
+):
+    finished = False
+    job_monitor = get_job_monitor()
     try:
-        _run_jobs_by_mode(mode, shared_session_id)
+        prepare_journal(experiments, resume)
+        _run_jobs_by_mode(
+            mode, experiments, search_strategy, shared_session_id, max_concurrent_jobs, should_keep_output_directories
+        )
+        finished = True
     # Terminate the measurements no matter what (even if the user pressed CTRL+C)
     finally:
         try:
             # Block SIGINT (Ctrl+C) during cleanup
             original_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
 
+            if job_monitor is not None:
+                job_monitor.stop()
+                print(f"The logs and progress events of the jobs are in {job_monitor.log_directory}")
             scanner_trigger_sender.stop_measurement()
-            if not should_keep_output_directories:
+            scanner_trigger_sender.close()
+            trigger_skew_summary = scanner_trigger_sender.skew_summary()
+            if trigger_skew_summary:
+                print(trigger_skew_summary)
+            if preflight_report is not None:
+                print(preflight_report)
+            # The completed experiments are skipped by --resume, so their outputs will not be produced again
+            if not finished and get_journal() is not None:
+                print("The sweep was interrupted. Keeping the output directories, so it can continue with --resume")
+            elif not should_keep_output_directories:
                 if not experiments_config.remove_outputs():
                     logger.warning("There was an error while removing outputs")
 
@@ -210,11 +434,129 @@ def run_jobs(mode: ExperimentMode, shared_session_id: Optional[str], should_keep
             logger.critical(f"An unexpected error occurred upon stopping measurements: {e}")
 
 
-def main(print_configurations_only: bool, shared_session_id: Optional[str], should_keep_output_directories: bool):
-    if print_configurations_only:
-        print(f"\n{experiments_config}\n")
+def prepare_journal(experiments: ExperimentsGrid, resume: bool):
+    """
+    A new sweep starts a new journal. A resumed sweep removes the (possibly partial) outputs of its failed and
+    unfinished experiments, so they can run again.
+    """
+    journal = get_journal()
+    if journal is None:
+        return
+    if not resume:
+        journal.reset()
+        return
+
+    selected_output_paths = {str(experiments.output_paths[index]) for index in experiments.indices}
+    unfinished_output_paths = [path for path in journal.unfinished_output_paths() if path in selected_output_paths]
+    if not experiments_config.remove_unfinished_outputs(unfinished_output_paths):
+        logger.warning("There was an error while removing the outputs of unfinished experiments")
+
+
+def skip_completed_experiments(experiments: ExperimentsGrid, journal: ExperimentsJournal) -> ExperimentsGrid:
+    """
+    :return: the experiments, where the ones that had succeeded according to the journal (when the sweep started) are
+    skipped when they are fetched
+    """
+    completed_keys = journal.completed_keys()
+
+    def skip_completed(values: Dict[str, Any]) -> Dict[str, Any]:
+        # The output of a completed experiment exists, so it is built without checking HDFS
+        experiment_config = HadoopJobConfig.model_validate(values, context={SKIP_HDFS_VALIDATION_KEY: True})
+        if experiment_key(experiment_config) in completed_keys:
+            raise SkippedExperiment("It already succeeded according to the journal")
+        return values
+
+    return experiments.checked(skip_completed)
+
+
+def select_experiments(
+    shard: Optional[Tuple[int, int]],
+    sample_size: Optional[int],
+    sample_seed: Optional[int],
+    resume: bool = False
+) -> Tuple[ExperimentsGrid, PreflightCheck]:
+    """
+    :return: the experiments of the configured grid to run (a shard and / or a random sample of the grid), and the
+    pre-flight check (see main).
+    Inconsistent experiments are pruned or fixed (see config_rules.py).
+    When resuming, the experiments that already succeeded according to the journal are skipped.
+    Nothing is checked here: the experiments are checked when they are fetched (i.e., about to run or be printed).
+    """
+    experiments = experiments_config.all_experiments_configurations()
+    if shard:
+        experiments = experiments.shard(*shard)
+    if sample_size is not None:
+        experiments = experiments.sample(sample_size, sample_seed)
+
+    experiments, preflight_check = experiments_config.preflight(experiments)
+    if resume:
+        journal = get_journal()
+        if journal is None:
+            raise ValueError("Resuming a sweep requires a journal (set journal_path in the experiments config)")
+        print(f"Resuming: {journal.summary()}")
+        experiments = skip_completed_experiments(experiments, journal)
+    return experiments, preflight_check
+
+
+def create_experiments_search_strategy(
+    experiments: ExperimentsGrid,
+    search_strategy_type: Optional[SearchStrategyType],
+    max_runs: Optional[int],
+    max_cluster_hours: Optional[float]
+) -> SearchStrategy:
+    """
+    The command line arguments (if given) override the search parameters of experiments_config.
+    """
+    search_strategy_type = search_strategy_type or experiments_config.search_strategy
+    if search_strategy_type != SearchStrategyType.GRID and experiments_config.mode != ExperimentMode.SEQUENTIAL:
+        raise ValueError("Adaptive search strategies measure every job on its own, so they require sequential mode")
+
+    budget = SearchBudget(
+        max_runs=max_runs if max_runs is not None else experiments_config.max_runs,
+        max_cluster_hours=max_cluster_hours if max_cluster_hours is not None else experiments_config.max_cluster_hours,
+    )
+    if budget.max_cluster_hours is not None and experiments_config.mode != ExperimentMode.SEQUENTIAL:
+        raise ValueError("A budget of cluster-hours measures every job on its own, so it requires sequential mode")
+    return create_search_strategy(search_strategy_type, experiments, budget, experiments_config.search_seed)
+
+
+def main(
+    print_configurations_only: bool,
+    print_all_configurations: bool,
+    experiments: ExperimentsGrid,
+    search_strategy: SearchStrategy,
+    shared_session_id: Optional[str],
+    should_keep_output_directories: bool,
+    max_concurrent_jobs: Optional[int] = None,
+    resume: bool = False,
+    preflight_check: Optional[PreflightCheck] = None
+):
+    # The rules are checked without HDFS, so the report of all the experiments is printed before anything runs
+    preflight_report = preflight_check.check_all(experiments) if preflight_check is not None else None
+    if print_all_configurations:
+        print(f"\n{experiments_config.format_experiments(experiments)}\n")
+        if preflight_report is not None:
+            print(preflight_report)
+    elif print_configurations_only:
+        print(
+            f"\nMode: {experiments_config.mode.value}\n{experiments.summary()}\n"
+            f"Search strategy: {type(search_strategy).__name__} (up to {search_strategy.planned_runs()} runs)\n"
+        )
+        if preflight_report is not None:
+            print(preflight_report)
     else:
-        run_jobs(experiments_config.mode, shared_session_id, should_keep_output_directories)
+        if preflight_report is not None:
+            print(f"{preflight_report}\n")
+        run_jobs(
+            experiments_config.mode,
+            experiments,
+            search_strategy,
+            shared_session_id,
+            should_keep_output_directories,
+            max_concurrent_jobs,
+            resume,
+            preflight_report
+        )
 
 
 if __name__ == '__main__':
@@ -225,7 +567,14 @@ if __name__ == '__main__':
         "-p", "--print_configurations_only",
         action="store_true",
         default=False,
-        help="Print the Hadoop experiments' configuration and exit"
+        help="Print a summary of the Hadoop experiments' configuration and exit"
+    )
+
+    parser.add_argument(
+        "-a", "--print_all_configurations",
+        action="store_true",
+        default=False,
+        help="Print the full Hadoop command of every experiment and exit (validates every configuration)"
     )
 
     parser.add_argument(
@@ -243,6 +592,87 @@ if __name__ == '__main__':
              "a custom session ID, where in parallel mode a default session ID is chosen."
     )
 
+    parser.add_argument(
+        "--shard",
+        type=int,
+        nargs=2,
+        metavar=("SHARD_INDEX", "NUMBER_OF_SHARDS"),
+        default=None,
+        help="Run only every NUMBER_OF_SHARDS-th experiment, starting at SHARD_INDEX (e.g., --shard 0 2)"
+    )
+
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=None,
+        help="Run only a uniform random sample of this number of experiments"
+    )
+
+    parser.add_argument(
+        "--sample_seed",
+        type=int,
+        default=None,
+        help="A seed for choosing the same random sample again"
+    )
+
+    parser.add_argument(
+        "--search_strategy",
+        type=str.lower,  # parse lower-case user input
+        choices=[strategy.value for strategy in SearchStrategyType],
+        default=None,
+        help="Which experiments to run, and in what order (overrides the search_strategy of the experiments config). "
+             "Options: " + ", ".join(strategy.value for strategy in SearchStrategyType)
+    )
+
+    parser.add_argument(
+        "--max_runs",
+        type=int,
+        default=None,
+        help="Stop after this number of jobs (overrides the max_runs of the experiments config)"
+    )
+
+    parser.add_argument(
+        "--max_cluster_hours",
+        type=float,
+        default=None,
+        help="Stop when the total runtime of the jobs reaches this number of hours "
+             "(overrides the max_cluster_hours of the experiments config)"
+    )
+
+    parser.add_argument(
+        "--max_concurrent_jobs",
+        type=int,
+        default=None,
+        help="Run at most this number of jobs at a time in parallel mode "
+             "(overrides the max_concurrent_jobs of the experiments config)"
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Continue an interrupted sweep: skip the experiments that already succeeded according to the journal, "
+             "and rerun the failed and unfinished ones"
+    )
+
     args = parser.parse_args()
 
-    main(args.print_configurations_only, args.shared_session_id, args.keep_output_directories)
+    selected_experiments, selected_preflight_check = select_experiments(
+        args.shard, args.sample, args.sample_seed, args.resume
+    )
+    main(
+        args.print_configurations_only,
+        args.print_all_configurations,
+        selected_experiments,
+        create_experiments_search_strategy(
+            selected_experiments,
+            SearchStrategyType(args.search_strategy) if args.search_strategy else None,
+            args.max_runs,
+            args.max_cluster_hours,
+        ),
+        args.shared_session_id,
+        args.keep_output_directories,
+        args.max_concurrent_jobs,
+        args.resume,
+        selected_preflight_check
+    )
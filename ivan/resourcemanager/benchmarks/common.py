@@ -0,0 +1,194 @@
+"""
+Helpers shared by the benchmarks: deterministic inputs, running the bundled scripts, emulating the shuffle, and storing
+and comparing results (see suite.py and startup.py).
+"""
+import io
+import json
+import os
+import platform
+import random
+import resource
+import string
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional
+
+RESOURCEMANAGER_DIRECTORY = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RESOURCEMANAGER_DIRECTORY))
+
+# The resourcemanager directory should be added to the path first
+from streaming_codec import get_codec, MAP_OUTPUT_ENVIRONMENT_VARIABLE, REDUCE_INPUT_ENVIRONMENT_VARIABLE, \
+    TEXT  # noqa: E402
+
+DEFAULT_RESULTS_DIRECTORY = Path(__file__).resolve().parent / "results"
+# A result is a regression if its compared metric got worse by more than this fraction
+DEFAULT_REGRESSION_THRESHOLD = 0.1
+LEN_OF_WORD = 5
+# Every line of the pi input is the number of points a single map task samples
+POINTS_PER_PI_LINE = 1000
+
+
+def generate_words_input(
+        number_of_lines: int, words_per_line: int = 1, len_of_word: int = LEN_OF_WORD, seed: int = 0
+) -> bytes:
+    rng = random.Random(seed)
+    return "".join(
+        " ".join("".join(rng.choices(string.ascii_lowercase, k=len_of_word)) for _ in range(words_per_line)) + "\n"
+        for _ in range(number_of_lines)
+    ).encode()
+
+
+def generate_pi_input(number_of_lines: int, points_per_line: int = POINTS_PER_PI_LINE) -> bytes:
+    return f"{points_per_line}\n".encode() * number_of_lines
+
+
+def script_environment(io_format: str = TEXT, env: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    return {
+        **os.environ,
+        MAP_OUTPUT_ENVIRONMENT_VARIABLE: io_format,
+        REDUCE_INPUT_ENVIRONMENT_VARIABLE: io_format,
+        "PI_SEED": "0",
+        **(env or {}),
+    }
+
+
+class ScriptRun(NamedTuple):
+    output: bytes
+    wall_seconds: float
+    # User + system
+    cpu_seconds: float
+
+
+def run_script(
+        script_path: Path, input_data: bytes, io_format: str = TEXT, env: Optional[Dict[str, str]] = None
+) -> ScriptRun:
+    """
+    Runs a script once (in this process's environment, see script_environment), with its input and output in memory.
+    :param env: more environment variables of the script (e.g., to toggle its modes)
+    """
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(script_path)],
+        input=input_data,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=script_environment(io_format, env),
+        check=True
+    )
+    wall_seconds = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return ScriptRun(result.stdout, wall_seconds, cpu_seconds)
+
+
+def shuffle(map_output: bytes, io_format: str = TEXT) -> bytes:
+    """
+    Emulates the shuffle & sort phase: sorts the map output by its encoded keys.
+    """
+    records = get_codec(io_format).read_raw_records(io.BytesIO(map_output))
+    return b"".join(record for _, record in sorted(records, key=itemgetter(0)))
+
+
+@dataclass(frozen=True)
+class Comparison:
+    """
+    How measurements are matched with their baseline measurements, and which of their fields is compared.
+    """
+    key: Callable[[Any], Hashable]
+    metric: str
+    higher_is_better: bool
+
+    def change(self, measurement: Any, baseline_measurement: Any) -> float:
+        return getattr(measurement, self.metric) / getattr(baseline_measurement, self.metric) - 1
+
+    def is_regression(self, change: float, threshold: float) -> bool:
+        return change < -threshold if self.higher_is_better else change > threshold
+
+
+class Column(NamedTuple):
+    header: str
+    width: int
+    value: Callable[[Any], str]
+
+
+def git_revision() -> Optional[str]:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=RESOURCEMANAGER_DIRECTORY, capture_output=True, text=True
+    )
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def save_results(measurements: List[Any], output_path: Path, **metadata):
+    """
+    Stores the measurements (dataclasses) as JSON, with the environment they were measured in.
+    :param metadata: more fields to store (e.g., the number of repetitions)
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python_version": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        **metadata,
+        "measurements": [asdict(measurement) for measurement in measurements],
+    }
+    output_path.write_text(json.dumps(results, indent=2))
+
+
+def load_measurements(results_path: Path, measurement_type: type, comparison: Comparison) -> Dict[Hashable, Any]:
+    results = json.loads(results_path.read_text())
+    measurements = (measurement_type(**measurement) for measurement in results["measurements"])
+    return {comparison.key(measurement): measurement for measurement in measurements}
+
+
+def format_table(
+        measurements: List[Any],
+        columns: List[Column],
+        baseline: Dict[Hashable, Any],
+        comparison: Comparison,
+        threshold: float,
+) -> str:
+    """
+    :return: a table of the measurements, with a last column of the change against their baseline measurements
+    (marked with (!) if it is a regression)
+    """
+    def comparison_value(measurement: Any) -> str:
+        baseline_measurement = baseline.get(comparison.key(measurement))
+        if not baseline_measurement:
+            return "-"
+        change = comparison.change(measurement, baseline_measurement)
+        return f"{change:+.1%}" + (" (!)" if comparison.is_regression(change, threshold) else "")
+
+    first_column, *other_columns = [*columns, Column("vs. baseline", 12, comparison_value)]
+
+    def format_row(cells: List[str]) -> str:
+        first_cell, *other_cells = cells
+        return "|".join(
+            [f"{first_cell:<{first_column.width}}"]
+            + [f" {cell:>{column.width}} " for cell, column in zip(other_cells, other_columns)]
+        ).rstrip()
+
+    lines = [
+        format_row([column.header for column in [first_column, *other_columns]]),
+        "|".join(["-" * first_column.width] + ["-" * (column.width + 2) for column in other_columns]),
+    ]
+    for measurement in measurements:
+        lines.append(format_row([column.value(measurement) for column in [first_column, *other_columns]]))
+    return "\n".join(lines)
+
+
+def find_regressions(
+        measurements: List[Any], baseline: Dict[Hashable, Any], comparison: Comparison, threshold: float
+) -> List[Any]:
+    return [
+        measurement for measurement in measurements
+        if comparison.key(measurement) in baseline
+        and comparison.is_regression(comparison.change(measurement, baseline[comparison.key(measurement)]), threshold)
+    ]
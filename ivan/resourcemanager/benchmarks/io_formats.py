@@ -0,0 +1,56 @@
+"""
+Compares the CPU time and shuffle bytes of the text and typed bytes intermediate formats (HadoopJobConfig.io_format)
+for the word count and pi streaming jobs.
+Map outputs are sorted by their encoded keys (as Hadoop does during the shuffle) and fed to the reducers, and the
+final outputs of both formats are compared.
+
+Usage:
+    python3 io_formats.py [--number_of_words N] [--number_of_pi_mappers M] [--points_per_mapper P]
+"""
+from argparse import ArgumentParser
+
+from common import generate_pi_input, generate_words_input, RESOURCEMANAGER_DIRECTORY, run_script, shuffle
+# common adds the resourcemanager directory to the path
+from streaming_codec import TEXT, TYPED_BYTES
+
+JOBS = {
+    "word count": ("mapper.py", "reducer.py"),
+    "pi": ("mapper-pi.py", "reducer-pi.py"),
+}
+
+
+def main(number_of_words: int, number_of_pi_mappers: int, points_per_mapper: int):
+    inputs = {
+        "word count": generate_words_input(number_of_words),
+        "pi": generate_pi_input(number_of_pi_mappers, points_per_mapper),
+    }
+
+    print(f"{'Job':<12}| {'Format':<11}| {'Shuffle bytes':>13} | {'Map CPU (s)':>11} | {'Reduce CPU (s)':>14}")
+    print(f"{'-' * 12}|{'-' * 12}|{'-' * 15}|{'-' * 13}|{'-' * 16}")
+    for job_name, (mapper_name, reducer_name) in JOBS.items():
+        final_outputs = set()
+        for io_format in (TEXT, TYPED_BYTES):
+            map_run = run_script(RESOURCEMANAGER_DIRECTORY / mapper_name, inputs[job_name], io_format)
+            reduce_run = run_script(
+                RESOURCEMANAGER_DIRECTORY / reducer_name, shuffle(map_run.output, io_format), io_format
+            )
+            final_outputs.add(reduce_run.output)
+            print(
+                f"{job_name:<12}| {io_format:<11}| {len(map_run.output):>13} | "
+                f"{map_run.cpu_seconds:>11.3f} | {reduce_run.cpu_seconds:>14.3f}"
+            )
+
+        if len(final_outputs) != 1:
+            raise RuntimeError(f"The output of the {job_name} job differs between the intermediate formats")
+
+    print("\nThe final output of each job is identical for all formats")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare the intermediate formats of the streaming jobs")
+    parser.add_argument("-n", "--number_of_words", type=int, default=2 ** 20)
+    parser.add_argument("-m", "--number_of_pi_mappers", type=int, default=64)
+    parser.add_argument("-p", "--points_per_mapper", type=int, default=10_000)
+    args = parser.parse_args()
+
+    main(args.number_of_words, args.number_of_pi_mappers, args.points_per_mapper)
@@ -0,0 +1,64 @@
+"""
+Compares the map output volume (records and bytes) of the mapper modes of a job:
+- word count: with and without in-mapper combining.
+- anagrams: with and without in-mapper deduplication.
+All outputs are sorted (as Hadoop does during the shuffle) and reduced, to make sure the final outputs are identical.
+
+Usage:
+    python3 map_output_volume.py [--job {wordcount,anagrams}] [--number_of_words N] [--len_of_word L]
+                                 [--max_entries E] [--max_memory_mb M]
+"""
+from argparse import ArgumentParser
+from pathlib import Path
+
+from common import generate_words_input, RESOURCEMANAGER_DIRECTORY, run_script, shuffle
+
+# job name -> (mapper, reducer, environment variables prefix, name of the optimized mode, its toggle variable)
+JOBS = {
+    "wordcount": ("mapper.py", "reducer.py", "WORDCOUNT", "in-mapper combining", "IN_MAPPER_COMBINING"),
+    "anagrams": ("mapper-anagrams.py", "reducer-anagrams.py", "ANAGRAMS", "deduplication", "DEDUPLICATION"),
+}
+
+
+def reduce_map_output(reducer_path: Path, map_output: bytes) -> bytes:
+    return run_script(reducer_path, shuffle(map_output)).output
+
+
+def main(job: str, number_of_words: int, len_of_word: int, max_entries: int, max_memory_mb: float):
+    mapper_name, reducer_name, prefix, optimized_mode_name, toggle = JOBS[job]
+    input_data = generate_words_input(number_of_words, len_of_word=len_of_word)
+
+    modes = {
+        "word per record": {f"{prefix}_{toggle}": "0"},
+        optimized_mode_name: {
+            f"{prefix}_{toggle}": "1",
+            f"{prefix}_MAX_ENTRIES": str(max_entries),
+            f"{prefix}_MAX_MEMORY_MB": str(max_memory_mb),
+        },
+    }
+
+    reduce_outputs = {}
+    print(f"Input: {number_of_words} words of length {len_of_word} ({len(input_data)} bytes)\n")
+    print(f"{'Mode':<22}| {'Map output records':>18} | {'Map output bytes':>16} | {'Map time (s)':>12}")
+    print(f"{'-' * 22}|{'-' * 20}|{'-' * 18}|{'-' * 14}")
+    for mode_name, env in modes.items():
+        map_run = run_script(RESOURCEMANAGER_DIRECTORY / mapper_name, input_data, env=env)
+        number_of_records = map_run.output.count(b"\n")
+        print(f"{mode_name:<22}| {number_of_records:>18} | {len(map_run.output):>16} | {map_run.wall_seconds:>12.3f}")
+        reduce_outputs[mode_name] = reduce_map_output(RESOURCEMANAGER_DIRECTORY / reducer_name, map_run.output)
+
+    if len(set(reduce_outputs.values())) != 1:
+        raise RuntimeError("The reducer output differs between the mapper modes")
+    print("\nReducer output is identical for all modes")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure the map output volume of the mapper modes")
+    parser.add_argument("-j", "--job", choices=JOBS.keys(), default="wordcount")
+    parser.add_argument("-n", "--number_of_words", type=int, default=2 ** 20)
+    parser.add_argument("-l", "--len_of_word", type=int, default=5)
+    parser.add_argument("-e", "--max_entries", type=int, default=100_000)
+    parser.add_argument("-mm", "--max_memory_mb", type=float, default=64)
+    args = parser.parse_args()
+
+    main(args.job, args.number_of_words, args.len_of_word, args.max_entries, args.max_memory_mb)
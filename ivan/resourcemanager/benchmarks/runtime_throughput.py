@@ -0,0 +1,97 @@
+"""
+Compares the throughput (input records per second) of the bundled streaming scripts against their versions in a
+previous git revision (e.g., before porting them to streaming_runtime.py).
+Reducers are fed with the sorted output of the current mapper, so both versions reduce the exact same input.
+
+Usage:
+    python3 runtime_throughput.py --baseline_revision <git revision> [--number_of_lines N] [--repetitions R]
+"""
+import subprocess
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Dict, Optional
+
+from common import generate_pi_input, generate_words_input, RESOURCEMANAGER_DIRECTORY, run_script, shuffle
+
+WORDS_PER_LINE = 10
+# The pi jobs are much heavier per input line
+PI_SIZE_DIVISOR = 100
+# Both revisions run the pi mapper with the same engine
+SCRIPT_ENVIRONMENT = {"PI_ENGINE": "python"}
+
+# job name -> (mapper, reducer)
+JOBS = {
+    "word count": ("mapper.py", "reducer.py"),
+    "anagrams": ("mapper-anagrams.py", "reducer-anagrams.py"),
+    "pi": ("mapper-pi.py", "reducer-pi.py"),
+}
+
+
+def extract_revision(revision: str, destination: Path):
+    """
+    Writes the python files of the resourcemanager directory, as they were in the given git revision, to destination.
+    """
+    # Running inside the resourcemanager directory, git lists and resolves paths relatively to it
+    file_names = subprocess.run(
+        ["git", "ls-tree", "--name-only", revision],
+        cwd=RESOURCEMANAGER_DIRECTORY, capture_output=True, text=True, check=True
+    ).stdout.split()
+    for file_name in file_names:
+        if file_name.endswith(".py"):
+            content = subprocess.run(
+                ["git", "show", f"{revision}:./{file_name}"],
+                cwd=RESOURCEMANAGER_DIRECTORY, capture_output=True, check=True
+            ).stdout
+            (destination / file_name).write_bytes(content)
+
+
+def best_records_per_second(script_path: Path, input_data: bytes, repetitions: int) -> float:
+    number_of_records = input_data.count(b"\n")
+    best_time = min(
+        run_script(script_path, input_data, env=SCRIPT_ENVIRONMENT).wall_seconds for _ in range(repetitions)
+    )
+    return number_of_records / best_time
+
+
+def measure(directory: Path, inputs: Dict[str, bytes], repetitions: int) -> Dict[str, float]:
+    return {
+        script_name: best_records_per_second(directory / script_name, inputs[script_name], repetitions)
+        for script_name in inputs
+    }
+
+
+def main(baseline_revision: Optional[str], number_of_lines: int, repetitions: int):
+    inputs = {}
+    for job_name, (mapper_name, reducer_name) in JOBS.items():
+        map_input = generate_pi_input(number_of_lines // PI_SIZE_DIVISOR) if job_name == "pi" \
+            else generate_words_input(number_of_lines, WORDS_PER_LINE)
+        map_output = run_script(RESOURCEMANAGER_DIRECTORY / mapper_name, map_input, env=SCRIPT_ENVIRONMENT).output
+        inputs[mapper_name] = map_input
+        inputs[reducer_name] = shuffle(map_output)
+
+    current_results = measure(RESOURCEMANAGER_DIRECTORY, inputs, repetitions)
+    baseline_results = {}
+    if baseline_revision:
+        with tempfile.TemporaryDirectory() as baseline_directory:
+            extract_revision(baseline_revision, Path(baseline_directory))
+            baseline_results = measure(Path(baseline_directory), inputs, repetitions)
+
+    print(f"{'Script':<22}| {'Records/sec (baseline)':>22} | {'Records/sec (current)':>21} | {'Speedup':>7}")
+    print(f"{'-' * 22}|{'-' * 24}|{'-' * 23}|{'-' * 9}")
+    for script_name, current in current_results.items():
+        baseline = baseline_results.get(script_name)
+        baseline_text = f"{baseline:>22,.0f}" if baseline else f"{'-':>22}"
+        speedup_text = f"{current / baseline:>6.2f}x" if baseline else f"{'-':>7}"
+        print(f"{script_name:<22}| {baseline_text} | {current:>21,.0f} | {speedup_text}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure the throughput of the streaming scripts")
+    parser.add_argument("-b", "--baseline_revision", type=str, default=None,
+                        help="A git revision to compare against (e.g., HEAD~1)")
+    parser.add_argument("-n", "--number_of_lines", type=int, default=200_000)
+    parser.add_argument("-r", "--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    main(args.baseline_revision, args.number_of_lines, args.repetitions)
@@ -0,0 +1,113 @@
+"""
+A startup-time benchmark for the run_task.py CLI, which is invoked in loops by scripts (so its startup time is paid
+for every job).
+
+Every command is run in a fresh interpreter several times, and the benchmark records its median and best wall time.
+The commands only print (--print_command_only) or show the help, so no Hadoop, HDFS or JVM is needed.
+
+Results are stored as JSON, so a later run can be compared against them to detect regressions.
+
+Usage:
+    python3 startup.py [--repetitions R] [--output results.json] [--compare baseline.json] [--threshold 0.1]
+"""
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from common import Column, Comparison, DEFAULT_REGRESSION_THRESHOLD, DEFAULT_RESULTS_DIRECTORY, find_regressions, \
+    format_table, load_measurements, RESOURCEMANAGER_DIRECTORY, save_results
+
+RUN_TASK_PATH = RESOURCEMANAGER_DIRECTORY / "run_task.py"
+
+DEFAULT_REPETITIONS = 10
+
+# command name -> run_task.py arguments
+COMMANDS = {
+    "print command": ["--print_command_only", "--output_path", "/output/startup_benchmark"],
+    "print tuned command": [
+        "--print_command_only", "--output_path", "/output/startup_benchmark",
+        "--number_of_mappers", "4", "--map_memory_mb", "2048", "--should_compress",
+    ],
+    "help": ["--help"],
+}
+
+
+@dataclass
+class StartupMeasurement:
+    command: str
+    median_seconds: float
+    best_seconds: float
+    repetitions: int
+
+
+# A result is a regression if its median startup time grew (by more than the threshold)
+COMPARISON = Comparison(key=lambda measurement: measurement.command, metric="median_seconds", higher_is_better=False)
+COLUMNS = [
+    Column("Command", 20, lambda measurement: measurement.command),
+    Column("Median (ms)", 11, lambda measurement: f"{measurement.median_seconds * 1000:.1f}"),
+    Column("Best (ms)", 9, lambda measurement: f"{measurement.best_seconds * 1000:.1f}"),
+]
+
+def measure_command(arguments: List[str], repetitions: int) -> List[float]:
+    durations = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(RUN_TASK_PATH), *arguments],
+            cwd=RESOURCEMANAGER_DIRECTORY,
+            stdout=subprocess.DEVNULL,
+            check=True,
+        )
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_benchmark(repetitions: int) -> List[StartupMeasurement]:
+    measurements = []
+    for command, arguments in COMMANDS.items():
+        durations = measure_command(arguments, repetitions)
+        measurements.append(StartupMeasurement(
+            command=command,
+            median_seconds=statistics.median(durations),
+            best_seconds=min(durations),
+            repetitions=repetitions,
+        ))
+    return measurements
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the startup time of run_task.py, and detect regressions")
+    parser.add_argument("-r", "--repetitions", type=int, default=DEFAULT_REPETITIONS)
+    parser.add_argument(
+        "-o", "--output", type=Path, default=None,
+        help=f"Where to store the results (default: {DEFAULT_RESULTS_DIRECTORY}/startup-<timestamp>.json)"
+    )
+    parser.add_argument("-c", "--compare", type=Path, default=None, help="A previous results file to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Median startup time growth (fraction) that counts as a regression")
+    args = parser.parse_args()
+
+    output_path = args.output or DEFAULT_RESULTS_DIRECTORY / f"startup-{datetime.now():%Y%m%d-%H%M%S}.json"
+    measurements = run_benchmark(args.repetitions)
+    save_results(measurements, output_path)
+
+    baseline = load_measurements(args.compare, StartupMeasurement, COMPARISON) if args.compare else {}
+    print(format_table(measurements, COLUMNS, baseline, COMPARISON, args.threshold))
+    print(f"\nResults saved to {output_path}")
+
+    regressions = find_regressions(measurements, baseline, COMPARISON, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) of more than {args.threshold:.0%} startup time:")
+        for measurement in regressions:
+            print(f"  {measurement.command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+A micro-benchmark suite for the bundled streaming mappers and reducers, which runs on a plain Linux machine
+(no Hadoop, HDFS or JVM).
+
+Every script is fed with deterministic inputs of several sizes, and the reducers are fed with the output of their
+mapper, sorted by key (as Hadoop does during the shuffle). For every (script, size) the suite records the best of
+several repetitions of:
+- records/sec (input lines per second of wall time)
+- wall time, and CPU time (user + system)
+- peak RSS
+
+Results are stored as JSON, so a later run can be compared against them to detect regressions.
+
+Usage:
+    python3 suite.py [--sizes 10000 100000 1000000] [--repetitions R] [--output results.json]
+                     [--compare baseline.json] [--threshold 0.1]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import List
+
+from common import Column, Comparison, DEFAULT_REGRESSION_THRESHOLD, DEFAULT_RESULTS_DIRECTORY, find_regressions, \
+    format_table, generate_pi_input, generate_words_input, load_measurements, RESOURCEMANAGER_DIRECTORY, run_script, \
+    save_results, script_environment, shuffle
+# common adds the resourcemanager directory to the path
+from streaming_codec import iterate_blocks
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+WORDS_PER_LINE = 10
+# The pi jobs are much heavier per input line
+PI_SIZE_DIVISOR = 100
+
+# job name -> (mapper, reducer)
+JOBS = {
+    "word count": ("mapper.py", "reducer.py"),
+    "anagrams": ("mapper-anagrams.py", "reducer-anagrams.py"),
+    "pi": ("mapper-pi.py", "reducer-pi.py"),
+}
+
+
+@dataclass
+class Measurement:
+    script: str
+    size: int
+    input_records: int
+    records_per_second: float
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_kb: int
+
+
+# A result is a regression if its records/sec dropped (by more than the threshold)
+COMPARISON = Comparison(
+    key=lambda measurement: (measurement.script, measurement.size), metric="records_per_second", higher_is_better=True
+)
+COLUMNS = [
+    Column("Script", 20, lambda measurement: measurement.script),
+    Column("Size", 9, lambda measurement: f"{measurement.size}"),
+    Column("Records/sec", 13, lambda measurement: f"{measurement.records_per_second:,.0f}"),
+    Column("Wall (s)", 8, lambda measurement: f"{measurement.wall_seconds:.3f}"),
+    Column("CPU (s)", 8, lambda measurement: f"{measurement.cpu_seconds:.3f}"),
+    Column("Peak RSS (MB)", 13, lambda measurement: f"{measurement.peak_rss_kb / 1024:.1f}"),
+]
+
+def measure_script(script_name: str, input_path: Path, size: int) -> Measurement:
+    """
+    Runs a script once, with its input and output in files (so pipes do not distort the timing).
+    The CPU time and peak RSS are taken from the rusage of the script process itself (os.wait4).
+    """
+    with open(input_path, "rb") as input_file, tempfile.TemporaryFile() as output_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, str(RESOURCEMANAGER_DIRECTORY / script_name)],
+            stdin=input_file,
+            stdout=output_file,
+            stderr=subprocess.DEVNULL,
+            env=script_environment(),
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - start
+        # The process was reaped by wait4, so Popen must not wait for it again
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            raise RuntimeError(f"{script_name} failed with exit code {process.returncode}")
+
+    with open(input_path, "rb") as input_file:
+        input_records = sum(block.count(b"\n") for block in iterate_blocks(input_file))
+    return Measurement(
+        script=script_name,
+        size=size,
+        input_records=input_records,
+        records_per_second=input_records / wall_seconds,
+        wall_seconds=wall_seconds,
+        cpu_seconds=usage.ru_utime + usage.ru_stime,
+        peak_rss_kb=usage.ru_maxrss,
+    )
+
+
+def best_of(
+        executor: ProcessPoolExecutor, script_name: str, input_path: Path, size: int, repetitions: int
+) -> Measurement:
+    measurements = [
+        executor.submit(measure_script, script_name, input_path, size).result() for _ in range(repetitions)
+    ]
+    best = min(measurements, key=lambda measurement: measurement.wall_seconds)
+    best.peak_rss_kb = max(measurement.peak_rss_kb for measurement in measurements)
+    return best
+
+
+def run_suite(sizes: List[int], repetitions: int) -> List[Measurement]:
+    measurements = []
+    # Linux accounts the memory of the launching process to the peak RSS of a child (up to its exec), so the scripts
+    # are launched from a fresh, small process instead of this one (which holds the inputs in memory)
+    with tempfile.TemporaryDirectory() as inputs_directory, \
+            ProcessPoolExecutor(max_workers=1, mp_context=get_context("forkserver")) as executor:
+        for size in sizes:
+            for job_name, (mapper_name, reducer_name) in JOBS.items():
+                map_input = generate_pi_input(max(size // PI_SIZE_DIVISOR, 1)) if job_name == "pi" \
+                    else generate_words_input(size, WORDS_PER_LINE)
+                reduce_input = shuffle(run_script(RESOURCEMANAGER_DIRECTORY / mapper_name, map_input).output)
+
+                for script_name, input_data in ((mapper_name, map_input), (reducer_name, reduce_input)):
+                    input_path = Path(inputs_directory) / f"{script_name}.{size}.input"
+                    input_path.write_bytes(input_data)
+                    measurement = best_of(executor, script_name, input_path, size, repetitions)
+                    measurements.append(measurement)
+                    input_path.unlink()
+                    print(
+                        f"  {script_name:<20} size={size:<9} {measurement.records_per_second:>14,.0f} records/sec",
+                        file=sys.stderr
+                    )
+    return measurements
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark the streaming mappers and reducers, and detect regressions")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Input sizes (lines of words; the pi input is smaller, since every line is heavier)")
+    parser.add_argument("-r", "--repetitions", type=int, default=3)
+    parser.add_argument("-o", "--output", type=Path, default=None,
+                        help=f"Where to store the results (default: {DEFAULT_RESULTS_DIRECTORY}/<timestamp>.json)")
+    parser.add_argument("-c", "--compare", type=Path, default=None, help="A previous results file to compare against")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="Records/sec drop (fraction) that counts as a regression")
+    args = parser.parse_args()
+
+    output_path = args.output or DEFAULT_RESULTS_DIRECTORY / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    measurements = run_suite(args.sizes, args.repetitions)
+    save_results(measurements, output_path, repetitions=args.repetitions)
+
+    baseline = load_measurements(args.compare, Measurement, COMPARISON) if args.compare else {}
+    print(format_table(measurements, COLUMNS, baseline, COMPARISON, args.threshold))
+    print(f"\nResults saved to {output_path}")
+
+    regressions = find_regressions(measurements, baseline, COMPARISON, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) of more than {args.threshold:.0%} records/sec:")
+        for measurement in regressions:
+            print(f"  {measurement.script} (size={measurement.size})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
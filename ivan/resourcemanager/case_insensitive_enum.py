@@ -0,0 +1,23 @@
+from enum import Enum
+from typing import Any, Optional
+
+
+class CaseInsensitiveEnum(str, Enum):
+    """
+    A string enum that can also be instantiated by the name or value of a member in any case (e.g., from the command
+    line, or from a configuration file).
+    """
+
+    @classmethod
+    def _missing_(cls, value: Any) -> Optional["CaseInsensitiveEnum"]:
+        """
+        This function is called when you try to instantiate an enum with a value that does not appear in the enum values
+        possibilities.
+        The function search for a member whose name or value matches the string, ignoring case.
+        """
+        if isinstance(value, str):
+            for member in cls:
+                if value.lower() in (member.name.lower(), member.value.lower()):
+                    return member
+
+        return super()._missing_(value)
@@ -0,0 +1,10 @@
+#!/usr/bin/python3
+
+from streaming_runtime import OutputBuffer, group_by_key, read_records
+
+# A combiner-safe variant of reducer.py for word count.
+# Hadoop may run the combiner zero or more times on the sorted output of each map spill, so unlike the reducer, it emits
+# intermediate (word, partial count) records in the map output format - the reducer consumes them as if they came
+# from the mapper, and summing partial counts gives the same totals.
+with OutputBuffer() as output:
+    output.emit_many((word, sum(counts)) for word, counts in group_by_key(read_records(parse_text_value=int)))
@@ -0,0 +1,330 @@
+"""
+Cross-field consistency rules for 'HadoopJobConfig's, checked for every experiment of the grid before it runs.
+
+Every field of HadoopJobConfig is validated on its own, so a grid may combine values into configurations that are
+doomed: YARN rejects them, the JVM does not start, or the container is killed for exceeding its memory, only after
+the job has already spent cluster time. The pre-flight check finds these combinations and, according to the
+configured mode, reports them, prunes them (they are skipped), or fixes them by deriving the dependent values
+(e.g., lowering the maximum heap size to fit the container), pruning only the ones that cannot be fixed.
+Like the rest of the grid, the experiments are checked lazily, when they are fetched (i.e., about to run), so a sweep
+that runs a few experiments of a large grid only checks those.
+"""
+import math
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from pydantic import BaseModel, ValidationError
+
+from case_insensitive_enum import CaseInsensitiveEnum
+from hadoop_job_config import HadoopJobConfig, SKIP_HDFS_VALIDATION_KEY
+from job_scheduler import ClusterCapacity, normalize_container
+
+if TYPE_CHECKING:
+    from jobs_configurator import ExperimentsGrid
+
+# mapreduce.task.io.sort.mb is stored in 11 bits by the map task
+MAX_SORT_BUFFER_MB = 2047
+# When fixing, the sort buffer gets this fraction of the map heap (the rest is left for the mapper itself)
+FIXED_SORT_BUFFER_HEAP_FRACTION = 0.5
+MAX_FIX_PASSES = 3
+VALIDATION_RULE_NAME = "field_validation"
+
+
+class ConfigRulesMode(CaseInsensitiveEnum):
+    OFF = "off"
+    REPORT = "report"
+    PRUNE = "prune"
+    FIX = "fix"
+
+
+class SkippedExperiment(Exception):
+    """
+    Raised when an experiment that should not run is fetched from the grid (see ExperimentsGrid.checked), e.g., it was
+    pruned by the pre-flight check.
+    """
+    pass
+
+
+class RuleViolation(BaseModel):
+    rule: str
+    message: str
+    # The field values that fix the violation (None if it cannot be fixed automatically)
+    fix: Optional[Dict[str, Any]] = None
+
+
+class ConfigRule:
+    """
+    A named cross-field constraint. check() returns a violation, or None if the configuration satisfies the rule.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            check: Callable[[HadoopJobConfig, ClusterCapacity], Optional[Tuple[str, Optional[Dict[str, Any]]]]],
+    ):
+        self.name = name
+        self.description = description
+        self._check = check
+
+    def check(self, config: HadoopJobConfig, capacity: ClusterCapacity) -> Optional[RuleViolation]:
+        result = self._check(config, capacity)
+        if result is None:
+            return None
+        message, fix = result
+        return RuleViolation(rule=self.name, message=message, fix=fix)
+
+
+def _heap_fits_container(task: str):
+    def check(config: HadoopJobConfig, capacity: ClusterCapacity):
+        memory_mb = getattr(config, f"{task}_memory_mb")
+        vcores = getattr(config, f"{task}_vcores")
+        # YARN allocates (and the NodeManager enforces) the normalized container size
+        container_memory_mb, _ = normalize_container(memory_mb, vcores, capacity)
+        max_heap_mb = math.floor(container_memory_mb * config.heap_memory_ratio)
+        heap_mb = getattr(config, f"{task}_max_heap_size_mb")
+        if heap_mb <= max_heap_mb:
+            return None
+        return (
+            f"{task}_max_heap_size_mb ({heap_mb}) exceeds {task} container memory ({container_memory_mb}MB) * "
+            f"heap_memory_ratio ({config.heap_memory_ratio}) = {max_heap_mb}MB",
+            {f"{task}_max_heap_size_mb": max_heap_mb},
+        )
+    return check
+
+
+def _min_heap_below_max_heap(task: str):
+    def check(config: HadoopJobConfig, capacity: ClusterCapacity):
+        min_heap_mb = getattr(config, f"{task}_min_heap_size_mb")
+        max_heap_mb = getattr(config, f"{task}_max_heap_size_mb")
+        if min_heap_mb <= max_heap_mb:
+            return None
+        return (
+            f"{task}_min_heap_size_mb ({min_heap_mb}) exceeds {task}_max_heap_size_mb ({max_heap_mb}), "
+            f"so the JVM does not start",
+            {f"{task}_min_heap_size_mb": max_heap_mb},
+        )
+    return check
+
+
+def _gc_threads_within_vcores(task: str):
+    def check(config: HadoopJobConfig, capacity: ClusterCapacity):
+        threads = getattr(config, f"{task}_garbage_collector_threads_num")
+        vcores = getattr(config, f"{task}_vcores")
+        if threads <= vcores:
+            return None
+        return (
+            f"{task}_garbage_collector_threads_num ({threads}) exceeds {task}_vcores ({vcores})",
+            {f"{task}_garbage_collector_threads_num": vcores},
+        )
+    return check
+
+
+def _sort_buffer_fits_heap(config: HadoopJobConfig, capacity: ClusterCapacity):
+    limit_mb = min(config.map_max_heap_size_mb - 1, MAX_SORT_BUFFER_MB)
+    if config.sort_buffer_mb <= limit_mb:
+        return None
+    fixed_sort_buffer_mb = min(
+        math.floor(config.map_max_heap_size_mb * FIXED_SORT_BUFFER_HEAP_FRACTION), MAX_SORT_BUFFER_MB
+    )
+    return (
+        f"sort_buffer_mb ({config.sort_buffer_mb}) must be smaller than map_max_heap_size_mb "
+        f"({config.map_max_heap_size_mb}) and at most {MAX_SORT_BUFFER_MB}",
+        {"sort_buffer_mb": fixed_sort_buffer_mb} if fixed_sort_buffer_mb > 0 else None,
+    )
+
+
+def _containers_within_maximum_allocation(config: HadoopJobConfig, capacity: ClusterCapacity):
+    containers = {
+        "application master": (config.application_manager_memory_mb, config.application_manager_vcores),
+        "map": (config.map_memory_mb, config.map_vcores),
+        "reduce": (config.reduce_memory_mb, config.reduce_vcores),
+    }
+    max_memory_mb = min(capacity.maximum_allocation_mb, capacity.node_memory_mb)
+    max_vcores = min(capacity.maximum_allocation_vcores, capacity.node_vcores)
+    for name, (memory_mb, vcores) in containers.items():
+        memory_mb, vcores = normalize_container(memory_mb, vcores, capacity)
+        if memory_mb > max_memory_mb or vcores > max_vcores:
+            return (
+                f"the {name} container ({memory_mb}MB, {vcores} vCores) exceeds the maximum allocation "
+                f"({max_memory_mb}MB, {max_vcores} vCores), so YARN rejects the job",
+                None,
+            )
+    return None
+
+
+DEFAULT_RULES = [
+    ConfigRule(
+        "map_heap_fits_container",
+        "The map JVM heap fits the map container",
+        _heap_fits_container("map"),
+    ),
+    ConfigRule(
+        "reduce_heap_fits_container",
+        "The reduce JVM heap fits the reduce container",
+        _heap_fits_container("reduce"),
+    ),
+    ConfigRule(
+        "map_min_heap_below_max_heap",
+        "The initial map heap is not larger than the maximum map heap",
+        _min_heap_below_max_heap("map"),
+    ),
+    ConfigRule(
+        "reduce_min_heap_below_max_heap",
+        "The initial reduce heap is not larger than the maximum reduce heap",
+        _min_heap_below_max_heap("reduce"),
+    ),
+    ConfigRule(
+        "sort_buffer_fits_heap",
+        "The map-side sort buffer fits the map heap",
+        _sort_buffer_fits_heap,
+    ),
+    ConfigRule(
+        "map_gc_threads_within_vcores",
+        "The map JVM does not use more GC threads than vCores",
+        _gc_threads_within_vcores("map"),
+    ),
+    ConfigRule(
+        "reduce_gc_threads_within_vcores",
+        "The reduce JVM does not use more GC threads than vCores",
+        _gc_threads_within_vcores("reduce"),
+    ),
+    ConfigRule(
+        "containers_within_maximum_allocation",
+        "Every container fits the maximum allocation of the scheduler",
+        _containers_within_maximum_allocation,
+    ),
+]
+
+
+class ConfigRulesEngine:
+    def __init__(self, capacity: ClusterCapacity, rules: Optional[List[ConfigRule]] = None):
+        self.capacity = capacity
+        self.rules = DEFAULT_RULES if rules is None else rules
+
+    def violations(self, config: HadoopJobConfig) -> List[RuleViolation]:
+        return [violation for rule in self.rules if (violation := rule.check(config, self.capacity)) is not None]
+
+    @staticmethod
+    def _build(values: Dict[str, Any]) -> HadoopJobConfig:
+        return HadoopJobConfig.model_validate(values, context={SKIP_HDFS_VALIDATION_KEY: True})
+
+    def check_values(self, values: Dict[str, Any]) -> List[RuleViolation]:
+        """
+        :return: the violations of the configuration built from the given field values (including field validation)
+        """
+        try:
+            return self.violations(self._build(values))
+        except ValidationError as e:
+            return [RuleViolation(rule=VALIDATION_RULE_NAME, message="; ".join(error["msg"] for error in e.errors()))]
+
+    def fix_values(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        :return: the field values, where the fixable violations are fixed by deriving the dependent values
+        (fixing one violation may reveal another, e.g., a smaller heap may no longer fit the sort buffer)
+        """
+        for _ in range(MAX_FIX_PASSES):
+            try:
+                config = self._build(values)
+            except ValidationError:
+                return values
+            fixes = [violation.fix for violation in self.violations(config) if violation.fix]
+            if not fixes:
+                return values
+            values = {**values, **{name: value for fix in fixes for name, value in fix.items()}}
+        return values
+
+
+class PreflightReport(BaseModel):
+    mode: ConfigRulesMode
+    # The number of experiments checked so far
+    number_of_experiments: int = 0
+    number_of_pruned: int = 0
+    number_of_fixed: int = 0
+    violations_per_rule: Dict[str, int] = {}
+    examples: Dict[str, str] = {}  # rule -> the message of its first violation
+
+    def add(self, violations: List[RuleViolation]):
+        for violation in violations:
+            self.violations_per_rule[violation.rule] = self.violations_per_rule.get(violation.rule, 0) + 1
+            self.examples.setdefault(violation.rule, violation.message)
+
+    def __str__(self) -> str:
+        if self.mode == ConfigRulesMode.OFF:
+            return "Pre-flight checks are disabled"
+        if not self.violations_per_rule:
+            return f"Pre-flight: all {self.number_of_experiments} checked experiments are consistent"
+        lines = [
+            f"Pre-flight ({self.mode.value}): {self.number_of_experiments} checked experiments, "
+            f"{self.number_of_fixed} fixed, {self.number_of_pruned} pruned"
+        ]
+        for rule, count in sorted(self.violations_per_rule.items(), key=lambda item: -item[1]):
+            lines.append(f"  {rule}: {count} experiments, e.g., {self.examples[rule]}")
+        return "\n".join(lines)
+
+
+class PreflightCheck:
+    """
+    Checks the field values of every experiment when it is fetched from the grid (see ExperimentsGrid.checked), and
+    adds its violations to the report (once per experiment, even if it is fetched again). check_all() fills the report
+    up front.
+    """
+
+    def __init__(self, mode: ConfigRulesMode, capacity: ClusterCapacity):
+        self.mode = mode
+        self.engine = ConfigRulesEngine(capacity)
+        self.report = PreflightReport(mode=mode)
+        self._checked_output_paths: Set[str] = set()
+
+    def __call__(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        :return: the field values to build the experiment from (fixed, in fix mode)
+        :raises SkippedExperiment: if the experiment is pruned
+        """
+        output_path = str(values["output_path"])
+        is_first_check = output_path not in self._checked_output_paths
+        self._checked_output_paths.add(output_path)
+
+        violations = self.engine.check_values(values)
+        if is_first_check:
+            self.report.number_of_experiments += 1
+            self.report.add(violations)
+        if not violations or self.mode == ConfigRulesMode.REPORT:
+            return values
+
+        if self.mode == ConfigRulesMode.FIX:
+            fixed_values = self.engine.fix_values(values)
+            if not self.engine.check_values(fixed_values):
+                self.report.number_of_fixed += is_first_check
+                return fixed_values
+        self.report.number_of_pruned += is_first_check
+        raise SkippedExperiment(
+            f"Pruned by the pre-flight check: {'; '.join(violation.message for violation in violations)}"
+        )
+
+    def check_all(self, experiments: "ExperimentsGrid") -> PreflightReport:
+        """
+        Checks the field values of all the experiments (without HDFS, and without keeping their configurations), so
+        the report is complete before anything runs.
+        :return: the report
+        """
+        if self.mode != ConfigRulesMode.OFF:
+            for position in range(len(experiments)):
+                try:
+                    self(experiments.combination(position))
+                except SkippedExperiment:
+                    continue
+        return self.report
+
+
+def preflight(
+        experiments: "ExperimentsGrid", mode: ConfigRulesMode, capacity: ClusterCapacity
+) -> Tuple["ExperimentsGrid", PreflightCheck]:
+    """
+    :return: the experiments, where each is checked against the rules when it is fetched (the pruned ones raise
+    SkippedExperiment, and the fixes are applied, according to the mode), and the check, whose report is filled as the
+    experiments are checked (or by check_all())
+    """
+    check = PreflightCheck(mode, capacity)
+    if mode == ConfigRulesMode.OFF:
+        return experiments, check
+    return experiments.checked(check), check
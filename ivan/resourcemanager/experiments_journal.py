@@ -0,0 +1,131 @@
+"""
+A durable journal of the experiments of a sweep, so an interrupted sweep can be resumed (`--resume`) instead of
+starting over from the first experiment.
+
+Every change in the status of an experiment is appended to a JSON lines file, and flushed to the disk (fsync) before
+the sweep moves on:
+    {"time": "...", "status": "started", "config_hash": "4a39782487ec30bf", "output_path": "/output/output_1", ...}
+Experiments are identified by HadoopJobConfig.stable_hash() and their output path. A resumed sweep skips the
+experiments whose last status is "succeeded", and reruns the failed and unfinished ones.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+from case_insensitive_enum import CaseInsensitiveEnum
+from hadoop_job_config import HadoopJobConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = Path("/home/experiments_journal.jsonl")
+
+ExperimentKey = Tuple[str, str]  # (config hash, output path)
+
+
+class JournalStatus(CaseInsensitiveEnum):
+    STARTED = "started"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JournalEntry(BaseModel):
+    time: datetime
+    status: JournalStatus
+    config_hash: str
+    output_path: str
+    session_id: Optional[str] = None
+
+    @property
+    def key(self) -> ExperimentKey:
+        return self.config_hash, self.output_path
+
+
+def experiment_key(config: HadoopJobConfig) -> ExperimentKey:
+    return config.stable_hash(), str(config.output_path)
+
+
+class ExperimentsJournal:
+    """
+    An append-only journal of experiment statuses (see the module's docstring).
+    """
+
+    def __init__(self, path: Path = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._last_entries: Dict[ExperimentKey, JournalEntry] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with self.path.open() as journal_file:
+            for line_number, line in enumerate(journal_file, start=1):
+                try:
+                    entry = JournalEntry.model_validate_json(line)
+                except ValidationError:
+                    # e.g., the last line was cut when the machine went down
+                    logger.warning(f"Ignoring a corrupted line in the experiments journal ({self.path}:{line_number})")
+                    continue
+                self._last_entries[entry.key] = entry
+
+    def reset(self):
+        """
+        Starts a new sweep (forgets all previous experiments).
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("w") as journal_file:
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self._last_entries.clear()
+
+    def record(self, config: HadoopJobConfig, status: JournalStatus, session_id: Optional[str] = None):
+        entry = JournalEntry(
+            time=datetime.now(timezone.utc),
+            status=status,
+            config_hash=config.stable_hash(),
+            output_path=str(config.output_path),
+            session_id=session_id,
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as journal_file:
+            journal_file.write(json.dumps(entry.model_dump(mode="json")) + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self._last_entries[entry.key] = entry
+
+    def status(self, config: HadoopJobConfig) -> Optional[JournalStatus]:
+        """
+        :return: the last recorded status of the experiment, or None if it has never started
+        """
+        entry = self._last_entries.get(experiment_key(config))
+        return entry.status if entry else None
+
+    def is_completed(self, config: HadoopJobConfig) -> bool:
+        return self.status(config) == JournalStatus.SUCCEEDED
+
+    def completed_keys(self) -> Set[ExperimentKey]:
+        """
+        :return: the keys of the experiments that succeeded so far (a snapshot, see experiment_key)
+        """
+        return {key for key, entry in self._last_entries.items() if entry.status == JournalStatus.SUCCEEDED}
+
+    def unfinished_output_paths(self) -> List[str]:
+        """
+        :return: the output paths of the experiments that failed or were interrupted (they may hold partial outputs)
+        """
+        return [
+            entry.output_path for entry in self._last_entries.values() if entry.status != JournalStatus.SUCCEEDED
+        ]
+
+    def summary(self) -> str:
+        counts = {status: 0 for status in JournalStatus}
+        for entry in self._last_entries.values():
+            counts[entry.status] += 1
+        return (
+            f"{counts[JournalStatus.SUCCEEDED]} succeeded, {counts[JournalStatus.FAILED]} failed and "
+            f"{counts[JournalStatus.STARTED]} unfinished experiments in {self.path}"
+        )
@@ -0,0 +1,379 @@
+"""
+An external merge sort for map output, which emulates the map side sort of Hadoop (MapOutputBuffer and Merger).
+
+Records are collected into an in-memory buffer of `sort_buffer_mb` (mapreduce.task.io.sort.mb). Once the buffer is
+`spill_percent` full (mapreduce.map.sort.spill.percent), it is sorted by (partition, key) and spilled to disk as a
+sorted run, holding one segment per partition. When the input ends, the segments of each partition are merged, at most
+`io_sort_factor` (mapreduce.task.io.sort.factor) segments at a time, using a heap-based k-way merge, into a single
+output file with one segment per partition. Segments may be compressed (mapreduce.map.output.compress).
+
+Like Merger, the first intermediate pass merges just enough segments so that every later pass merges exactly
+`io_sort_factor` segments, and the smallest segments are merged first.
+
+Usage (reads map output from stdin, writes the sorted output to stdout, and reports statistics to stderr):
+    python3 external_sort.py [-sb SORT_BUFFER_MB] [-f IO_SORT_FACTOR] [-c] [-mcc CODEC] [-io FORMAT] [-r PARTITIONS]
+"""
+import bz2
+import heapq
+import io
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from hadoop_job_config import CompressionCodec, IOFormat
+from streaming_codec import get_codec
+
+# Hadoop accounts 16 bytes of metadata (partition, key / value offsets) for every record in the sort buffer
+RECORD_METADATA_BYTES = 16
+DEFAULT_SPILL_PERCENT = 0.8
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# The closest python implementation for each codec (codecs without a standard library implementation are unsupported)
+COMPRESSORS: Dict[CompressionCodec, Tuple[Callable[[], Any], Callable[[], Any]]] = {
+    CompressionCodec.DEFAULT: (zlib.compressobj, zlib.decompressobj),
+    CompressionCodec.GZIP: (lambda: zlib.compressobj(wbits=31), lambda: zlib.decompressobj(wbits=31)),
+    CompressionCodec.BZIP2: (bz2.BZ2Compressor, bz2.BZ2Decompressor),
+}
+
+
+@dataclass
+class Segment:
+    """
+    A sorted sequence of records of a single partition, stored in a file at [offset, offset + length)
+    """
+    path: Path
+    offset: int
+    length: int
+    raw_length: int
+
+
+@dataclass
+class SortStatistics:
+    """
+    spilled_records counts every record written to disk (spills, intermediate merges and the output file), like
+    Hadoop's "Spilled Records" counter. merge_passes counts the intermediate passes of all partitions, plus the final
+    merge into the output file.
+    """
+    input_records: int = 0
+    input_bytes: int = 0
+    spills: int = 0
+    spilled_records: int = 0
+    merge_passes: int = 0
+    bytes_written: int = 0
+    combine_input_records: int = 0
+    combine_output_records: int = 0
+
+    def __str__(self) -> str:
+        return "\n".join(f"{name}={value}" for name, value in vars(self).items())
+
+
+class _SegmentReader:
+    """
+    A minimal file-like object that reads (and decompresses) a single segment in chunks.
+    """
+
+    def __init__(self, segment: Segment, decompressor_factory: Optional[Callable[[], Any]]):
+        self._file = open(segment.path, "rb")
+        self._file.seek(segment.offset)
+        self._remaining = segment.length
+        self._decompressor = decompressor_factory() if decompressor_factory else None
+
+    def read(self, size: int = COPY_CHUNK_SIZE) -> bytes:
+        while self._remaining > 0:
+            chunk = self._file.read(min(size, self._remaining))
+            self._remaining -= len(chunk)
+            if not chunk:
+                break
+            if self._decompressor is None:
+                return chunk
+            data = self._decompressor.decompress(chunk)
+            if data:
+                return data
+
+        self.close()
+        return b""
+
+    def close(self):
+        self._file.close()
+
+
+def _read_records(
+        codec: Any, segment: Segment, decompressor_factory: Optional[Callable[[], Any]]
+) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    :return: the (key, record) pairs of the segment, where the segment's file is closed even if it is not read to the
+    end (once the generator is closed)
+    """
+    reader = _SegmentReader(segment, decompressor_factory)
+    try:
+        yield from codec.read_raw_records(reader)
+    finally:
+        reader.close()
+
+
+class ExternalSorter:
+    """
+    Collects (partition, key, record) entries, and produces a single sorted output file with a segment per partition.
+    Keys and records are encoded bytes (see streaming_codec.read_raw_records), so the sort order is the raw byte order.
+    Like Hadoop, an optional combiner runs on the records of each partition whenever the buffer is spilled (it is not
+    run again while merging spills).
+    """
+
+    def __init__(
+            self,
+            number_of_partitions: int = 1,
+            sort_buffer_mb: int = 100,
+            io_sort_factor: int = 10,
+            io_format: IOFormat = IOFormat.TEXT,
+            compression_codec: Optional[CompressionCodec] = None,
+            spill_percent: float = DEFAULT_SPILL_PERCENT,
+            work_directory: Optional[Path] = None,
+            combine: Optional[Callable[[bytes], bytes]] = None,
+    ):
+        if io_sort_factor < 2:
+            raise ValueError("io_sort_factor must be at least 2")
+        if compression_codec is not None and compression_codec not in COMPRESSORS:
+            raise ValueError(
+                f"Compression codec {compression_codec.name} is not supported locally. "
+                f"Options: {', '.join(codec.name for codec in COMPRESSORS)}"
+            )
+
+        self.number_of_partitions = number_of_partitions
+        self.io_sort_factor = io_sort_factor
+        self.spill_threshold_bytes = int(sort_buffer_mb * 1024 * 1024 * spill_percent)
+        self.statistics = SortStatistics()
+        # Receives the encoded, sorted records of a partition, and returns the encoded combined records
+        self._combine = combine
+
+        self._codec = get_codec(io_format.value)
+        self._compressor_factory, self._decompressor_factory = (
+            COMPRESSORS[compression_codec] if compression_codec else (None, None)
+        )
+        self._owns_work_directory = work_directory is None
+        self._work_directory = Path(tempfile.mkdtemp(prefix="external_sort_")) if work_directory is None \
+            else work_directory
+        self._buffer: List[Tuple[int, bytes, bytes]] = []
+        self._buffered_bytes = 0
+        # partition -> segments of that partition, one per spill (or intermediate merge)
+        self._segments: List[List[Segment]] = [[] for _ in range(number_of_partitions)]
+        self._number_of_files = 0
+
+    def add(self, partition: int, key: bytes, record: bytes):
+        self._buffer.append((partition, key, record))
+        self._buffered_bytes += len(record) + RECORD_METADATA_BYTES
+        self.statistics.input_records += 1
+        self.statistics.input_bytes += len(record)
+        if self._buffered_bytes >= self.spill_threshold_bytes:
+            self._spill()
+
+    def add_records(self, records: Iterator[Tuple[bytes, bytes]], partitioner: Callable[[bytes], int]):
+        for key, record in records:
+            self.add(partitioner(key), key, record)
+
+    def _new_file_path(self) -> Path:
+        self._number_of_files += 1
+        return self._work_directory / f"spill{self._number_of_files}.out"
+
+    def _write_segment(self, output_file: BinaryIO, path: Path, records: Iterator[bytes]) -> Segment:
+        offset = output_file.tell()
+        raw_length = 0
+        compressor = self._compressor_factory() if self._compressor_factory else None
+        for chunk, number_of_records in _chunked(records):
+            raw_length += len(chunk)
+            self.statistics.spilled_records += number_of_records
+            output_file.write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            output_file.write(compressor.flush())
+
+        length = output_file.tell() - offset
+        self.statistics.bytes_written += length
+        return Segment(path, offset, length, raw_length)
+
+    def _spill(self, path: Optional[Path] = None) -> List[Segment]:
+        """
+        Sorts the buffer and writes it to a file with a segment per partition (running the combiner on each segment).
+        :return: the segments of the spill
+        """
+        self._buffer.sort(key=itemgetter(0, 1))
+        path = path or self._new_file_path()
+        spill_segments = []
+        with open(path, "wb") as spill_file:
+            start = 0
+            for partition in range(self.number_of_partitions):
+                end = start
+                while end < len(self._buffer) and self._buffer[end][0] == partition:
+                    end += 1
+                records = [entry[2] for entry in self._buffer[start:end]]
+                if self._combine and records:
+                    records = self._run_combiner(records)
+                spill_segments.append(self._write_segment(spill_file, path, iter(records)))
+                self._segments[partition].append(spill_segments[-1])
+                start = end
+
+        self.statistics.spills += 1
+        self._buffer = []
+        self._buffered_bytes = 0
+        return spill_segments
+
+    def _run_combiner(self, records: List[bytes]) -> List[bytes]:
+        combined = [record for _, record in self._codec.read_raw_records(io.BytesIO(self._combine(b"".join(records))))]
+        self.statistics.combine_input_records += len(records)
+        self.statistics.combine_output_records += len(combined)
+        return combined
+
+    def _read_segment(self, segment: Segment) -> Iterator[Tuple[bytes, bytes]]:
+        return _read_records(self._codec, segment, self._decompressor_factory)
+
+    def _merge_segments(self, segments: List[Segment]) -> Iterator[bytes]:
+        readers = [_SegmentReader(segment, self._decompressor_factory) for segment in segments]
+        try:
+            merged = heapq.merge(*(self._codec.read_raw_records(reader) for reader in readers), key=itemgetter(0))
+            for _, record in merged:
+                yield record
+        finally:
+            for reader in readers:
+                reader.close()
+
+    def _pass_factor(self, number_of_segments: int, pass_number: int) -> int:
+        """
+        Like Merger.getPassFactor: the first pass merges just enough segments, so that all later passes merge
+        exactly io_sort_factor segments.
+        """
+        if pass_number > 1 or number_of_segments <= self.io_sort_factor:
+            return self.io_sort_factor
+        remainder = (number_of_segments - 1) % (self.io_sort_factor - 1)
+        return self.io_sort_factor if remainder == 0 else remainder + 1
+
+    def _reduce_to_merge_factor(self, segments: List[Segment]) -> List[Segment]:
+        """
+        Runs intermediate merge passes (written to disk) until at most io_sort_factor segments are left.
+        """
+        pass_number = 1
+        while len(segments) > self.io_sort_factor:
+            segments.sort(key=lambda segment: segment.raw_length)
+            pass_factor = self._pass_factor(len(segments), pass_number)
+            to_merge, segments = segments[:pass_factor], segments[pass_factor:]
+
+            path = self._new_file_path()
+            with open(path, "wb") as merge_file:
+                segments.append(self._write_segment(merge_file, path, self._merge_segments(to_merge)))
+            self.statistics.merge_passes += 1
+            pass_number += 1
+
+        return segments
+
+    def finish(self, output_path: Path) -> List[Segment]:
+        """
+        Writes the sorted output file, and returns its segments (index i holds the segment of partition i).
+        """
+        if self.statistics.spills == 0:
+            # Everything fits in memory - the single spill is the output file
+            return self._spill(output_path)
+
+        if self._buffer:
+            self._spill()
+        output_segments = []
+        with open(output_path, "wb") as output_file:
+            for partition_segments in self._segments:
+                segments = self._reduce_to_merge_factor(list(partition_segments))
+                output_segments.append(
+                    self._write_segment(output_file, output_path, self._merge_segments(segments))
+                )
+        self.statistics.merge_passes += 1
+        return output_segments
+
+    def read_partition(self, segment: Segment) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        :return: the (key, record) pairs of a segment of the output file
+        """
+        return self._read_segment(segment)
+
+    def close(self):
+        if self._owns_work_directory:
+            shutil.rmtree(self._work_directory, ignore_errors=True)
+
+    def __enter__(self) -> "ExternalSorter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_segment(
+        segment: Segment,
+        io_format: IOFormat = IOFormat.TEXT,
+        compression_codec: Optional[CompressionCodec] = None
+) -> Iterator[Tuple[bytes, bytes]]:
+    """
+    :return: the (key, record) pairs of a segment written by an ExternalSorter with the same format and codec
+    """
+    decompressor_factory = COMPRESSORS[compression_codec][1] if compression_codec else None
+    return _read_records(get_codec(io_format.value), segment, decompressor_factory)
+
+
+def _chunked(records: Iterator[bytes], chunk_size: int = COPY_CHUNK_SIZE) -> Iterator[Tuple[bytes, int]]:
+    """
+    Joins records into chunks of about chunk_size bytes.
+    :return: (chunk, number of records in the chunk) pairs
+    """
+    chunk = []
+    chunk_length = 0
+    for record in records:
+        chunk.append(record)
+        chunk_length += len(record)
+        if chunk_length >= chunk_size:
+            yield b"".join(chunk), len(chunk)
+            chunk = []
+            chunk_length = 0
+    if chunk:
+        yield b"".join(chunk), len(chunk)
+
+
+def main():
+    parser = ArgumentParser(description="Sort map output like Hadoop's map side sort, and report spills and merges")
+    parser.add_argument("-sb", "--sort_buffer_mb", type=float, default=100, help="Sort buffer size (MB)")
+    parser.add_argument("-f", "--io_sort_factor", type=int, default=10, help="Maximum segments merged at once")
+    parser.add_argument("-sp", "--spill_percent", type=float, default=DEFAULT_SPILL_PERCENT,
+                        help="Fraction of the sort buffer that triggers a spill")
+    parser.add_argument("-c", "--should_compress", action="store_true", help="Compress spills and the output")
+    parser.add_argument("-mcc", "--map_compress_codec", type=str.upper, default=CompressionCodec.DEFAULT.name,
+                        choices=[codec.name for codec in COMPRESSORS], help="Compression codec")
+    parser.add_argument("-io", "--io_format", type=str.lower, default=IOFormat.TEXT.value,
+                        choices=[io_format.value for io_format in IOFormat], help="Format of the map output records")
+    parser.add_argument("-r", "--number_of_partitions", type=int, default=1,
+                        help="Number of partitions (reducers). Records are hash-partitioned by key")
+    args = parser.parse_args()
+
+    io_format = IOFormat(args.io_format)
+    compression_codec = CompressionCodec[args.map_compress_codec] if args.should_compress else None
+    sorter = ExternalSorter(
+        number_of_partitions=args.number_of_partitions,
+        sort_buffer_mb=args.sort_buffer_mb,
+        io_sort_factor=args.io_sort_factor,
+        io_format=io_format,
+        compression_codec=compression_codec,
+        spill_percent=args.spill_percent,
+    )
+
+    with sorter, tempfile.TemporaryDirectory() as output_directory:
+        sorter.add_records(
+            get_codec(io_format.value).read_raw_records(sys.stdin.buffer),
+            lambda key: zlib.crc32(key) % args.number_of_partitions
+        )
+        output_path = Path(output_directory) / "file.out"
+        for segment in sorter.finish(output_path):
+            for _, record in sorter.read_partition(segment):
+                sys.stdout.buffer.write(record)
+        sys.stdout.buffer.flush()
+        sys.stderr.write(f"{sorter.statistics}\noutput_bytes={os.path.getsize(output_path)}\n")
+
+
+if __name__ == "__main__":
+    main()
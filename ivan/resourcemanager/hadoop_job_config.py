@@ -1,17 +1,27 @@
 import argparse
-import inspect
+import hashlib
 import shlex
-import subprocess
 from enum import Enum
 from pathlib import Path
-from typing import List, Optional, Type, Dict, Any
+from typing import List, Optional, Type, Dict, Any, Union, get_args, get_origin
 import re
 
-from pydantic import BaseModel, Field, model_validator, field_validator
+from pydantic import BaseModel, Field, model_validator, field_validator, ValidationInfo
+
+from hdfs_backends import HdfsBackend, HdfsBackendType, create_backend
 
 GENERAL_GROUP = "General"
 HUMAN_READABLE_KEY = "human_readable"
+# Pass {SKIP_HDFS_VALIDATION_KEY: True} as the validation context to skip checks against HDFS (e.g., for local runs)
+SKIP_HDFS_VALIDATION_KEY = "skip_hdfs_validation"
+# Pass {HDFS_BACKEND_KEY: <HdfsBackend>} as the validation context to choose how paths are checked against HDFS
+HDFS_BACKEND_KEY = "hdfs_backend"
 HDFS_NAMENODE = "hdfs://namenode-1:9000"
+# Used when the validation context does not provide a backend (a `hdfs dfs -test -e` process per path)
+DEFAULT_HDFS_BACKEND = create_backend(HdfsBackendType.CLI)
+
+# Helper modules imported by the bundled mappers and reducers, shipped to the task nodes alongside them
+STREAMING_SUPPORT_FILES = [Path("/home/streaming_codec.py"), Path("/home/streaming_runtime.py")]
 
 units = {
     "B": 1,
@@ -93,6 +103,25 @@ class GarbageCollector(str, Enum):
         return super()._missing_(value)
 
 
+class IOFormat(str, Enum):
+    TEXT = "text"
+    TYPED_BYTES = "typedbytes"
+
+    @classmethod
+    def _missing_(cls, value: str) -> Optional["IOFormat"]:
+        """
+        This function is called when you try to instantiate an enum with a string value that does not appear in the
+        enum values possibilities.
+        The function search for compatible field names and return that field if it found one.
+        """
+        if isinstance(value, str):
+            for member in cls:
+                if member.name.lower() == value.lower(): # noqa: we are inheriting from str and Enum
+                    return member   # noqa: we are inheriting from str and Enum
+
+        return super()._missing_(value)
+
+
 class Groups(str, Enum):
     TASK_DEFINITION = "Task Definition Settings"
     PARALLELISM_AND_SCHEDULING = "Parallelism & Scheduling Settings"
@@ -115,33 +144,42 @@ class HadoopJobConfig(BaseModel):
 
     # Task Definition
     input_path: Path = Field(
-        default="/input",
+        default=Path("/input"),
         alias="i",
         title=Groups.TASK_DEFINITION.value,
         description="HDFS path to the input directory"
     )
 
     output_path: Path = Field(
-        default="/output",
+        default=Path("/output"),
         alias="o",
         title=Groups.TASK_DEFINITION.value,
         description="HDFS path to the output directory",
     )
 
     mapper_path: Path = Field(
-        default="/home/mapper.py",
+        default=Path("/home/mapper.py"),
         alias="mp",
         title=Groups.TASK_DEFINITION.value,
         description="Path to the mapper implementation",
     )
 
     reducer_path: Path = Field(
-        default="/home/reducer.py",
+        default=Path("/home/reducer.py"),
         alias="rp",
         title=Groups.TASK_DEFINITION.value,
         description="Path to the reducer implementation",
     )
 
+    combiner_path: Optional[Path] = Field(
+        default=None,
+        alias="cp",
+        title=Groups.TASK_DEFINITION.value,
+        description="Path to the combiner implementation (no combiner by default). "
+                    "The combiner runs on the sorted map output of each spill, so it must be safe to run zero or more "
+                    "times - its output must have the same format as the map output (e.g., /home/combiner.py)",
+    )
+
     # Parallelism & Scheduling
     number_of_mappers: int = Field(
         default=2,
@@ -340,10 +378,10 @@ class HadoopJobConfig(BaseModel):
     # Shuffle & Compression
     io_sort_factor: int = Field(
         default=10,
-        gt=0,
+        ge=2,
         alias="f",
         title=Groups.SHUFFLE_AND_COMPRESSION.value,
-        description="Number of streams merged simultaneously during map output sort.",
+        description="Number of streams merged simultaneously during map output sort (at least 2).",
     )
 
     should_compress: bool = Field(
@@ -362,6 +400,15 @@ class HadoopJobConfig(BaseModel):
                     "Options: " + ", ".join(f"{c.name} ('{c.value}')" for c in CompressionCodec)
     )
 
+    io_format: IOFormat = Field(
+        default=IOFormat.TEXT,
+        alias="io",
+        title=Groups.SHUFFLE_AND_COMPRESSION.value,
+        description="Format of the intermediate records (map output and reduce input). "
+                    "Binary formats let numeric values cross the shuffle without text formatting and parsing. "
+                    "Options: " + ", ".join(f"{io.name} ('{io.value}')" for io in IOFormat)
+    )
+
     # JVM & Garbage Collection Settings
     map_garbage_collector: GarbageCollector = Field(
         default=GarbageCollector.ParallelGC,
@@ -407,15 +454,20 @@ class HadoopJobConfig(BaseModel):
         return self
 
     @field_validator("output_path", mode="after")
-    def ensure_no_output_path(cls, output_path: str) -> str:
-        if cls.hdfs_path_exists(Path(HDFS_NAMENODE) / Path(output_path)):
+    def ensure_no_output_path(cls, output_path: str, info: ValidationInfo) -> str:
+        if info.context and info.context.get(SKIP_HDFS_VALIDATION_KEY):
+            return output_path
+
+        # The default file system of the cluster is HDFS_NAMENODE, so absolute paths are resolved against it
+        hdfs_backend = info.context.get(HDFS_BACKEND_KEY) if info.context else None
+        if cls.hdfs_path_exists(Path(output_path), hdfs_backend):
             raise FileExistsError(f"Output path already exists: {output_path}")
 
         return output_path
 
     @classmethod
-    def from_argparse(cls, args: argparse.Namespace) -> "HadoopJobConfig":
-        return cls.model_validate(vars(args).copy())
+    def from_argparse(cls, args: argparse.Namespace, context: Optional[Dict[str, Any]] = None) -> "HadoopJobConfig":
+        return cls.model_validate(vars(args).copy(), context=context)
 
     @staticmethod
     def _to_argparse_add_enum_argument(
@@ -475,22 +527,28 @@ class HadoopJobConfig(BaseModel):
             help=f"{help_text} (default: {field_default})"
         )
 
+    @staticmethod
+    def _unwrap_optional(arg_type):
+        """
+        :return: T for Optional[T] annotations (argparse needs a callable type), otherwise the annotation as-is
+        """
+        if get_origin(arg_type) is Union:
+            non_none_types = [t for t in get_args(arg_type) if t is not type(None)]
+            if len(non_none_types) == 1:
+                return non_none_types[0]
+        return arg_type
+
     @staticmethod
     def _is_enum_argument(arg_type) -> bool:
-        return inspect.isclass(arg_type) and issubclass(arg_type, Enum)
+        return isinstance(arg_type, type) and issubclass(arg_type, Enum)
 
     @staticmethod
     def _is_human_readable_argument(metadata) -> bool:
         return metadata.get(HUMAN_READABLE_KEY, False)
 
     @staticmethod
-    def hdfs_path_exists(path: Path) -> bool:
-        result = subprocess.run(
-            ["hdfs", "dfs", "-test", "-e", str(path)],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-        return result.returncode == 0
+    def hdfs_path_exists(path: Path, hdfs_backend: Optional[HdfsBackend] = None) -> bool:
+        return (hdfs_backend or DEFAULT_HDFS_BACKEND).exists(path)
 
     @classmethod
     def to_argparse(cls) -> argparse.ArgumentParser:
@@ -516,7 +574,7 @@ class HadoopJobConfig(BaseModel):
 
             help_text = field.description if field.description else ""
             field_default = field.default
-            arg_type = field.annotation
+            arg_type = cls._unwrap_optional(field.annotation)
 
             if cls._is_enum_argument(arg_type):             # Handle Enums (case-insensitive)
                 cls._to_argparse_add_enum_argument(group, field_default, flags, help_text, arg_type)
@@ -539,6 +597,14 @@ class HadoopJobConfig(BaseModel):
         cleaned_cmd = re.sub(r"\s+", " ", job_str.strip())
         return shlex.split(cleaned_cmd)
 
+    def stable_hash(self) -> str:
+        """
+        :return: a hash of the job's parameters, identical across runs and processes (unlike hash()).
+        The output path is excluded, so the same configuration has the same hash in different sweeps.
+        """
+        parameters = self.model_dump_json(exclude={"output_path"})
+        return hashlib.sha256(parameters.encode()).hexdigest()[:16]
+
     @classmethod
     def format_user_selection(cls, user_selection: Dict[str, Any]) -> str:
         """
@@ -582,6 +648,14 @@ class HadoopJobConfig(BaseModel):
 
         return header + "\n" + "\n".join(rows)
 
+    def _combiner_args(self) -> str:
+        if self.combiner_path is None:
+            return ""
+        return f"  -combiner {self.combiner_path}\n  -file {self.combiner_path}"
+
+    def _support_files_args(self) -> str:
+        return "\n".join(f"  -file {support_file}" for support_file in STREAMING_SUPPORT_FILES)
+
     def __str__(self) -> str:
         return f"""
 hadoop jar /opt/hadoop-3.4.1/share/hadoop/tools/lib/hadoop-streaming-3.4.1.jar
@@ -598,6 +672,8 @@ hadoop jar /opt/hadoop-3.4.1/share/hadoop/tools/lib/hadoop-streaming-3.4.1.jar
   -D mapreduce.task.io.sort.factor={self.io_sort_factor}
   -D mapreduce.map.output.compress={str(self.should_compress).lower()}
   -D mapreduce.map.output.compress.codec={self.map_compress_codec.value}
+  -D stream.map.output={self.io_format.value}
+  -D stream.reduce.input={self.io_format.value}
   -D mapreduce.input.fileinputformat.split.minsize={self.min_split_size}
   -D mapreduce.input.fileinputformat.split.maxsize={self.max_split_size}
   -D mapreduce.reduce.shuffle.parallelcopies={self.shuffle_copies}
@@ -612,4 +688,6 @@ hadoop jar /opt/hadoop-3.4.1/share/hadoop/tools/lib/hadoop-streaming-3.4.1.jar
   -reducer {self.reducer_path}
   -file {self.mapper_path}
   -file {self.reducer_path}
+{self._combiner_args()}
+{self._support_files_args()}
 """
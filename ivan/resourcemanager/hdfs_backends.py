@@ -0,0 +1,404 @@
+"""
+Pluggable backends for querying the status of HDFS paths (e.g., whether a job's output path already exists), and for
+removing them (e.g., the output paths of the experiments).
+
+Running `hdfs dfs -test -e <path>` starts a JVM for every path, which takes seconds. Validating a large experiments
+grid this way spends minutes just starting JVMs, so the backends here answer many paths at once:
+- CliHdfsBackend: the original behaviour, a `hdfs dfs -test -e` (or `hdfs dfs -rm -r -f`) process per path.
+- BatchedCliHdfsBackend: a single `hdfs dfs -ls -d <path> <path> ...` (or `hdfs dfs -rm -r -f <path> <path> ...`)
+  process for all paths.
+- WebHdfsBackend: the WebHDFS REST API of the namenode (enabled in hadoop.env), a single LISTSTATUS request per
+  distinct parent directory, and concurrent DELETE requests.
+- FakeHdfsBackend: an in-memory set of paths (with a trash), for tests and local runs.
+Any backend can be wrapped with CachedHdfsBackend, which remembers answers for a short time.
+
+The HTTP and thread pool modules are imported by the backends that use them, since every CLI invocation of run_task.py
+imports this module, and most never query HDFS.
+"""
+import posixpath
+import re
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Union, List
+
+from case_insensitive_enum import CaseInsensitiveEnum
+
+WEBHDFS_ADDRESS = "http://namenode-1:9870"
+WEBHDFS_USER = "root"
+WEBHDFS_TIMEOUT_SECONDS = 10
+WEBHDFS_MAX_CONCURRENT_REQUESTS = 16
+DEFAULT_CACHE_TTL_SECONDS = 30.0
+# Maximum number of paths passed to a single hdfs command (bounded by the maximum command line length)
+CLI_PATHS_PER_COMMAND = 1000
+# Where `hdfs dfs -rm` moves removed paths, unless -skipTrash is given (relative to the home directory of the user)
+TRASH_DIRECTORY = ".Trash/Current"
+
+HdfsPath = Union[str, PurePosixPath]
+
+
+def normalize_path(path: HdfsPath) -> str:
+    """
+    :return: the absolute, normalized form of an HDFS path (e.g., "/output/" -> "/output")
+    """
+    return posixpath.normpath(posixpath.join("/", str(path)))
+
+
+def is_same_or_descendant(path: str, ancestor: str) -> bool:
+    """
+    Both paths are normalized.
+    """
+    return path == ancestor or path.startswith(ancestor.rstrip("/") + "/")
+
+
+class RemovalResult(NamedTuple):
+    path: str
+    # Whether the path does not exist anymore (a path that did not exist in the first place is removed as well)
+    removed: bool
+    error: Optional[str] = None
+
+
+def _remove_command(paths: List[str], skip_trash: bool) -> List[str]:
+    return ["hdfs", "dfs", "-rm", "-r", "-f", *(["-skipTrash"] if skip_trash else []), *paths]
+
+
+class HdfsBackendType(CaseInsensitiveEnum):
+    CLI = "cli"
+    BATCHED_CLI = "batched_cli"
+    WEBHDFS = "webhdfs"
+    FAKE = "fake"
+
+
+class HdfsBackend(ABC):
+    """
+    Answers status queries about HDFS paths.
+    """
+
+    @abstractmethod
+    def exists_many(self, paths: Iterable[HdfsPath]) -> Dict[str, bool]:
+        """
+        :return: a dictionary from each (normalized) path to whether it exists in HDFS
+        """
+        pass
+
+    def exists(self, path: HdfsPath) -> bool:
+        return self.exists_many([path])[normalize_path(path)]
+
+    @abstractmethod
+    def remove_many(self, paths: Iterable[HdfsPath], skip_trash: bool = False) -> Dict[str, RemovalResult]:
+        """
+        Removes the paths recursively. Like `hdfs dfs -rm -r -f`, paths that do not exist are not an error.
+        :param skip_trash: delete the paths right away, instead of moving them to the trash of the user
+        :return: a dictionary from each (normalized) path to the result of its removal
+        """
+        pass
+
+
+class CliHdfsBackend(HdfsBackend):
+    """
+    Runs `hdfs dfs -test -e` for every path (a JVM per path).
+    """
+
+    def exists_many(self, paths: Iterable[HdfsPath]) -> Dict[str, bool]:
+        results = {}
+        for path in map(normalize_path, paths):
+            result = subprocess.run(
+                ["hdfs", "dfs", "-test", "-e", path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            results[path] = result.returncode == 0
+        return results
+
+    def remove_many(self, paths: Iterable[HdfsPath], skip_trash: bool = False) -> Dict[str, RemovalResult]:
+        results = {}
+        for path in dict.fromkeys(map(normalize_path, paths)):
+            result = subprocess.run(_remove_command([path], skip_trash), capture_output=True, text=True)
+            results[path] = RemovalResult(path, result.returncode == 0, result.stderr.strip() or None)
+        return results
+
+
+class BatchedCliHdfsBackend(HdfsBackend):
+    """
+    Lists all paths using a single `hdfs dfs -ls -d` command (a single JVM).
+    The command lists the paths that exist, and reports an error for every path that does not.
+    """
+
+    def exists_many(self, paths: Iterable[HdfsPath]) -> Dict[str, bool]:
+        paths = list(dict.fromkeys(map(normalize_path, paths)))
+        existing_paths = set()
+        for start in range(0, len(paths), CLI_PATHS_PER_COMMAND):
+            existing_paths.update(self._list_existing(paths[start:start + CLI_PATHS_PER_COMMAND]))
+        return {path: path in existing_paths for path in paths}
+
+    @staticmethod
+    def _list_existing(paths: List[str]) -> Set[str]:
+        from urllib.parse import urlparse
+
+        if not paths:
+            return set()
+
+        result = subprocess.run(["hdfs", "dfs", "-ls", "-d", *paths], capture_output=True, text=True)
+        existing_paths = set()
+        for line in result.stdout.splitlines():
+            # <permissions> <replication> <owner> <group> <size> <date> <time> <path>
+            fields = line.split(maxsplit=7)
+            if len(fields) == 8:
+                existing_paths.add(normalize_path(urlparse(fields[7]).path))
+
+        # A non-zero exit code is expected when some paths are missing, but not when the listing failed altogether
+        if result.returncode != 0 and "No such file or directory" not in result.stderr:
+            raise RuntimeError(f"Could not list HDFS paths: {result.stderr.strip()}")
+        return existing_paths
+
+    def remove_many(self, paths: Iterable[HdfsPath], skip_trash: bool = False) -> Dict[str, RemovalResult]:
+        paths = list(dict.fromkeys(map(normalize_path, paths)))
+        results = {}
+        for start in range(0, len(paths), CLI_PATHS_PER_COMMAND):
+            results.update(self._remove(paths[start:start + CLI_PATHS_PER_COMMAND], skip_trash))
+        return results
+
+    def _remove(self, paths: List[str], skip_trash: bool) -> Dict[str, RemovalResult]:
+        if not paths:
+            return {}
+
+        result = subprocess.run(_remove_command(paths, skip_trash), capture_output=True, text=True)
+        if result.returncode == 0:
+            return {path: RemovalResult(path, True) for path in paths}
+
+        # The command continues after a path that cannot be removed, so find out which paths are left (a single
+        # listing), and the error that mentions each of them
+        errors = [line for line in result.stderr.splitlines() if line.startswith("rm:")]
+        remaining_paths = {path for path, exists in self.exists_many(paths).items() if exists}
+
+        def error_of(path: str) -> str:
+            mentions_path = re.compile(rf"{re.escape(path)}(?![^\s'`\":])")
+            return next(
+                (error for error in errors if mentions_path.search(error)),
+                f"still exists after `hdfs dfs -rm` (exit code {result.returncode})",
+            )
+
+        return {
+            path: RemovalResult(path, False, error_of(path)) if path in remaining_paths else RemovalResult(path, True)
+            for path in paths
+        }
+
+
+class WebHdfsBackend(HdfsBackend):
+    """
+    Queries the WebHDFS REST API of the namenode: paths are grouped by their parent directory, and every parent is
+    listed once (LISTSTATUS), concurrently.
+    """
+
+    def __init__(
+            self,
+            address: str = WEBHDFS_ADDRESS,
+            user: str = WEBHDFS_USER,
+            timeout_seconds: float = WEBHDFS_TIMEOUT_SECONDS,
+            max_concurrent_requests: int = WEBHDFS_MAX_CONCURRENT_REQUESTS,
+    ):
+        self.address = address.rstrip("/")
+        self.user = user
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrent_requests = max_concurrent_requests
+
+    def _request(self, path: str, operation: str, method: str = "GET", parameters: str = "") -> Optional[dict]:
+        """
+        :param parameters: more query parameters of the operation (e.g., "&recursive=true")
+        :return: the decoded JSON response, or None if the path does not exist
+        """
+        import json
+        from urllib.error import HTTPError
+        from urllib.parse import quote
+        from urllib.request import Request, urlopen
+
+        url = f"{self.address}/webhdfs/v1{quote(path)}?op={operation}&user.name={quote(self.user)}{parameters}"
+        try:
+            with urlopen(Request(url, method=method), timeout=self.timeout_seconds) as response:
+                return json.load(response)
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def _list_children(self, directory: str) -> Set[str]:
+        listing = self._request(directory, "LISTSTATUS")
+        if listing is None:
+            return set()
+        # LISTSTATUS of a file returns the file itself, with an empty suffix
+        return {
+            posixpath.join(directory, status["pathSuffix"])
+            for status in listing["FileStatuses"]["FileStatus"]
+            if status["pathSuffix"]
+        }
+
+    def exists_many(self, paths: Iterable[HdfsPath]) -> Dict[str, bool]:
+        from concurrent.futures import ThreadPoolExecutor
+
+        paths = list(dict.fromkeys(map(normalize_path, paths)))
+        parents = sorted({posixpath.dirname(path) for path in paths if path != "/"})
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            existing_paths = set().union(*executor.map(self._list_children, parents))
+        return {path: path == "/" or path in existing_paths for path in paths}
+
+    def _delete(self, path: str) -> RemovalResult:
+        try:
+            # A path that does not exist is not deleted ({"boolean": false}), which is fine
+            self._request(path, "DELETE", method="DELETE", parameters="&recursive=true")
+        except (OSError, ValueError) as e:
+            return RemovalResult(path, False, str(e))
+        return RemovalResult(path, True)
+
+    def remove_many(self, paths: Iterable[HdfsPath], skip_trash: bool = False) -> Dict[str, RemovalResult]:
+        """
+        WebHDFS has no trash (the trash is implemented by the `hdfs dfs` client), so the paths are always deleted
+        right away, whatever skip_trash is.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        paths = list(dict.fromkeys(map(normalize_path, paths)))
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            return dict(zip(paths, executor.map(self._delete, paths)))
+
+
+class FakeHdfsBackend(HdfsBackend):
+    """
+    An in-memory file system, for tests and local runs. Records the number of queries and removals it received.
+    Removed paths are moved to the trash of the user (as `hdfs dfs -rm` does), unless the trash is skipped.
+    Paths under `failing_prefixes` cannot be removed (e.g., to imitate missing permissions).
+    """
+
+    def __init__(
+            self,
+            existing_paths: Iterable[HdfsPath] = (),
+            user: str = WEBHDFS_USER,
+            failing_prefixes: Iterable[HdfsPath] = (),
+    ):
+        self.existing_paths = set(map(normalize_path, existing_paths))
+        self.trash_directory = posixpath.join("/user", user, TRASH_DIRECTORY)
+        self.failing_prefixes = [normalize_path(prefix) for prefix in failing_prefixes]
+        self.number_of_queries = 0
+        self.number_of_removals = 0
+        self._lock = threading.Lock()
+
+    def add(self, path: HdfsPath):
+        with self._lock:
+            self.existing_paths.add(normalize_path(path))
+
+    def remove(self, path: HdfsPath):
+        path = normalize_path(path)
+        with self._lock:
+            self.existing_paths = {
+                existing_path for existing_path in self.existing_paths if not is_same_or_descendant(existing_path, path)
+            }
+
+    def exists_many(self, paths: Iterable[HdfsPath]) -> Dict[str, bool]:
+        self.number_of_queries += 1
+        return {path: path in self.existing_paths for path in map(normalize_path, paths)}
+
+    def trashed_paths(self) -> Set[str]:
+        """
+        :return: the original paths of everything in the trash
+        """
+        return {
+            path.removeprefix(self.trash_directory) for path in self.existing_paths
+            if is_same_or_descendant(path, self.trash_directory)
+        }
+
+    def remove_many(self, paths: Iterable[HdfsPath], skip_trash: bool = False) -> Dict[str, RemovalResult]:
+        self.number_of_removals += 1
+        results = {}
+        for path in dict.fromkeys(map(normalize_path, paths)):
+            if any(is_same_or_descendant(path, prefix) for prefix in self.failing_prefixes):
+                results[path] = RemovalResult(path, False, f"rm: Permission denied: {path}")
+                continue
+            with self._lock:
+                removed_paths = {
+                    existing_path for existing_path in self.existing_paths if is_same_or_descendant(existing_path, path)
+                }
+                self.existing_paths -= removed_paths
+                if not skip_trash:
+                    self.existing_paths |= {f"{self.trash_directory}{removed_path}" for removed_path in removed_paths}
+            results[path] = RemovalResult(path, True)
+        return results
+
+
+class CachedHdfsBackend(HdfsBackend):
+    """
+    Remembers the answers of another backend for `ttl_seconds`, and only queries it for the paths that are missing
+    from the cache (or expired). Call prefetch() with all paths that are about to be queried one by one, so they are
+    answered by a single batched query.
+    """
+
+    def __init__(self, backend: HdfsBackend, ttl_seconds: float = DEFAULT_CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._cache: Dict[str, tuple] = {}  # path -> (exists, timestamp)
+        self._lock = threading.Lock()
+
+    def exists_many(self, paths: Iterable[HdfsPath]) -> Dict[str, bool]:
+        paths = list(dict.fromkeys(map(normalize_path, paths)))
+        now = time.monotonic()
+        with self._lock:
+            results = {
+                path: self._cache[path][0] for path in paths
+                if path in self._cache and now - self._cache[path][1] < self.ttl_seconds
+            }
+
+        missing_paths = [path for path in paths if path not in results]
+        if missing_paths:
+            fetched = self.backend.exists_many(missing_paths)
+            with self._lock:
+                for path, exists in fetched.items():
+                    self._cache[path] = (exists, now)
+            results.update(fetched)
+
+        return {path: results[path] for path in paths}
+
+    def prefetch(self, paths: Iterable[HdfsPath]):
+        self.exists_many(paths)
+
+    def remove_many(self, paths: Iterable[HdfsPath], skip_trash: bool = False) -> Dict[str, RemovalResult]:
+        results = self.backend.remove_many(paths, skip_trash)
+        removed_paths = set(results)
+
+        def is_removed(path: str) -> bool:
+            # The descendants of the removed paths are gone as well
+            while path not in removed_paths and path != "/":
+                path = posixpath.dirname(path)
+            return path in removed_paths
+
+        with self._lock:
+            for cached_path in [cached_path for cached_path in self._cache if is_removed(cached_path)]:
+                self._cache.pop(cached_path)
+        return results
+
+    def invalidate(self, paths: Optional[Iterable[HdfsPath]] = None):
+        """
+        Drops the given paths (or everything) from the cache, e.g., after creating or removing them.
+        """
+        with self._lock:
+            if paths is None:
+                self._cache.clear()
+            else:
+                for path in map(normalize_path, paths):
+                    self._cache.pop(path, None)
+
+
+def create_backend(
+        backend_type: HdfsBackendType, ttl_seconds: Optional[float] = DEFAULT_CACHE_TTL_SECONDS
+) -> HdfsBackend:
+    """
+    :return: a backend of the given type, wrapped with a cache (unless ttl_seconds is None)
+    """
+    backends = {
+        HdfsBackendType.CLI: CliHdfsBackend,
+        HdfsBackendType.BATCHED_CLI: BatchedCliHdfsBackend,
+        HdfsBackendType.WEBHDFS: WebHdfsBackend,
+        HdfsBackendType.FAKE: FakeHdfsBackend,
+    }
+    backend = backends[backend_type]()
+    return backend if ttl_seconds is None else CachedHdfsBackend(backend, ttl_seconds)
@@ -0,0 +1,230 @@
+"""
+Follows the output of running Hadoop jobs from a single asyncio event loop (in a background thread), instead of
+echoing every job to the terminal.
+
+The output of every job is written to its own log file, and parsed as it arrives: the application ID, and the map and
+reduce progress that the `hadoop jar` client prints:
+    ... INFO mapreduce.Job:  map 45% reduce 0%
+Every change is emitted as a structured progress event, which is appended to an events file (JSON lines) and passed to
+the listeners. A live view of all jobs is printed as a single status line.
+A single thread and event loop serve all jobs (rather than a thread per job), so dozens of concurrent jobs are cheap.
+Jobs without a local client (see job_submitters.py) have no output to follow, so only their start and end are tracked.
+"""
+import asyncio
+import re
+import shutil
+import sys
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, TextIO
+
+from pydantic import BaseModel
+
+from job_submitters import SubmittedJob
+from metrics_store import APPLICATION_ID_PATTERN
+
+DEFAULT_JOB_LOGS_DIRECTORY = Path("/home/job_logs")
+
+PROGRESS_PATTERN = re.compile(r"\bmap (\d+)% reduce (\d+)%")
+DEFAULT_REFRESH_SECONDS = 1.0
+# Without a terminal (e.g., the output is redirected to a file), the live view is printed less often, on its own lines
+NON_INTERACTIVE_REFRESH_SECONDS = 30.0
+EVENTS_FILE_NAME = "events.jsonl"
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class JobState(str, Enum):
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class JobProgress(BaseModel):
+    name: str
+    application_id: Optional[str] = None
+    state: JobState = JobState.RUNNING
+    map_percent: int = 0
+    reduce_percent: int = 0
+    exit_code: Optional[int] = None
+    log_path: Optional[Path] = None
+
+
+class ProgressEvent(BaseModel):
+    time: datetime
+    event: str  # "started", "application", "progress" or "finished"
+    job: JobProgress
+
+
+class JobMonitor:
+    """
+    Usage:
+        with JobMonitor(Path("/home/job_logs/<run>")) as monitor:
+            followed = monitor.watch("output_1", submitted_job, on_line=parser.feed)
+            ...
+            monitor.finish("output_1", submitted_job.wait())
+    """
+
+    def __init__(
+            self,
+            log_directory: Path,
+            echo_to: Optional[TextIO] = None,
+            live_view: bool = True,
+            refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+            listeners: Optional[List[Callable[[ProgressEvent], None]]] = None,
+            status_to: TextIO = sys.stderr,
+    ):
+        """
+        :param echo_to: where to echo the output of the jobs as well (e.g., sys.stdout when a single job runs at a time)
+        :param live_view: whether to print the status line of all jobs
+        """
+        self.log_directory = log_directory
+        self.echo_to = echo_to
+        self.live_view = live_view
+        self.listeners = listeners or []
+        self.jobs: Dict[str, JobProgress] = {}
+        self._status_to = status_to
+        self._interactive = status_to.isatty()
+        self._refresh_seconds = refresh_seconds if self._interactive else NON_INTERACTIVE_REFRESH_SECONDS
+        self._events_file: Optional[TextIO] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def start(self) -> "JobMonitor":
+        self.log_directory.mkdir(parents=True, exist_ok=True)
+        self._events_file = open(self.log_directory / EVENTS_FILE_NAME, "a")
+        self._thread.start()
+        if self.live_view:
+            asyncio.run_coroutine_threadsafe(self._show_live_view(), self._loop)
+        return self
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        """
+        Stops following the jobs that are still running (e.g., after CTRL+C).
+        """
+        asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        if self.live_view:
+            self._print_status(final=True)
+        self._events_file.close()
+
+    def __enter__(self) -> "JobMonitor":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _emit(self, event: str, progress: JobProgress):
+        """
+        Must be called from the event loop.
+        """
+        progress_event = ProgressEvent(time=datetime.now(timezone.utc), event=event, job=progress.model_copy())
+        self._events_file.write(progress_event.model_dump_json() + "\n")
+        self._events_file.flush()
+        for listener in self.listeners:
+            listener(progress_event)
+
+    def _feed(self, progress: JobProgress, line: str):
+        if progress.application_id is None and (match := APPLICATION_ID_PATTERN.search(line)):
+            progress.application_id = match.group(1)
+            self._emit("application", progress)
+        if match := PROGRESS_PATTERN.search(line):
+            progress.map_percent, progress.reduce_percent = int(match.group(1)), int(match.group(2))
+            self._emit("progress", progress)
+
+    async def _follow(
+            self, progress: JobProgress, submitted_job: SubmittedJob, on_line: Optional[Callable[[str], None]]
+    ):
+        self._emit("started", progress)
+        pipe = submitted_job.output_pipe
+        if pipe is None:
+            return
+
+        reader = asyncio.StreamReader(limit=MAX_LINE_BYTES)
+        transport, _ = await self._loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        try:
+            with open(progress.log_path, "w") as log:
+                while encoded_line := await reader.readline():
+                    line = encoded_line.decode(errors="replace")
+                    log.write(line)
+                    if self.echo_to is not None:
+                        self.echo_to.write(line)
+                    self._feed(progress, line)
+                    if on_line is not None:
+                        on_line(line)
+        finally:
+            transport.close()
+            if self.echo_to is not None:
+                self.echo_to.flush()
+
+    def watch(
+            self, name: str, submitted_job: SubmittedJob, on_line: Optional[Callable[[str], None]] = None
+    ) -> Future:
+        """
+        Follows the output of the job in the background, into <log directory>/<name>.log.
+        :param on_line: called with every output line (from the monitor's thread)
+        :return: a future, done when the output of the job ended
+        """
+        progress = JobProgress(
+            name=name, application_id=submitted_job.application_id, log_path=self.log_directory / f"{name}.log"
+        )
+        self._loop.call_soon_threadsafe(self.jobs.__setitem__, name, progress)
+        return asyncio.run_coroutine_threadsafe(self._follow(progress, submitted_job, on_line), self._loop)
+
+    def finish(self, name: str, exit_code: int):
+        def finish_job():
+            progress = self.jobs[name]
+            progress.exit_code = exit_code
+            progress.state = JobState.SUCCEEDED if exit_code == 0 else JobState.FAILED
+            self._emit("finished", progress)
+
+        self._loop.call_soon_threadsafe(finish_job)
+
+    def format_status(self) -> str:
+        jobs = list(self.jobs.values())
+        running = [job for job in jobs if job.state == JobState.RUNNING]
+        failed = sum(job.state == JobState.FAILED for job in jobs)
+        status = (
+            f"[{datetime.now():%H:%M:%S}] {len(running)} running, "
+            f"{len(jobs) - len(running) - failed} succeeded, {failed} failed"
+        )
+        return status + "".join(
+            f" | {job.name}: map {job.map_percent}% reduce {job.reduce_percent}%" for job in running
+        )
+
+    def _print_status(self, final: bool = False):
+        status = self.format_status()
+        if self._interactive:
+            width = shutil.get_terminal_size().columns
+            self._status_to.write(f"\r\x1b[K{status[:width - 1]}" + ("\n" if final else "\r"))
+        else:
+            self._status_to.write(status + "\n")
+        self._status_to.flush()
+
+    async def _show_live_view(self):
+        while True:
+            await asyncio.sleep(self._refresh_seconds)
+            if self.jobs:
+                self._print_status()
+
+
+def create_run_log_directory(log_directory: Path) -> Path:
+    """
+    :return: a new directory for the logs of a single run of the experiments, named by its start time
+    """
+    run_log_directory = log_directory / f"{datetime.now():%Y%m%d-%H%M%S}"
+    suffix = 1
+    while run_log_directory.exists():
+        run_log_directory = log_directory / f"{datetime.now():%Y%m%d-%H%M%S}-{suffix}"
+        suffix += 1
+    return run_log_directory
@@ -0,0 +1,283 @@
+"""
+A capacity-aware scheduler for running Hadoop jobs in parallel.
+
+Launching every job right away (with a fixed sleep between launches) over-subscribes YARN: the jobs' application
+masters and containers queue up, and the measurements of the running jobs are skewed by the queued ones.
+Instead, this scheduler computes the container footprint of every job from its memory and vcores fields (normalized
+the way YARN normalizes container requests), and only launches a job when its footprint fits the free capacity of the
+cluster (and the number of running jobs is below the concurrency limit). Jobs that do not fit wait, while smaller jobs
+behind them may start (backfilling). Finished jobs release their capacity as soon as they terminate, regardless of the
+order in which they were launched.
+"""
+import logging
+import math
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from pydantic import BaseModel, Field
+
+from hadoop_job_config import HadoopJobConfig
+from job_submitters import LauncherContainer, SubmittedJob
+from launch_pacing import LaunchPacer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL_SECONDS = 0.5
+# Number of upcoming jobs considered for backfilling when the next job does not fit
+BACKFILL_WINDOW = 10
+
+YARN_CONF_PREFIX = "YARN_CONF_"
+# hadoop.env variables (without the YARN_CONF_ prefix) -> ClusterCapacity fields
+HADOOP_ENV_CAPACITY_KEYS = {
+    "yarn_nodemanager_resource_memory___mb": "node_memory_mb",
+    "yarn_nodemanager_resource_cpu___vcores": "node_vcores",
+    "yarn_scheduler_capacity_root_default_maximum___allocation___mb": "maximum_allocation_mb",
+    "yarn_scheduler_capacity_root_default_maximum___allocation___vcores": "maximum_allocation_vcores",
+    "yarn_scheduler_minimum___allocation___mb": "minimum_allocation_mb",
+    "yarn_scheduler_minimum___allocation___vcores": "minimum_allocation_vcores",
+    "yarn_scheduler_capacity_maximum___am___resource___percent": "maximum_am_resource_percent",
+}
+
+
+class ClusterCapacity(BaseModel):
+    """
+    The resources YARN can allocate. The defaults match hadoop.env (and YARN's defaults for the rest).
+    """
+
+    number_of_nodes: int = Field(3, gt=0, description="Number of nodemanagers (== datanodes)")
+    node_memory_mb: int = Field(3584, gt=0, description="Memory each nodemanager can allocate")
+    node_vcores: int = Field(3, gt=0, description="vCores each nodemanager can allocate")
+    maximum_allocation_mb: int = Field(3584, gt=0, description="Largest container memory YARN accepts")
+    maximum_allocation_vcores: int = Field(3, gt=0, description="Largest container vCores YARN accepts")
+    minimum_allocation_mb: int = Field(1024, gt=0, description="Container memory is rounded up to a multiple of it")
+    minimum_allocation_vcores: int = Field(1, gt=0, description="Smallest container vCores")
+    maximum_am_resource_percent: float = Field(
+        0.1, gt=0, le=1, description="Fraction of the cluster memory that application masters may use together"
+    )
+
+    @property
+    def total_memory_mb(self) -> int:
+        return self.number_of_nodes * self.node_memory_mb
+
+    @property
+    def total_vcores(self) -> int:
+        return self.number_of_nodes * self.node_vcores
+
+    @classmethod
+    def from_environment(
+            cls, environment: Optional[Mapping[str, str]] = None, number_of_nodes: int = 3
+    ) -> "ClusterCapacity":
+        """
+        Reads the capacity from the YARN_CONF_* variables of hadoop.env (docker-compose passes them to every
+        container). Missing variables keep their defaults.
+        """
+        environment = os.environ if environment is None else environment
+        values = {
+            field: environment[f"{YARN_CONF_PREFIX}{key}"].strip('"')
+            for key, field in HADOOP_ENV_CAPACITY_KEYS.items()
+            if f"{YARN_CONF_PREFIX}{key}" in environment
+        }
+        return cls.model_validate({**values, "number_of_nodes": number_of_nodes})
+
+
+class JobFootprint(BaseModel):
+    memory_mb: int = 0
+    vcores: int = 0
+    am_memory_mb: int = 0
+    # Reasons for which YARN would never run the job (e.g., a container larger than the maximum allocation)
+    errors: List[str] = []
+
+    def fits(self, free_memory_mb: int, free_vcores: int, free_am_memory_mb: int) -> bool:
+        return self.memory_mb <= free_memory_mb and self.vcores <= free_vcores and self.am_memory_mb <= free_am_memory_mb
+
+
+def normalize_container(memory_mb: int, vcores: int, capacity: ClusterCapacity) -> Tuple[int, int]:
+    """
+    :return: the resources YARN actually allocates for a container request
+    (memory is rounded up to a multiple of the minimum allocation)
+    """
+    memory_mb = max(memory_mb, capacity.minimum_allocation_mb)
+    memory_mb = math.ceil(memory_mb / capacity.minimum_allocation_mb) * capacity.minimum_allocation_mb
+    return memory_mb, max(vcores, capacity.minimum_allocation_vcores)
+
+
+def job_footprint(
+        config: HadoopJobConfig, capacity: ClusterCapacity, launcher_containers: Sequence[LauncherContainer] = ()
+) -> JobFootprint:
+    """
+    The peak resources of a job: its application master, and all of its map and reduce containers.
+    Reducers start before all maps finish when slowstart_completed_maps < 1, so the map and reduce containers are
+    assumed to run at the same time in that case.
+    The containers the submitter runs for the job (see job_submitters.py) are added to the footprint.
+    """
+    am = normalize_container(config.application_manager_memory_mb, config.application_manager_vcores, capacity)
+    map_container = normalize_container(config.map_memory_mb, config.map_vcores, capacity)
+    reduce_container = normalize_container(config.reduce_memory_mb, config.reduce_vcores, capacity)
+
+    errors = []
+    for name, (memory_mb, vcores) in (("application master", am), ("map", map_container), ("reduce", reduce_container)):
+        if memory_mb > min(capacity.maximum_allocation_mb, capacity.node_memory_mb):
+            errors.append(f"{name} container memory ({memory_mb}MB) exceeds the maximum allocation")
+        if vcores > min(capacity.maximum_allocation_vcores, capacity.node_vcores):
+            errors.append(f"{name} container vCores ({vcores}) exceed the maximum allocation")
+
+    maps = (config.number_of_mappers * map_container[0], config.number_of_mappers * map_container[1])
+    reduces = (config.number_of_reducers * reduce_container[0], config.number_of_reducers * reduce_container[1])
+    if config.slowstart_completed_maps < 1:
+        tasks_memory_mb, tasks_vcores = maps[0] + reduces[0], maps[1] + reduces[1]
+    else:
+        tasks_memory_mb, tasks_vcores = max(maps[0], reduces[0]), max(maps[1], reduces[1])
+
+    launchers = [
+        (*normalize_container(container.memory_mb, container.vcores, capacity), container.is_application_master)
+        for container in launcher_containers
+    ]
+    return JobFootprint(
+        memory_mb=am[0] + tasks_memory_mb + sum(memory_mb for memory_mb, _, _ in launchers),
+        vcores=am[1] + tasks_vcores + sum(vcores for _, vcores, _ in launchers),
+        am_memory_mb=am[0] + sum(memory_mb for memory_mb, _, is_am in launchers if is_am),
+        errors=errors,
+    )
+
+
+class RunningJob(BaseModel):
+    model_config = {"arbitrary_types_allowed": True}
+
+    index: int
+    config: HadoopJobConfig
+    footprint: JobFootprint
+    submitted_job: SubmittedJob
+    start_time: float
+
+
+class CapacityScheduler:
+    """
+    Launches jobs in order, as long as they fit the free capacity of the cluster and the concurrency limit.
+    A job whose footprint is larger than the whole cluster is still launched when nothing else runs (YARN runs it
+    with fewer containers at a time), unless YARN would reject it altogether.
+    """
+
+    def __init__(
+            self,
+            capacity: ClusterCapacity,
+            max_concurrent_jobs: Optional[int] = None,
+            pacer: Optional[LaunchPacer] = None,
+            poll_interval_seconds: float = DEFAULT_POLL_INTERVAL_SECONDS,
+            launcher_containers: Optional[Callable[[HadoopJobConfig], Sequence[LauncherContainer]]] = None,
+    ):
+        """
+        :param launcher_containers: the containers the job submitter runs for every job (see job_submitters.py)
+        """
+        self.capacity = capacity
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.pacer = pacer
+        self.poll_interval_seconds = poll_interval_seconds
+        self.launcher_containers = launcher_containers
+        self.running: Dict[int, RunningJob] = {}
+
+    def _free_resources(self) -> Tuple[int, int, int]:
+        used_memory_mb = sum(job.footprint.memory_mb for job in self.running.values())
+        used_vcores = sum(job.footprint.vcores for job in self.running.values())
+        used_am_memory_mb = sum(job.footprint.am_memory_mb for job in self.running.values())
+        max_am_memory_mb = self.capacity.total_memory_mb * self.capacity.maximum_am_resource_percent
+        return (
+            self.capacity.total_memory_mb - used_memory_mb,
+            self.capacity.total_vcores - used_vcores,
+            int(max_am_memory_mb - used_am_memory_mb),
+        )
+
+    def _can_launch(self, footprint: JobFootprint) -> bool:
+        if not self.running:
+            return True
+        if self.max_concurrent_jobs is not None and len(self.running) >= self.max_concurrent_jobs:
+            return False
+        return footprint.fits(*self._free_resources())
+
+    def _collect_finished(self) -> List[Tuple[RunningJob, int]]:
+        finished = [
+            (job, return_code) for job in self.running.values() if (return_code := job.submitted_job.poll()) is not None
+        ]
+        for job, _ in finished:
+            del self.running[job.index]
+        return finished
+
+    def run(
+            self,
+            experiments: Iterable[HadoopJobConfig],
+            launch: Callable[[int, HadoopJobConfig], SubmittedJob],
+            on_finish: Callable[[int, HadoopJobConfig, Optional[int], float], None],
+    ):
+        """
+        Runs all experiments, and calls on_finish(index, config, return code, runtime seconds) as soon as each job
+        terminates. Jobs YARN would reject are not launched (their return code is None).
+        """
+        try:
+            self._run(iter(enumerate(experiments)), launch, on_finish)
+        except KeyboardInterrupt:
+            # Jobs submitted through the REST API keep running in the cluster unless they are killed
+            for job in self.running.values():
+                job.submitted_job.kill()
+            raise
+
+    def _run(
+            self,
+            upcoming: Iterator[Tuple[int, HadoopJobConfig]],
+            launch: Callable[[int, HadoopJobConfig], SubmittedJob],
+            on_finish: Callable[[int, HadoopJobConfig, Optional[int], float], None],
+    ):
+        pending: Deque[Tuple[int, HadoopJobConfig, JobFootprint]] = deque()
+        exhausted = False
+
+        while True:
+            while not exhausted and len(pending) < BACKFILL_WINDOW:
+                next_experiment = next(upcoming, None)
+                if next_experiment is None:
+                    exhausted = True
+                    break
+                index, config = next_experiment
+                footprint = job_footprint(
+                    config, self.capacity, self.launcher_containers(config) if self.launcher_containers else ()
+                )
+                if footprint.errors:
+                    logger.warning(f"Skipping a job that YARN would reject: {'; '.join(footprint.errors)}\n{config}")
+                    on_finish(index, config, None, 0)
+                else:
+                    pending.append((index, config, footprint))
+
+            launched = self._launch_first_fitting(pending, launch)
+            for job, return_code in self._collect_finished():
+                on_finish(job.index, job.config, return_code, time.monotonic() - job.start_time)
+
+            if exhausted and not pending and not self.running:
+                break
+            if not launched:
+                time.sleep(self.poll_interval_seconds)
+
+    def _launch_first_fitting(
+            self,
+            pending: Deque[Tuple[int, HadoopJobConfig, JobFootprint]],
+            launch: Callable[[int, HadoopJobConfig], SubmittedJob],
+    ) -> bool:
+        """
+        Launches the first pending job that fits (backfilling smaller jobs when the head of the queue does not fit).
+        :return: True if a job was launched
+        """
+        for position, (index, config, footprint) in enumerate(pending):
+            if self._can_launch(footprint):
+                del pending[position]
+                if self.pacer:
+                    self.pacer.before_launch()
+                submitted_job = launch(index, config)
+                self.running[index] = RunningJob(
+                    index=index,
+                    config=config,
+                    footprint=footprint,
+                    submitted_job=submitted_job,
+                    start_time=time.monotonic(),
+                )
+                if self.pacer:
+                    self.pacer.after_launch(submitted_job)
+                return True
+        return False
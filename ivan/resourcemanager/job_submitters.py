@@ -0,0 +1,421 @@
+"""
+Pluggable backends for submitting Hadoop jobs (used by run_task.py and automatic_experiments.py).
+
+- SubprocessJobSubmitter: the original behaviour, a `hadoop jar` client process (a client JVM) per job on this machine.
+  Its output, with the application ID and the counters, is printed and parsed (see metrics_store.py).
+- RestJobSubmitter: the ResourceManager REST API. Every job is submitted as a small launcher application (the
+  distributed shell ApplicationMaster that ships with Hadoop), whose single container runs the `hadoop jar` command
+  inside the cluster. The submission returns right away with the launcher's application ID, and the job is polled
+  through the API, so no client JVM runs on this machine. The job's local files (mapper, reducer, etc.) and the
+  launcher's command are staged in HDFS first (through WebHDFS), and the job ships them with -files.
+- DryRunJobSubmitter: prints the command of every job, and reports it as successful without running anything.
+Every submitter returns a SubmittedJob, which is polled like subprocess.Popen.
+See resource_manager_stub.py for a local stub of the REST APIs.
+"""
+import hashlib
+import json
+import logging
+import posixpath
+import shlex
+import subprocess
+import sys
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, IO, Iterable, List, NamedTuple, Optional, TextIO, Tuple
+
+from case_insensitive_enum import CaseInsensitiveEnum
+from hadoop_job_config import HadoopJobConfig, HDFS_NAMENODE
+from hdfs_backends import WEBHDFS_ADDRESS, WEBHDFS_USER
+from launch_pacing import RESOURCE_MANAGER_ADDRESS
+
+logger = logging.getLogger(__name__)
+
+HADOOP_HOME = "/opt/hadoop-3.4.1"
+NEW_APPLICATION_PATH = "/ws/v1/cluster/apps/new-application"
+APPLICATIONS_PATH = "/ws/v1/cluster/apps"
+REST_TIMEOUT_SECONDS = 10
+DEFAULT_STATUS_POLL_INTERVAL_SECONDS = 1.0
+DEFAULT_STAGING_DIRECTORY = "/tmp/job_submitters"
+DEFAULT_QUEUE = "default"
+
+DISTRIBUTED_SHELL_APPLICATION_MASTER = "org.apache.hadoop.yarn.applications.distributedshell.ApplicationMaster"
+# The distributed shell ApplicationMaster reads the command of its container from this file (in its working directory)
+SHELL_COMMANDS_FILE = "shellCommands"
+LAUNCHER_AM_MEMORY_MB = 512
+LAUNCHER_AM_HEAP_MB = 384
+# The container of the launcher, which runs the `hadoop jar` client
+LAUNCHER_CONTAINER_MEMORY_MB = 1024
+LAUNCHER_VCORES = 1
+# <CPS> and {{...}} are expanded by the NodeManager
+LAUNCHER_CLASSPATH = "<CPS>".join([
+    "{{CLASSPATH}}",
+    "./*",
+    "{{HADOOP_CONF_DIR}}",
+    f"{HADOOP_HOME}/share/hadoop/common/*",
+    f"{HADOOP_HOME}/share/hadoop/common/lib/*",
+    f"{HADOOP_HOME}/share/hadoop/hdfs/*",
+    f"{HADOOP_HOME}/share/hadoop/hdfs/lib/*",
+    f"{HADOOP_HOME}/share/hadoop/yarn/*",
+    f"{HADOOP_HOME}/share/hadoop/yarn/lib/*",
+])
+
+# YARN application states (and final statuses) of the REST API
+FINAL_APPLICATION_STATES = {"FINISHED", "FAILED", "KILLED"}
+SUCCEEDED_FINAL_STATUS = "SUCCEEDED"
+# The hadoop streaming options whose value is a local file, which is shipped to the tasks
+STREAMING_FILE_OPTIONS = {"-mapper", "-reducer", "-combiner"}
+
+
+class JobSubmitterType(CaseInsensitiveEnum):
+    SUBPROCESS = "subprocess"
+    REST = "rest"
+    DRY_RUN = "dry_run"
+
+
+class LauncherContainer(NamedTuple):
+    """
+    A container a submitter runs for a job, on top of the job's own containers.
+    """
+    memory_mb: int
+    vcores: int
+    is_application_master: bool
+
+
+class SubmittedJob(ABC):
+    """
+    A handle on a submitted job. It is polled like subprocess.Popen, so the scheduler and the metrics collector work
+    with any submitter.
+    """
+
+    def __init__(
+            self,
+            args: List[str],
+            application_id: Optional[str] = None,
+            poll_interval_seconds: float = DEFAULT_STATUS_POLL_INTERVAL_SECONDS,
+    ):
+        self.args = args
+        self.application_id = application_id
+        self.poll_interval_seconds = poll_interval_seconds
+        self.returncode: Optional[int] = None
+
+    @property
+    def output(self) -> Iterable[str]:
+        """
+        :return: the output lines of the job's client until it terminates (none if the client does not run here)
+        """
+        return ()
+
+    @property
+    def output_pipe(self) -> Optional[IO]:
+        """
+        :return: the pipe of the job's client output, for reading it asynchronously (None if there is no output)
+        """
+        return None
+
+    @abstractmethod
+    def poll(self) -> Optional[int]:
+        """
+        :return: the exit code of the job (0 if it succeeded), or None if it is still running
+        """
+        pass
+
+    def wait(self) -> int:
+        while (return_code := self.poll()) is None:
+            time.sleep(self.poll_interval_seconds)
+        return return_code
+
+    @abstractmethod
+    def kill(self):
+        pass
+
+
+class SubprocessJob(SubmittedJob):
+    def __init__(self, process: subprocess.Popen):
+        super().__init__(process.args)
+        self.process = process
+
+    @property
+    def output(self) -> Iterable[str]:
+        return self.process.stdout if self.process.stdout is not None else ()
+
+    @property
+    def output_pipe(self) -> Optional[IO]:
+        return self.process.stdout
+
+    def poll(self) -> Optional[int]:
+        self.returncode = self.process.poll()
+        return self.returncode
+
+    def wait(self) -> int:
+        self.returncode = self.process.wait()
+        return self.returncode
+
+    def kill(self):
+        self.process.kill()
+
+
+class RestSubmittedJob(SubmittedJob):
+    def __init__(self, submitter: "RestJobSubmitter", args: List[str], application_id: str):
+        super().__init__(args, application_id, submitter.poll_interval_seconds)
+        self.submitter = submitter
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is not None:
+            return self.returncode
+        try:
+            state, final_status = self.submitter.application_state(self.application_id)
+        except OSError as e:
+            logger.warning(f"Could not get the state of {self.application_id} from the ResourceManager: {e}")
+            return None
+        if state in FINAL_APPLICATION_STATES:
+            self.returncode = 0 if state == "FINISHED" and final_status == SUCCEEDED_FINAL_STATUS else 1
+        return self.returncode
+
+    def kill(self):
+        if self.returncode is None:
+            self.submitter.kill(self.application_id)
+
+
+class DryRunJob(SubmittedJob):
+    def __init__(self, args: List[str]):
+        super().__init__(args)
+        self.returncode = 0
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+class JobSubmitter(ABC):
+    @abstractmethod
+    def submit(self, config: HadoopJobConfig) -> SubmittedJob:
+        pass
+
+    def prepare(self, config: HadoopJobConfig):
+        """
+        Does the work that submit() needs ahead, e.g., while the previous job runs (see sequential_pipeline.py).
+        """
+        pass
+
+    def launcher_containers(self, config: HadoopJobConfig) -> List[LauncherContainer]:
+        """
+        :return: the containers this submitter runs for the job, on top of the job's own containers
+        """
+        return []
+
+
+class SubprocessJobSubmitter(JobSubmitter):
+    """
+    Runs the `hadoop jar` client. When capture_output is set, its stdout and stderr are merged into
+    SubmittedJob.output (to be echoed and parsed), otherwise they are inherited from this process.
+    """
+
+    def __init__(self, capture_output: bool = True):
+        self.capture_output = capture_output
+
+    def submit(self, config: HadoopJobConfig) -> SubprocessJob:
+        if not self.capture_output:
+            return SubprocessJob(subprocess.Popen(config.get_hadoop_job_args()))
+        return SubprocessJob(subprocess.Popen(
+            config.get_hadoop_job_args(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+        ))
+
+
+class DryRunJobSubmitter(JobSubmitter):
+    def __init__(self, echo_to: TextIO = sys.stdout):
+        self._echo_to = echo_to
+
+    def submit(self, config: HadoopJobConfig) -> DryRunJob:
+        args = config.get_hadoop_job_args()
+        self._echo_to.write(f"Dry run, not submitted: {shlex.join(args)}\n")
+        return DryRunJob(args)
+
+
+class RestJobSubmitter(JobSubmitter):
+    def __init__(
+            self,
+            resource_manager_address: str = RESOURCE_MANAGER_ADDRESS,
+            webhdfs_address: str = WEBHDFS_ADDRESS,
+            user: str = WEBHDFS_USER,
+            queue: str = DEFAULT_QUEUE,
+            staging_directory: str = DEFAULT_STAGING_DIRECTORY,
+            poll_interval_seconds: float = DEFAULT_STATUS_POLL_INTERVAL_SECONDS,
+            timeout_seconds: float = REST_TIMEOUT_SECONDS,
+    ):
+        self.resource_manager_address = resource_manager_address.rstrip("/")
+        self.webhdfs_address = webhdfs_address.rstrip("/")
+        self.user = user
+        self.queue = queue
+        self.staging_directory = staging_directory
+        self.poll_interval_seconds = poll_interval_seconds
+        self.timeout_seconds = timeout_seconds
+        # local path -> the HDFS URI of its staged copy
+        self._staged_files: Dict[Path, str] = {}
+
+    def _request(
+            self,
+            url: str,
+            method: str = "GET",
+            body: Optional[bytes] = None,
+            content_type: str = "application/json",
+    ) -> Optional[Dict[str, Any]]:
+        """
+        :return: the decoded JSON response, or None if the response is empty
+        :raises OSError: if the server is unreachable or responds with an error (urllib.error.HTTPError is an OSError)
+        """
+        from urllib.request import Request, urlopen
+
+        headers = {"Accept": "application/json", "Content-Type": content_type}
+        request = Request(url, data=body, method=method, headers=headers)
+        with urlopen(request, timeout=self.timeout_seconds) as response:
+            content = response.read()
+        return json.loads(content) if content else None
+
+    def _webhdfs_url(self, path: str, operation: str, **parameters: str) -> str:
+        from urllib.parse import quote, urlencode
+
+        query = urlencode({"op": operation, "user.name": self.user, **parameters})
+        return f"{self.webhdfs_address}/webhdfs/v1{quote(path)}?{query}"
+
+    def _upload(self, hdfs_path: str, content: bytes) -> Dict[str, Any]:
+        """
+        Writes the content to HDFS (overwriting the file if it exists).
+        :return: the status of the new file (its length and modification time are needed for localizing it)
+        """
+        create_url = self._webhdfs_url(hdfs_path, "CREATE", overwrite="true", noredirect="true")
+        # The namenode answers with the datanode the content is written to
+        datanode_url = self._request(create_url, "PUT")["Location"]
+        self._request(datanode_url, "PUT", content, content_type="application/octet-stream")
+        return self._request(self._webhdfs_url(hdfs_path, "GETFILESTATUS"))["FileStatus"]
+
+    def _stage_file(self, local_path: Path) -> str:
+        """
+        Uploads a local file once, under a directory named by its content (so different versions do not collide).
+        :return: the HDFS URI of the staged copy
+        """
+        if local_path not in self._staged_files:
+            content = local_path.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()[:16]
+            hdfs_path = posixpath.join(self.staging_directory, "files", digest, local_path.name)
+            self._upload(hdfs_path, content)
+            self._staged_files[local_path] = f"{HDFS_NAMENODE}{hdfs_path}"
+        return self._staged_files[local_path]
+
+    @staticmethod
+    def _local_files(args: List[str]) -> List[Path]:
+        return [Path(value) for option, value in zip(args, args[1:]) if option == "-file"]
+
+    def prepare(self, config: HadoopJobConfig):
+        """
+        Stages the local files of the job in HDFS.
+        """
+        for path in self._local_files(config.get_hadoop_job_args()):
+            self._stage_file(path)
+
+    def launcher_args(self, args: List[str]) -> List[str]:
+        """
+        :return: the `hadoop jar` command for the launcher's container, where the local files of the job (which only
+        exist on this machine) are staged in HDFS and shipped with -files instead of -file
+        """
+        staged_files = {path: self._stage_file(path) for path in self._local_files(args)}
+
+        launcher_args = [f"{HADOOP_HOME}/bin/{args[0]}", *args[1:3]]
+        if staged_files:
+            # -files is a generic option, so it precedes the streaming options
+            launcher_args += ["-files", ",".join(staged_files.values())]
+        remaining_args = iter(args[3:])
+        for arg in remaining_args:
+            if arg == "-file":
+                next(remaining_args)
+            elif arg in STREAMING_FILE_OPTIONS:
+                value = next(remaining_args)
+                # The staged files are linked into the working directory of every task
+                launcher_args += [arg, Path(value).name if Path(value) in staged_files else value]
+            else:
+                launcher_args.append(arg)
+        return launcher_args
+
+    def _submission_context(
+            self, application_id: str, config: HadoopJobConfig, shell_commands: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        :param shell_commands: the local resource of the launcher's command
+        """
+        application_master_command = (
+            f"{{{{JAVA_HOME}}}}/bin/java -Xmx{LAUNCHER_AM_HEAP_MB}m {DISTRIBUTED_SHELL_APPLICATION_MASTER} "
+            f"--container_memory {LAUNCHER_CONTAINER_MEMORY_MB} --container_vcores {LAUNCHER_VCORES} "
+            f"--num_containers 1 --priority 0 1><LOG_DIR>/AppMaster.stdout 2><LOG_DIR>/AppMaster.stderr"
+        )
+        return {
+            "application-id": application_id,
+            "application-name": f"launcher-{config.output_path.name}",
+            "application-type": "YARN",
+            "queue": self.queue,
+            "am-container-spec": {
+                "local-resources": {"entry": [{"key": SHELL_COMMANDS_FILE, "value": shell_commands}]},
+                "commands": {"command": application_master_command},
+                "environment": {"entry": [{"key": "CLASSPATH", "value": LAUNCHER_CLASSPATH}]},
+            },
+            "unmanaged-AM": False,
+            "max-app-attempts": 1,
+            "resource": {"memory": LAUNCHER_AM_MEMORY_MB, "vCores": LAUNCHER_VCORES},
+            "keep-containers-across-application-attempts": False,
+        }
+
+    def submit(self, config: HadoopJobConfig) -> RestSubmittedJob:
+        args = config.get_hadoop_job_args()
+        new_application = self._request(f"{self.resource_manager_address}{NEW_APPLICATION_PATH}", "POST")
+        application_id = new_application["application-id"]
+
+        shell_commands_path = posixpath.join(self.staging_directory, application_id, SHELL_COMMANDS_FILE)
+        shell_commands_status = self._upload(shell_commands_path, shlex.join(self.launcher_args(args)).encode())
+        shell_commands = {
+            "resource": f"{HDFS_NAMENODE}{shell_commands_path}",
+            "type": "FILE",
+            "visibility": "APPLICATION",
+            "size": shell_commands_status["length"],
+            "timestamp": shell_commands_status["modificationTime"],
+        }
+
+        submission_context = self._submission_context(application_id, config, shell_commands)
+        self._request(
+            f"{self.resource_manager_address}{APPLICATIONS_PATH}", "POST", json.dumps(submission_context).encode()
+        )
+        logger.info(f"Submitted application {application_id}")
+        return RestSubmittedJob(self, args, application_id)
+
+    def application_state(self, application_id: str) -> Tuple[str, str]:
+        """
+        :return: the state (e.g., RUNNING) and the final status (e.g., SUCCEEDED) of the application
+        """
+        application = self._request(f"{self.resource_manager_address}{APPLICATIONS_PATH}/{application_id}")["app"]
+        return application["state"], application["finalStatus"]
+
+    def kill(self, application_id: str):
+        self._request(
+            f"{self.resource_manager_address}{APPLICATIONS_PATH}/{application_id}/state",
+            "PUT",
+            json.dumps({"state": "KILLED"}).encode(),
+        )
+
+    def launcher_containers(self, config: HadoopJobConfig) -> List[LauncherContainer]:
+        return [
+            LauncherContainer(LAUNCHER_AM_MEMORY_MB, LAUNCHER_VCORES, is_application_master=True),
+            LauncherContainer(LAUNCHER_CONTAINER_MEMORY_MB, LAUNCHER_VCORES, is_application_master=False),
+        ]
+
+
+def create_submitter(
+        submitter_type: JobSubmitterType,
+        resource_manager_address: str = RESOURCE_MANAGER_ADDRESS,
+        webhdfs_address: str = WEBHDFS_ADDRESS,
+        capture_output: bool = True,
+) -> JobSubmitter:
+    if submitter_type == JobSubmitterType.REST:
+        return RestJobSubmitter(resource_manager_address, webhdfs_address)
+    if submitter_type == JobSubmitterType.DRY_RUN:
+        return DryRunJobSubmitter()
+    return SubprocessJobSubmitter(capture_output)
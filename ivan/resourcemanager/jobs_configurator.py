@@ -1,11 +1,25 @@
 import math
-import subprocess
+import random
+from collections.abc import Sequence as SequenceABC
 from enum import Enum
-from itertools import product
 from pathlib import Path
-from typing import List, Dict, Any, Union, Iterable, Sequence, Set
-from pydantic import BaseModel, model_validator, PrivateAttr
-from hadoop_job_config import CompressionCodec, HadoopJobConfig, GarbageCollector
+from typing import List, Dict, Any, Union, Iterable, Sequence, Set, Optional, Iterator, Callable, Tuple
+from pydantic import BaseModel, Field, model_validator, PrivateAttr
+from config_rules import ConfigRulesMode, PreflightCheck, preflight, SkippedExperiment
+from experiments_journal import DEFAULT_JOURNAL_PATH
+from hadoop_job_config import (
+    CompressionCodec, HadoopJobConfig, GarbageCollector, IOFormat, HDFS_BACKEND_KEY
+)
+from hdfs_backends import CachedHdfsBackend, HdfsBackendType, WEBHDFS_ADDRESS, create_backend, normalize_path
+from job_scheduler import ClusterCapacity
+from job_submitters import JobSubmitterType
+from launch_pacing import DEFAULT_READINESS_TIMEOUT_SECONDS, RESOURCE_MANAGER_ADDRESS, LaunchPacing
+from job_monitor import DEFAULT_JOB_LOGS_DIRECTORY
+from metrics_store import DEFAULT_METRICS_DATABASE_PATH
+from search_strategies import SearchStrategyType
+
+# Number of upcoming experiments whose output paths are checked against HDFS in a single query
+PREFETCH_BATCH_SIZE = 100
 
 
 class ExperimentMode(str, Enum):
@@ -13,6 +27,168 @@ class ExperimentMode(str, Enum):
     PARALLEL = "parallel"
 
 
+class PrefixedOutputPaths(SequenceABC):
+    """
+    The lazy sequence <prefix>/output_1, <prefix>/output_2, ..., <prefix>/output_<length>
+    """
+
+    def __init__(self, prefix: str, length: int):
+        self.prefix = Path(prefix)
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index: int) -> str:
+        if not -self.length <= index < self.length:
+            raise IndexError(f"Output path index out of range: {index}")
+        return f"{self.prefix / f'output_{index % self.length + 1}'}"
+
+
+class ExperimentsGrid(SequenceABC):
+    """
+    A lazy view of the cartesian product of the parameters grid (in itertools.product order).
+    Its size is known up front, but each 'HadoopJobConfig' is built and validated only when it is fetched.
+    Slicing, shard() and sample() return smaller grids that select a subset of the combinations, where each
+    combination keeps its index (and therefore its output path) in the full grid.
+    The checks (see checked()) also run only when a configuration is fetched: fetching an experiment that should not
+    run raises SkippedExperiment, and iterating over the grid skips it.
+    """
+
+    def __init__(
+            self,
+            parameters_grid: Dict[str, Sequence[Any]],
+            output_paths: Sequence[str],
+            validation_context: Optional[Dict[str, Any]] = None,
+            indices: Optional[Sequence[int]] = None,
+            transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+            checks: Sequence[Callable[[Dict[str, Any]], Dict[str, Any]]] = (),
+    ):
+        self.parameters_grid = parameters_grid
+        self.output_paths = output_paths
+        self.validation_context = validation_context
+        self.indices = range(math.prod(map(len, parameters_grid.values()))) if indices is None else indices
+        # Applied to the field values of every combination (e.g., to derive values from other fields)
+        self.transform = transform
+        # Applied, in order, to the field values of a combination only when its configuration is built (see checked())
+        self.checks = checks
+
+    def _with_indices(self, indices: Sequence[int]) -> "ExperimentsGrid":
+        return ExperimentsGrid(
+            self.parameters_grid, self.output_paths, self.validation_context, indices, self.transform, self.checks
+        )
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def combination(self, position: int) -> Dict[str, Any]:
+        """
+        :return: the (unvalidated) field values of the combination at the given position, including its output path
+        """
+        index = self.indices[position]
+        values = {"output_path": self.output_paths[index]}
+        # The last field changes the fastest (like itertools.product)
+        for name, field_values in reversed(list(self.parameters_grid.items())):
+            index, value_index = divmod(index, len(field_values))
+            values[name] = field_values[value_index]
+        return self.transform(values) if self.transform else values
+
+    def __getitem__(self, position: Union[int, slice]) -> Union[HadoopJobConfig, "ExperimentsGrid"]:
+        if isinstance(position, slice):
+            return self._with_indices(self.indices[position])
+        return self.config(position)
+
+    def config(self, position: int, repetition: int = 0) -> HadoopJobConfig:
+        """
+        :param repetition: how many times the combination already ran. Every repetition writes to its own output path,
+        <output path>_r<repetition>, so it does not collide with the output of the previous runs.
+        :return: the validated configuration of the combination at the given position
+        :raises SkippedExperiment: if one of the checks rejected the combination
+        """
+        values = self.combination(position)
+        for check in self.checks:
+            values = check(values)
+        if repetition:
+            values["output_path"] = f"{values['output_path']}_r{repetition}"
+        return HadoopJobConfig.model_validate(values, context=self.validation_context)
+
+    def __iter__(self) -> Iterator[HadoopJobConfig]:
+        hdfs_backend = (self.validation_context or {}).get(HDFS_BACKEND_KEY)
+        for start in range(0, len(self), PREFETCH_BATCH_SIZE):
+            # Check the output paths of the next batch against HDFS using a single query
+            if isinstance(hdfs_backend, CachedHdfsBackend):
+                hdfs_backend.prefetch(
+                    self.output_paths[index] for index in self.indices[start:start + PREFETCH_BATCH_SIZE]
+                )
+            for position in range(start, min(start + PREFETCH_BATCH_SIZE, len(self))):
+                try:
+                    yield self[position]
+                except SkippedExperiment:
+                    continue
+
+    def shard(self, shard_index: int, number_of_shards: int) -> "ExperimentsGrid":
+        """
+        :return: every number_of_shards-th combination, starting at shard_index (shards are disjoint, and together
+        they cover the whole grid)
+        """
+        if not 0 <= shard_index < number_of_shards:
+            raise ValueError(f"Shard index must be in [0, {number_of_shards}), got {shard_index}")
+        return self._with_indices(self.indices[shard_index::number_of_shards])
+
+    def sample(self, sample_size: int, seed: Optional[int] = None) -> "ExperimentsGrid":
+        """
+        :return: a uniform random sample of sample_size combinations (without replacement), in grid order
+        """
+        positions = sorted(random.Random(seed).sample(range(len(self)), min(sample_size, len(self))))
+        return self.select(positions)
+
+    def select(self, positions: Iterable[int]) -> "ExperimentsGrid":
+        """
+        :return: the combinations at the given positions of this grid
+        """
+        return self._with_indices([self.indices[position] for position in positions])
+
+    def transformed(self, transform: Callable[[Dict[str, Any]], Dict[str, Any]]) -> "ExperimentsGrid":
+        """
+        :return: the same combinations, where the field values of each are passed through transform
+        """
+        return ExperimentsGrid(
+            self.parameters_grid, self.output_paths, self.validation_context, self.indices, transform, self.checks
+        )
+
+    def checked(self, check: Callable[[Dict[str, Any]], Dict[str, Any]]) -> "ExperimentsGrid":
+        """
+        :param check: receives the field values of a combination that is about to be built, and returns the values to
+        build it from (e.g., fixed), or raises SkippedExperiment if it should not run (e.g., the pre-flight check of
+        config_rules.py). Nothing is checked here: the check runs whenever a configuration is fetched.
+        :return: the same combinations, with the check
+        """
+        return ExperimentsGrid(
+            self.parameters_grid, self.output_paths, self.validation_context, self.indices, self.transform,
+            (*self.checks, check)
+        )
+
+    def summary(self) -> str:
+        """
+        :return: the number of experiments, and the values of every field that changes between combinations
+        """
+        varying_fields = {name: values for name, values in self.parameters_grid.items() if len(values) > 1}
+        total_combinations = math.prod(map(len, self.parameters_grid.values()))
+        lines = [f"{len(self)} experiments (out of {total_combinations} combinations)"]
+        if varying_fields:
+            lines.append("Varying fields:")
+            lines.extend(
+                f"  {name} ({len(values)} values): {', '.join(map(_format_value, values))}"
+                for name, values in varying_fields.items()
+            )
+        lines.append(f"Output paths: {self.output_paths[self.indices[0]]}, ..." if len(self) else "Output paths: -")
+        return "\n".join(lines)
+
+
+def _format_value(value: Any) -> str:
+    return value.name if isinstance(value, Enum) else str(value)
+
+
 class AutomaticExperimentsConfig(BaseModel):
     """
     This class is used to define a grid search of 'HadoopJobConfig's.
@@ -26,7 +202,50 @@ class AutomaticExperimentsConfig(BaseModel):
 
     # Meta parameters
     mode: ExperimentMode = ExperimentMode.SEQUENTIAL
+    # When the next job starts (see launch_pacing.py): after the cluster is ready according to the ResourceManager
+    # (waiting at most readiness_timeout_seconds), or after sleeping sleep_between_launches seconds.
+    # sleep_between_launches is also used when the ResourceManager is unreachable.
+    launch_pacing: LaunchPacing = LaunchPacing.READINESS
+    resource_manager_address: str = RESOURCE_MANAGER_ADDRESS
+    readiness_timeout_seconds: float = Field(DEFAULT_READINESS_TIMEOUT_SECONDS, gt=0)
     sleep_between_launches: int = 5
+    # Which experiments of the grid run, and in what order (sequential mode only, see search_strategies.py).
+    # The search stops after max_runs jobs, or when the total runtime of the jobs reaches max_cluster_hours.
+    # In parallel mode, max_runs runs the first experiments of the grid (max_cluster_hours is sequential mode only).
+    search_strategy: SearchStrategyType = SearchStrategyType.GRID
+    max_runs: Optional[int] = None
+    max_cluster_hours: Optional[float] = None
+    search_seed: Optional[int] = None
+    # In sequential mode, the next experiment is prepared (validated and staged), and the output of the previous one is
+    # removed (unless the outputs are kept), while the current job runs (see sequential_pipeline.py)
+    pipeline_sequential_mode: bool = True
+    # How output paths are checked against HDFS (all output paths are checked at once, before validating the grid),
+    # and removed (in batches, see hdfs_backends.py)
+    hdfs_backend: HdfsBackendType = HdfsBackendType.BATCHED_CLI
+    # Removed output paths are deleted right away, instead of moving them to the trash (WebHDFS always deletes them)
+    skip_trash: bool = False
+    # Parallel mode only launches jobs whose containers fit the free capacity of the cluster (see job_scheduler.py),
+    # and at most max_concurrent_jobs jobs at a time (if set). The capacity is read from hadoop.env by default.
+    max_concurrent_jobs: Optional[int] = Field(None, gt=0)
+    cluster_capacity: ClusterCapacity = Field(default_factory=ClusterCapacity.from_environment)
+    # The wall time, exit code, application ID and counters of every run are stored in this SQLite database
+    # (see metrics_store.py). Set to None to disable.
+    metrics_database_path: Optional[Path] = DEFAULT_METRICS_DATABASE_PATH
+    # The status of every experiment is journaled in this file, so an interrupted sweep can continue with --resume
+    # (see experiments_journal.py). Set to None to disable.
+    journal_path: Optional[Path] = DEFAULT_JOURNAL_PATH
+    # What to do with combinations that break cross-field rules, e.g., a heap larger than its container
+    # (see config_rules.py): report them, prune them from the grid, or fix them (and prune those that cannot be fixed)
+    config_rules: ConfigRulesMode = ConfigRulesMode.PRUNE
+    # How jobs are submitted (see job_submitters.py): a `hadoop jar` subprocess, the ResourceManager REST API
+    # (at resource_manager_address, staging the jobs' files through webhdfs_address), or a dry run, which only prints
+    # the commands and does not record anything
+    job_submitter: JobSubmitterType = JobSubmitterType.SUBPROCESS
+    webhdfs_address: str = WEBHDFS_ADDRESS
+    # The output of every job is written to its own log file, in a directory per run under this one, along with the
+    # progress events of the jobs (see job_monitor.py). In parallel mode, a live view of the jobs' progress is printed
+    # instead of their interleaved output. Set to None to print the output of the jobs to the terminal.
+    job_logs_directory: Optional[Path] = DEFAULT_JOB_LOGS_DIRECTORY
 
     # Task Definition
     input_path: Union[str, Sequence[str], None] = None
@@ -35,6 +254,8 @@ class AutomaticExperimentsConfig(BaseModel):
     output_path: Union[str, Sequence[str], None] = None
     mapper_path: Union[str, Sequence[str], None] = None
     reducer_path: Union[str, Sequence[str], None] = None
+    # A sequence may contain None to sweep over running without a combiner, e.g., [None, "/home/combiner.py"]
+    combiner_path: Union[str, Sequence[Optional[str]], None] = None
 
     # Parallelism & Scheduling
     number_of_mappers: Union[int, Sequence[int], None] = None
@@ -65,6 +286,7 @@ class AutomaticExperimentsConfig(BaseModel):
     io_sort_factor: Union[int, Sequence[int], None] = None
     should_compress: Union[bool, Sequence[bool], None] = None
     map_compress_codec: Union[CompressionCodec, Sequence[CompressionCodec], None] = None
+    io_format: Union[IOFormat, Sequence[IOFormat], None] = None
 
     # JVM & Garbage Collection Settings
     map_garbage_collector: Union[GarbageCollector, Sequence[GarbageCollector], None] = None
@@ -73,8 +295,12 @@ class AutomaticExperimentsConfig(BaseModel):
     reduce_garbage_collector_threads_num: Union[int, Sequence[int], None] = None
 
     # Private fields
-    _all_experiments_configs: List[HadoopJobConfig] = PrivateAttr()
+    _all_experiments_configs: "ExperimentsGrid" = PrivateAttr()
     _user_configured_fields: Set[str] = PrivateAttr()
+    _hdfs_backend: CachedHdfsBackend = PrivateAttr()
+    _removed_output_paths: Set[str] = PrivateAttr(default_factory=set)
+    # The output paths of repeated experiments (see ExperimentsGrid.config), besides the output paths of the grid
+    _repetition_output_paths: List[str] = PrivateAttr(default_factory=list)
 
     @staticmethod
     def _is_iterable(val: Any) -> bool:
@@ -82,22 +308,20 @@ class AutomaticExperimentsConfig(BaseModel):
         return isinstance(val, Iterable) and not isinstance(val, (str, dict, bytes))
 
     @staticmethod
-    def _normalize_output_path(output_paths: List[str], parameters_grid) -> List[str]:
+    def _normalize_output_path(output_paths: List[str], number_of_combinations: int) -> Sequence[str]:
         """
         :return: The same output paths as received if the list length is aligned with the total number of experiments
         that are supposed to run.
         If a single element list has arrived (representing a directory to insert outputs into),
-        expand it so each element will look like:
+        expand it (lazily) so each element will look like:
         [<original element>/output_1, <original element>/output_2, <original element>/output_3, ...]
 
         :raises: ValueError in the cases where the received list length is not 1 or total number of experiments
         """
-        number_of_combinations = math.prod(map(len, parameters_grid.values()))
         if len(output_paths) == number_of_combinations:
             return output_paths
         elif len(output_paths) == 1:
-            output_path_prefix = output_paths[0]
-            return [f"{Path(output_path_prefix) / Path(f'output_{i + 1}')}" for i in range(number_of_combinations)]
+            return PrefixedOutputPaths(output_paths[0], number_of_combinations)
 
         raise ValueError(
             f"Output path should consists a single value "
@@ -142,20 +366,20 @@ class AutomaticExperimentsConfig(BaseModel):
 
     def _generate_experiments_configs(self):
         """
-        This function validates that all configuration combinations provided by the user are valid.
-        If they are, it saves all configurations as a list of 'HadoopJobConfig' object that could be fetched later on.
+        This function defines the (lazy) grid of all configuration combinations provided by the user.
+        Each 'HadoopJobConfig' is built and validated only when it is fetched from the grid (right before it runs).
         """
-        self._all_experiments_configs = []
-
         parameters_grid = self.get_config_parameters_grid()
-        normalized_output_paths = parameters_grid.pop("output_path")
-        normalized_output_paths = self._normalize_output_path(normalized_output_paths, parameters_grid)
+        output_paths = parameters_grid.pop("output_path")
+        number_of_combinations = math.prod(map(len, parameters_grid.values()))
+        normalized_output_paths = self._normalize_output_path(output_paths, number_of_combinations)
 
-        keys = list(parameters_grid.keys())
-        for job_configuration_values, output_path in zip(product(*parameters_grid.values()), normalized_output_paths):
-            self._all_experiments_configs.append(
-                HadoopJobConfig.model_validate(dict(zip(keys, job_configuration_values), output_path=output_path))
-            )
+        self._hdfs_backend = create_backend(self.hdfs_backend)
+        self._all_experiments_configs = ExperimentsGrid(
+            parameters_grid,
+            normalized_output_paths,
+            validation_context={HDFS_BACKEND_KEY: self._hdfs_backend},
+        )
 
     @model_validator(mode="after")
     def _run_all_validators(self):
@@ -176,7 +400,10 @@ class AutomaticExperimentsConfig(BaseModel):
 
         return params
 
-    def all_experiments_configurations(self) -> List[HadoopJobConfig]:
+    def all_experiments_configurations(self) -> "ExperimentsGrid":
+        """
+        :return: a lazy sequence of all experiments configurations (supports len, indexing, slicing, shard and sample)
+        """
         return self._all_experiments_configs
 
     def _core_fields_configured_by_user(self) -> Set[str]:
@@ -200,22 +427,66 @@ class AutomaticExperimentsConfig(BaseModel):
             for field_name in self._core_fields_configured_by_user()
         }
 
+    def _remove_paths(self, output_paths: Sequence[str]) -> bool:
+        """
+        Removes the paths through the HDFS backend (see hdfs_backends.py), and reports every path that was not removed.
+        """
+        results = self._hdfs_backend.remove_many(output_paths, skip_trash=self.skip_trash)
+        failed_results = [result for result in results.values() if not result.removed]
+        for result in failed_results:
+            print(f"Could not remove {result.path}: {result.error}")
+        if len(results) > 1:
+            print(f"Removed {len(results) - len(failed_results)} of {len(results)} output paths")
+        self._removed_output_paths.update(result.path for result in results.values() if result.removed)
+        return not failed_results
+
+    def remove_output(self, output_path: str) -> bool:
+        """
+        Removes the output of a single finished experiment (see sequential_pipeline.py), so remove_outputs() skips it.
+        """
+        return self._remove_paths([output_path])
+
+    def add_repetition_output_path(self, output_path: str):
+        """
+        Registers the output path of a repeated experiment, so remove_outputs() removes it as well.
+        """
+        self._repetition_output_paths.append(output_path)
+
     def remove_outputs(self) -> bool:
-        success = True
-        for path in self.output_path:
-            result = subprocess.run(["hdfs", "dfs", "-rm", "-r", "-f", str(path)])
-            if result.returncode != 0:
-                print(f"Could not remove {path}")
-                success = False
-        return success
+        """
+        Removes the output paths that were not removed already, in batches (according to the HDFS backend).
+        """
+        return self._remove_paths([
+            path for path in [*self.output_path, *self._repetition_output_paths]
+            if normalize_path(path) not in self._removed_output_paths
+        ])
 
-    def __str__(self):
+    def preflight(self, experiments: ExperimentsGrid) -> Tuple[ExperimentsGrid, PreflightCheck]:
+        """
+        :return: the experiments, checked against the cross-field rules when they are fetched (see config_rules.py), and
+        the check (with the report of the violations)
+        """
+        return preflight(experiments, self.config_rules, self.cluster_capacity)
+
+    def remove_unfinished_outputs(self, output_paths: Sequence[str]) -> bool:
+        """
+        Removes the (possibly partial) outputs of experiments that are about to run again.
+        """
+        return self._remove_paths(output_paths)
+
+    def format_experiments(self, experiments: Iterable[HadoopJobConfig]) -> str:
+        """
+        :return: the full Hadoop command and the user selection of every experiment (validates each of them)
+        """
         return "\n\n".join(
             f"************************************ Experiment {i + 1} ************************************\n"
             f"{experiment_config}\n"
             f"{experiment_config.format_user_selection(self.user_selected_fields(experiment_config))}"
-            for i, experiment_config in enumerate(self._all_experiments_configs)
+            for i, experiment_config in enumerate(experiments)
         )
 
+    def __str__(self):
+        return f"Mode: {self.mode.value}\n{self._all_experiments_configs.summary()}"
+
     def __len__(self) -> int:
         return len(self._all_experiments_configs)
@@ -0,0 +1,218 @@
+"""
+Decides when the next Hadoop job of a sweep may start.
+
+Sleeping a fixed number of seconds after every job either wastes time, or starts the next job while the containers
+of the previous one are still tearing down (and skews its measurements). Instead, the readiness pacer polls the
+cluster metrics of the ResourceManager REST API (GET /ws/v1/cluster/metrics):
+- Sequential mode: after a job terminates, it waits until the running applications and the allocated containers drop
+  back to their baseline (their values when the sweep started).
+- Parallel mode: after a job is launched, it waits until YARN has accepted the new application (it was submitted, and
+  no application is pending beyond the baseline), so the next launch sees the up-to-date cluster state. The wait ends
+  early if the job's client exits (e.g., it failed before submitting the application).
+Each wait gives up after a timeout. If the ResourceManager is unreachable, the pacer falls back to a fixed sleep.
+See resource_manager_stub.py for a local stub of the API.
+"""
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, TYPE_CHECKING
+
+from pydantic import BaseModel, Field
+
+from case_insensitive_enum import CaseInsensitiveEnum
+
+if TYPE_CHECKING:
+    from job_submitters import SubmittedJob
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_MANAGER_ADDRESS = "http://resourcemanager-1:8088"
+CLUSTER_METRICS_PATH = "/ws/v1/cluster/metrics"
+RESOURCE_MANAGER_TIMEOUT_SECONDS = 5
+DEFAULT_READINESS_TIMEOUT_SECONDS = 300.0
+DEFAULT_READINESS_POLL_INTERVAL_SECONDS = 1.0
+
+
+class LaunchPacing(CaseInsensitiveEnum):
+    SLEEP = "sleep"
+    READINESS = "readiness"
+
+
+class ClusterMetrics(BaseModel):
+    """
+    The fields of the ResourceManager's cluster metrics used for pacing (the response contains many more).
+    """
+
+    model_config = {"populate_by_name": True}
+
+    apps_submitted: int = Field(0, alias="appsSubmitted")
+    apps_pending: int = Field(0, alias="appsPending")
+    apps_running: int = Field(0, alias="appsRunning")
+    containers_allocated: int = Field(0, alias="containersAllocated")
+    containers_pending: int = Field(0, alias="containersPending")
+    allocated_mb: int = Field(0, alias="allocatedMB")
+    allocated_vcores: int = Field(0, alias="allocatedVirtualCores")
+
+
+class ResourceManagerClient:
+    def __init__(
+            self,
+            address: str = RESOURCE_MANAGER_ADDRESS,
+            timeout_seconds: float = RESOURCE_MANAGER_TIMEOUT_SECONDS,
+    ):
+        self.address = address.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+
+    def cluster_metrics(self) -> ClusterMetrics:
+        """
+        :raises OSError: if the ResourceManager is unreachable (urllib.error.URLError is an OSError)
+        """
+        import urllib.request
+
+        request = urllib.request.Request(
+            f"{self.address}{CLUSTER_METRICS_PATH}", headers={"Accept": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout_seconds) as response:
+            return ClusterMetrics.model_validate(json.load(response)["clusterMetrics"])
+
+
+class LaunchPacer(ABC):
+    """
+    Called by the experiment modes between jobs.
+    """
+
+    def start(self):
+        """
+        Called once, before the first job of the sweep.
+        """
+        pass
+
+    def before_launch(self):
+        """
+        Called right before a job is launched.
+        """
+        pass
+
+    @abstractmethod
+    def after_launch(self, submitted_job: "SubmittedJob"):
+        """
+        Called after a job is launched in parallel mode. Returns when the next job may be launched.
+        """
+        pass
+
+    @abstractmethod
+    def after_job(self):
+        """
+        Called after a job terminates in sequential mode. Returns when the next job may start.
+        """
+        pass
+
+
+class SleepPacer(LaunchPacer):
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def after_launch(self, submitted_job: "SubmittedJob"):
+        time.sleep(self.seconds)
+
+    def after_job(self):
+        time.sleep(self.seconds)
+
+
+class ReadinessPacer(LaunchPacer):
+    """
+    Waits for the cluster state reported by the ResourceManager (see the module's docstring).
+    """
+
+    def __init__(
+            self,
+            client: ResourceManagerClient,
+            timeout_seconds: float = DEFAULT_READINESS_TIMEOUT_SECONDS,
+            poll_interval_seconds: float = DEFAULT_READINESS_POLL_INTERVAL_SECONDS,
+            fallback_sleep_seconds: float = 0,
+    ):
+        self.client = client
+        self.timeout_seconds = timeout_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.fallback_sleep_seconds = fallback_sleep_seconds
+        self.baseline: Optional[ClusterMetrics] = None
+        self._apps_submitted_before_launch: Optional[int] = None
+
+    def _metrics(self) -> Optional[ClusterMetrics]:
+        try:
+            return self.client.cluster_metrics()
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not read the cluster metrics from {self.client.address}: {e}")
+            return None
+
+    def _wait_for(
+            self,
+            description: str,
+            is_ready: Callable[[ClusterMetrics], bool],
+            should_stop: Optional[Callable[[], bool]] = None,
+    ) -> bool:
+        """
+        :param should_stop: checked between the polls, stops waiting (without waiting for the cluster) if it is true
+        :return: True if the cluster got ready before the timeout
+        """
+        deadline = time.monotonic() + self.timeout_seconds
+        while True:
+            metrics = self._metrics()
+            if metrics is None:
+                time.sleep(self.fallback_sleep_seconds)
+                return False
+            if is_ready(metrics):
+                return True
+            if should_stop is not None and should_stop():
+                return False
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out after {self.timeout_seconds} seconds waiting for {description}: {metrics}")
+                return False
+            time.sleep(self.poll_interval_seconds)
+
+    def start(self):
+        self.baseline = self._metrics() or ClusterMetrics()
+        logger.info(f"Cluster baseline: {self.baseline}")
+
+    def before_launch(self):
+        metrics = self._metrics()
+        self._apps_submitted_before_launch = metrics.apps_submitted if metrics else None
+
+    def after_launch(self, submitted_job: "SubmittedJob"):
+        baseline = self.baseline or ClusterMetrics()
+        submitted_before = self._apps_submitted_before_launch
+        self._wait_for(
+            "the application to be accepted",
+            lambda metrics: (
+                (submitted_before is None or metrics.apps_submitted > submitted_before)
+                and metrics.apps_pending <= baseline.apps_pending
+            ),
+            # A client that exited will not submit the application anymore
+            should_stop=lambda: submitted_job.poll() is not None,
+        )
+
+    def after_job(self):
+        baseline = self.baseline or ClusterMetrics()
+        self._wait_for(
+            "the cluster to become idle",
+            lambda metrics: (
+                metrics.apps_running <= baseline.apps_running
+                and metrics.containers_allocated <= baseline.containers_allocated
+            ),
+        )
+
+
+def create_pacer(
+        pacing: LaunchPacing,
+        sleep_seconds: float,
+        resource_manager_address: str = RESOURCE_MANAGER_ADDRESS,
+        timeout_seconds: float = DEFAULT_READINESS_TIMEOUT_SECONDS,
+) -> LaunchPacer:
+    if pacing == LaunchPacing.SLEEP:
+        return SleepPacer(sleep_seconds)
+    return ReadinessPacer(
+        ResourceManagerClient(resource_manager_address),
+        timeout_seconds=timeout_seconds,
+        fallback_sleep_seconds=sleep_seconds,
+    )
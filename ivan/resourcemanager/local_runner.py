@@ -0,0 +1,388 @@
+"""
+A local execution engine for HadoopJobConfig.
+
+Runs the job's mapper and reducer scripts as worker processes on a single machine, without HDFS, YARN or a JVM:
+1. The local input (a file or a directory) is divided into splits, according to the split size fields of the config.
+2. Each map task feeds its split into the mapper, and hash-partitions and sorts the map output into a single file
+   with a segment per reducer (like Hadoop's map output files). The sort spills to disk and merges like Hadoop,
+   according to the sort buffer size, the merge factor and the compression fields of the config (see external_sort.py).
+   If the config has a combiner, it runs on every partition of every spill.
+3. Each reduce task merges the sorted segments of its partition into the reducer, and writes a part file.
+
+Map and reduce tasks run in a pool of processes, so the job uses all cores.
+The scripts receive the same environment variables Hadoop streaming exports to them (e.g., stream_map_output),
+so the bundled scripts pick the intermediate format of the job exactly as they do on the cluster.
+
+Usage (accepts all the flags of run_task.py, where input and output paths are local):
+    python3 local_runner.py -i ./input -o ./output -mp ./mapper.py -rp ./reducer.py -r 4
+"""
+import heapq
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import islice
+from operator import itemgetter
+from pathlib import Path
+from typing import List, Dict, Iterator, Iterable, BinaryIO
+
+from external_sort import ExternalSorter, Segment, read_segment
+from hadoop_job_config import HadoopJobConfig, SKIP_HDFS_VALIDATION_KEY
+from streaming_codec import get_codec, iterate_blocks
+
+# Hadoop's default HDFS block size (dfs.blocksize), which bounds the split size like in FileInputFormat
+DEFAULT_BLOCK_SIZE = 128 * 1024 * 1024
+# Like FileInputFormat, the last split of a file may be up to 10% larger than the split size
+SPLIT_SLOP = 1.1
+COUNTER_PREFIX = "reporter:counter:"
+SUCCESS_FILE_NAME = "_SUCCESS"
+# Number of merged records written to the reducer at once
+REDUCE_INPUT_BATCH_SIZE = 10_000
+
+
+@dataclass
+class InputSplit:
+    path: Path
+    start: int
+    length: int
+
+
+@dataclass
+class TaskResult:
+    task_name: str
+    input_records: int = 0
+    output_records: int = 0
+    output_bytes: int = 0
+    counters: Dict[str, int] = field(default_factory=dict)
+    # The segments (one per partition) of a map task's output file
+    segments: List[Segment] = field(default_factory=list)
+
+
+def list_input_files(input_path: Path) -> List[Path]:
+    """
+    :return: the input files, skipping hidden files and files starting with '_' (like FileInputFormat)
+    """
+    if input_path.is_file():
+        return [input_path]
+    return sorted(
+        path for path in input_path.rglob("*")
+        if path.is_file() and not any(part.startswith((".", "_")) for part in path.relative_to(input_path).parts)
+    )
+
+
+def compute_split_size(config: HadoopJobConfig, total_size: int, block_size: int) -> int:
+    """
+    Combines the split size rules of both MapReduce APIs:
+    the number of mappers is a hint for the goal size (mapred API), bounded by the max split size and the block size
+    (mapreduce API), and never smaller than the min split size.
+    """
+    goal_size = max(total_size // config.number_of_mappers, 1)
+    return max(config.min_split_size, 1, min(goal_size, config.max_split_size, block_size))
+
+
+def compute_splits(config: HadoopJobConfig, input_files: List[Path], block_size: int) -> List[InputSplit]:
+    total_size = sum(path.stat().st_size for path in input_files)
+    split_size = compute_split_size(config, total_size, block_size)
+
+    splits = []
+    for path in input_files:
+        file_size = path.stat().st_size
+        start = 0
+        while (file_size - start) / split_size > SPLIT_SLOP:
+            splits.append(InputSplit(path, start, split_size))
+            start += split_size
+        if file_size - start > 0:
+            splits.append(InputSplit(path, start, file_size - start))
+    return splits
+
+
+def read_split(split: InputSplit) -> bytes:
+    """
+    Reads the lines of the split, like LineRecordReader:
+    A split that does not start at the beginning of the file skips its first (partial) line, which belongs to the
+    previous split, and every split reads the line that crosses its end.
+    """
+    with open(split.path, "rb") as f:
+        if split.start == 0:
+            data = f.read(split.length)
+        else:
+            f.seek(split.start - 1)
+            f.readline()
+            data = f.read(max(split.start + split.length - f.tell(), 0))
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+    return data
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def partition_of(key: bytes, number_of_reducers: int) -> int:
+    return zlib.crc32(key) % number_of_reducers
+
+
+def streaming_environment(config: HadoopJobConfig, task_partition: int) -> Dict[str, str]:
+    """
+    :return: the job configuration entries that Hadoop streaming exports to the scripts' environment
+    """
+    return {
+        **os.environ,
+        "stream_map_output": config.io_format.value,
+        "stream_reduce_input": config.io_format.value,
+        "mapreduce_job_maps": str(config.number_of_mappers),
+        "mapreduce_job_reduces": str(config.number_of_reducers),
+        "mapreduce_task_partition": str(task_partition),
+    }
+
+
+def script_command(script_path: Path) -> List[str]:
+    return [sys.executable, str(script_path)] if script_path.suffix == ".py" else [str(script_path)]
+
+
+def parse_stderr(task_name: str, stderr: bytes, counters: Dict[str, int]):
+    """
+    Aggregates the 'reporter:counter:<group>,<counter>,<amount>' lines, and forwards any other line to stderr.
+    """
+    for line in stderr.decode(errors="replace").splitlines():
+        if line.startswith(COUNTER_PREFIX):
+            group, counter, amount = line[len(COUNTER_PREFIX):].rsplit(",", 2)
+            counters[f"{group}.{counter}"] = counters.get(f"{group}.{counter}", 0) + int(amount)
+        elif not line.startswith("reporter:"):
+            sys.stderr.write(f"[{task_name}] {line}\n")
+
+
+def run_map_task(config: HadoopJobConfig, task_index: int, split: InputSplit, work_directory: Path) -> TaskResult:
+    result = TaskResult(task_name=f"map-{task_index:05d}")
+    split_data = read_split(split)
+    result.input_records = split_data.count(b"\n")
+
+    sorter = ExternalSorter(
+        number_of_partitions=config.number_of_reducers,
+        sort_buffer_mb=config.sort_buffer_mb,
+        io_sort_factor=config.io_sort_factor,
+        io_format=config.io_format,
+        compression_codec=config.map_compress_codec if config.should_compress else None,
+        work_directory=Path(tempfile.mkdtemp(prefix=f"{result.task_name}.", dir=work_directory)),
+        combine=(
+            partial(run_combiner, config, task_index, result) if config.combiner_path is not None else None
+        ),
+    )
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            script_command(config.mapper_path),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+            env=streaming_environment(config, task_index),
+        )
+        # Feed the split from another thread, so the map output is sorted (and spilled) while the mapper runs
+        feeder = threading.Thread(target=_feed_input, args=(process.stdin, split_data))
+        feeder.start()
+        sorter.add_records(
+            get_codec(config.io_format.value).read_raw_records(process.stdout),
+            lambda key: partition_of(key, config.number_of_reducers)
+        )
+        feeder.join()
+        return_code = process.wait()
+
+        stderr_file.seek(0)
+        parse_stderr(result.task_name, stderr_file.read(), result.counters)
+
+    if return_code != 0:
+        sorter.close()
+        raise RuntimeError(f"{result.task_name} failed with exit code {return_code}")
+
+    result.segments = sorter.finish(map_output_path(work_directory, task_index))
+    sorter.close()
+
+    statistics = sorter.statistics
+    result.output_records = statistics.input_records
+    result.output_bytes = statistics.input_bytes
+    result.counters["Map-side sort.Spills"] = statistics.spills
+    result.counters["Map-side sort.Spilled Records"] = statistics.spilled_records
+    result.counters["Map-side sort.Merge passes"] = statistics.merge_passes
+    result.counters["Map-side sort.Bytes written"] = statistics.bytes_written
+    if config.combiner_path is not None:
+        result.counters["Map-side sort.Combine input records"] = statistics.combine_input_records
+        result.counters["Map-side sort.Combine output records"] = statistics.combine_output_records
+    return result
+
+
+def run_combiner(config: HadoopJobConfig, task_index: int, result: TaskResult, sorted_records: bytes) -> bytes:
+    """
+    Runs the combiner on the sorted records of a single partition of a spill.
+    :return: the combined records, encoded in the map output format
+    """
+    process = subprocess.run(
+        script_command(config.combiner_path),
+        input=sorted_records,
+        capture_output=True,
+        env=streaming_environment(config, task_index),
+    )
+    parse_stderr(result.task_name, process.stderr, result.counters)
+    if process.returncode != 0:
+        raise RuntimeError(f"{result.task_name} combiner failed with exit code {process.returncode}")
+    return process.stdout
+
+
+def _feed_input(stdin: BinaryIO, data: bytes):
+    try:
+        stdin.write(data)
+        stdin.close()
+    except BrokenPipeError:
+        pass
+
+
+def map_output_path(work_directory: Path, map_index: int) -> Path:
+    return work_directory / f"map-{map_index:05d}.out"
+
+
+def run_reduce_task(
+        config: HadoopJobConfig,
+        partition_index: int,
+        segments: List[Segment],
+        output_directory: Path
+) -> TaskResult:
+    result = TaskResult(task_name=f"reduce-{partition_index:05d}")
+    compression_codec = config.map_compress_codec if config.should_compress else None
+    sorted_runs = [read_segment(segment, config.io_format, compression_codec) for segment in segments]
+
+    output_path = output_directory / f"part-{partition_index:05d}"
+    with open(output_path, "wb") as output_file, tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            script_command(config.reducer_path),
+            stdin=subprocess.PIPE,
+            stdout=output_file,
+            stderr=stderr_file,
+            env=streaming_environment(config, partition_index),
+        )
+        try:
+            for records in batched(heapq.merge(*sorted_runs, key=itemgetter(0)), REDUCE_INPUT_BATCH_SIZE):
+                process.stdin.write(b"".join(record for _, record in records))
+                result.input_records += len(records)
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return_code = process.wait()
+
+        stderr_file.seek(0)
+        parse_stderr(result.task_name, stderr_file.read(), result.counters)
+
+    if return_code != 0:
+        raise RuntimeError(f"{result.task_name} failed with exit code {return_code}")
+
+    with open(output_path, "rb") as f:
+        result.output_records = sum(block.count(b"\n") for block in iterate_blocks(f))
+    result.output_bytes = output_path.stat().st_size
+    return result
+
+
+class LocalJobRunner:
+    """
+    Runs a HadoopJobConfig locally, using a pool of worker processes.
+    """
+
+    def __init__(self, config: HadoopJobConfig, parallelism: int = os.cpu_count(), block_size: int = DEFAULT_BLOCK_SIZE):
+        self.config = config
+        self.parallelism = parallelism
+        self.block_size = block_size
+
+    def run(self) -> List[TaskResult]:
+        input_path = Path(self.config.input_path)
+        output_directory = Path(self.config.output_path)
+        if output_directory.exists():
+            raise FileExistsError(f"Output path already exists: {output_directory}")
+
+        input_files = list_input_files(input_path)
+        if not input_files:
+            raise FileNotFoundError(f"No input files found in: {input_path}")
+
+        splits = compute_splits(self.config, input_files, self.block_size)
+        output_directory.mkdir(parents=True)
+        work_directory = Path(tempfile.mkdtemp(prefix="local_job_"))
+        try:
+            with ProcessPoolExecutor(max_workers=self.parallelism) as executor:
+                map_results = list(executor.map(
+                    run_map_task,
+                    [self.config] * len(splits),
+                    range(len(splits)),
+                    splits,
+                    [work_directory] * len(splits),
+                ))
+                reduce_results = list(executor.map(
+                    run_reduce_task,
+                    [self.config] * self.config.number_of_reducers,
+                    range(self.config.number_of_reducers),
+                    [
+                        [map_result.segments[partition_index] for map_result in map_results]
+                        for partition_index in range(self.config.number_of_reducers)
+                    ],
+                    [output_directory] * self.config.number_of_reducers,
+                ))
+        finally:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+        (output_directory / SUCCESS_FILE_NAME).touch()
+        return map_results + reduce_results
+
+
+def format_summary(results: List[TaskResult], elapsed_seconds: float) -> str:
+    map_results = [result for result in results if result.task_name.startswith("map")]
+    reduce_results = [result for result in results if result.task_name.startswith("reduce")]
+
+    counters = {}
+    for result in results:
+        for name, amount in result.counters.items():
+            counters[name] = counters.get(name, 0) + amount
+
+    lines = [
+        f"Job finished in {elapsed_seconds:.3f} seconds",
+        f"  Launched map tasks={len(map_results)}",
+        f"  Launched reduce tasks={len(reduce_results)}",
+        f"  Map input records={sum(result.input_records for result in map_results)}",
+        f"  Map output records={sum(result.output_records for result in map_results)}",
+        f"  Map output bytes={sum(result.output_bytes for result in map_results)}",
+        f"  Reduce input records={sum(result.input_records for result in reduce_results)}",
+        f"  Reduce output records={sum(result.output_records for result in reduce_results)}",
+    ]
+    lines.extend(f"  {name}={amount}" for name, amount in sorted(counters.items()))
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = HadoopJobConfig.to_argparse()
+    parser.description = "Run a Hadoop streaming job locally, using a pool of worker processes"
+    parser.add_argument(
+        "-P", "--parallelism",
+        type=int,
+        default=os.cpu_count(),
+        help="Maximum number of tasks running at the same time (default: number of cores)"
+    )
+    parser.add_argument(
+        "-bs", "--block_size",
+        type=int,
+        default=DEFAULT_BLOCK_SIZE,
+        help=f"Block size that bounds the split size, like the HDFS block size (default: {DEFAULT_BLOCK_SIZE} bytes)"
+    )
+
+    args = parser.parse_args()
+    parallelism = args.parallelism
+    block_size = args.block_size
+    del args.parallelism, args.block_size
+
+    # The paths are local, so there is nothing to validate against HDFS
+    job_config = HadoopJobConfig.from_argparse(args, context={SKIP_HDFS_VALIDATION_KEY: True})
+
+    start_time = time.perf_counter()
+    task_results = LocalJobRunner(job_config, parallelism, block_size).run()
+    print(format_summary(task_results, time.perf_counter() - start_time))
@@ -1,9 +1,76 @@
 #!/usr/bin/env python3
+import os
 import sys
+from functools import lru_cache
 
-for line in sys.stdin:
-    words = line.strip().lower().split()
-    for word in words:
-        if word:  # Skip empty words
-            signature = ''.join(sorted(word))
-            print(f'{signature}\t{word}')
+from streaming_runtime import OutputBuffer, get_environment_flag, read_blocks, report_counter
+
+# Random corpora repeat words heavily, so instead of emitting every occurrence, the distinct words are counted in a
+# bounded dictionary that is flushed whenever it reaches its entries / memory cap, and once more at the end of the input.
+# Each distinct word is emitted once per flush as (signature, (word, count)), or as (signature, word) if it appeared
+# once. reducer-anagrams.py expands the counts, so its output is identical to emitting every occurrence.
+# Hadoop streaming passes environment variables to the mapper using -cmdenv, e.g.:
+#   -cmdenv ANAGRAMS_DEDUPLICATION=0 -cmdenv ANAGRAMS_MAX_ENTRIES=100000 -cmdenv ANAGRAMS_MAX_MEMORY_MB=64
+DEDUPLICATION = get_environment_flag("ANAGRAMS_DEDUPLICATION", default=True)
+MAX_ENTRIES = int(os.environ.get("ANAGRAMS_MAX_ENTRIES", 100_000))
+MAX_MEMORY_BYTES = int(float(os.environ.get("ANAGRAMS_MAX_MEMORY_MB", 64)) * 1024 * 1024)
+# Memory available for memoizing signatures across flushes (and across lines, when deduplication is disabled)
+SIGNATURE_CACHE_MEMORY_BYTES = int(float(os.environ.get("ANAGRAMS_SIGNATURE_CACHE_MB", 32)) * 1024 * 1024)
+
+# Rough per-entry cost of a dict slot, its hash table share and the int counter (on top of the key string itself)
+DICT_ENTRY_OVERHEAD_BYTES = 100
+# Rough per-entry cost of an LRU cache entry (its linked list node and dict slot), a 5-letter word and its signature
+SIGNATURE_CACHE_ENTRY_BYTES = 250
+
+
+@lru_cache(maxsize=max(1, SIGNATURE_CACHE_MEMORY_BYTES // SIGNATURE_CACHE_ENTRY_BYTES))
+def signature(word: str) -> str:
+    return ''.join(sorted(word))
+
+
+def flush(output: OutputBuffer, counts: dict):
+    output.emit_many(
+        (signature(word), word if count == 1 else (word, count))
+        for word, count in counts.items()
+    )
+    counts.clear()
+
+
+def run_with_deduplication(output: OutputBuffer):
+    counts = {}
+    approximate_bytes = 0
+    number_of_flushes = 0
+
+    for block in read_blocks():
+        for word in block.lower().split():
+            if word in counts:
+                counts[word] += 1
+                continue
+
+            counts[word] = 1
+            approximate_bytes += sys.getsizeof(word) + DICT_ENTRY_OVERHEAD_BYTES
+            # The table is full - emit the partial counts, the reducer will merge them with the rest
+            if len(counts) >= MAX_ENTRIES or approximate_bytes >= MAX_MEMORY_BYTES:
+                flush(output, counts)
+                approximate_bytes = 0
+                number_of_flushes += 1
+
+    # Output whatever is left at the end of the input
+    if counts:
+        flush(output, counts)
+        number_of_flushes += 1
+
+    report_counter("Anagrams", "Deduplication flushes", number_of_flushes)
+
+
+def run_word_per_record(output: OutputBuffer):
+    for block in read_blocks():
+        output.emit_many((signature(word), word) for word in block.lower().split())
+
+
+if __name__ == "__main__":
+    with OutputBuffer() as map_output:
+        if DEDUPLICATION:
+            run_with_deduplication(map_output)
+        else:
+            run_word_per_record(map_output)
@@ -1,13 +1,79 @@
 #!/usr/bin/python3
-import sys
+import hashlib
+import os
 import random
+import time
+from typing import Callable, Optional
+
+from streaming_runtime import OutputBuffer, read_lines, report_counter, report_status
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, fall back to the pure-python engine
+    np = None
 
 # Mapper: Generate random points in unit square and emit 1 if inside unit circle
-for line in sys.stdin:
-    line = line.strip()
-    if not line:
-        continue
+# The following environment variables can be passed to the mapper using -cmdenv:
+#   PI_SEED - seed for reproducible results (for a given engine and chunk size). Any string, where integers are used
+#             as is. Each task (and each input line) gets its own independent random stream.
+#   PI_CHUNK_SIZE - number of points generated and tested at once by the NumPy engine (bounds the memory usage).
+#   PI_ENGINE - "numpy" (default when NumPy is installed) or "python". Any other value fails the task.
+SEED = os.environ.get("PI_SEED")
+CHUNK_SIZE = int(os.environ.get("PI_CHUNK_SIZE", 1_000_000))
+ENGINE = os.environ.get("PI_ENGINE", "numpy" if np is not None else "python").lower()
+ENGINES = ("numpy", "python")
+# Hadoop streaming exports the index of the current task, so each mapper draws a different stream
+TASK_PARTITION = int(os.environ.get("mapreduce_task_partition", 0))
+
+
+def parse_seed(seed: Optional[str]) -> Optional[int]:
+    """
+    :return: the seed as an integer (a non-integer seed is hashed), the same for both engines
+    """
+    if seed is None:
+        return None
+    try:
+        return int(seed)
+    except ValueError:
+        return int.from_bytes(hashlib.sha256(seed.encode()).digest()[:8], "big")
+
+
+PARSED_SEED = parse_seed(SEED)
+
+
+def count_inside_numpy(num_points: int, line_index: int) -> int:
+    # NumPy requires non-negative entropy (so negative seeds wrap around)
+    seed_entropy = None if PARSED_SEED is None else [PARSED_SEED % 2 ** 64, TASK_PARTITION, line_index]
+    rng = np.random.default_rng(seed_entropy)
+
+    inside_count = 0
+    # Reuse the same buffers for all chunks, so memory stays bounded no matter how many points are requested
+    coordinates = np.empty(2 * min(CHUNK_SIZE, num_points), dtype=np.float64)
+    for chunk_start in range(0, num_points, CHUNK_SIZE):
+        chunk_size = min(CHUNK_SIZE, num_points - chunk_start)
+        chunk = coordinates[:2 * chunk_size]
+        rng.random(out=chunk)
+        np.square(chunk, out=chunk)
+        inside_count += int(np.count_nonzero(chunk[:chunk_size] + chunk[chunk_size:] <= 1.0))
+
+    return inside_count
+
+
+def count_inside_python(num_points: int, line_index: int) -> int:
+    rng = random.Random(None if PARSED_SEED is None else f"{PARSED_SEED}-{TASK_PARTITION}-{line_index}")
+    draw = rng.random
+
+    inside_count = 0  # Number points that fall inside the unit-circle (x^2 + y^2 <= 1)
+    for _ in range(num_points):
+        x = draw()
+        y = draw()
+        if x * x + y * y <= 1.0:
+            inside_count += 1
+
+    return inside_count
 
+
+def emit_estimate(output: OutputBuffer, line: str, line_index: int, count_inside: Callable[[int, int], int]):
     # Read number of random sample points to generate for this mapper.
     # Each point is used to estimate π by checking whether it falls inside unit-circle.
     # Larger values give accurate estimate but increase runtime.
@@ -16,12 +82,38 @@ for line in sys.stdin:
     except ValueError:
         num_points = 1_000_000  # TODO: invalid input should raise an error instead of silently using a default
 
-    inside_count = 0  # Number points that fall inside the unit-circle (x^2 + y^2 <= 1)
-    for _ in range(num_points):
-        x = random.random()
-        y = random.random()
-        if x * x + y * y <= 1.0:
-            inside_count += 1
+    # A negative number of points generates nothing (and is still emitted as is)
+    points_to_generate = max(num_points, 0)
+    start = time.perf_counter()
+    inside_count = count_inside(points_to_generate, line_index)
+    elapsed = time.perf_counter() - start
 
     # Emit total points and inside points as key-value
-    print(f"pi_estimate\t{num_points}\t{inside_count}")
\ No newline at end of file
+    output.emit("pi_estimate", (num_points, inside_count))
+
+    points_per_second = points_to_generate / elapsed if elapsed > 0 else float("inf")
+    report_status(f"{ENGINE} engine - {points_per_second:,.0f} points per second")
+    report_counter("Pi", "Generated points", points_to_generate)
+    report_counter("Pi", "Generation time (ms)", int(elapsed * 1000))
+
+
+def main():
+    if CHUNK_SIZE <= 0:
+        raise ValueError(f"PI_CHUNK_SIZE must be positive, got {CHUNK_SIZE}")
+    if ENGINE not in ENGINES:
+        raise ValueError(f"PI_ENGINE must be one of {', '.join(ENGINES)}, got {ENGINE!r}")
+    count_inside = count_inside_numpy if ENGINE == "numpy" else count_inside_python
+    if count_inside is count_inside_numpy and np is None:
+        raise ImportError("PI_ENGINE is 'numpy', but NumPy is not installed")
+
+    with OutputBuffer() as output:
+        for line_index, line in enumerate(read_lines()):
+            line = line.strip()
+            if not line:
+                continue
+
+            emit_estimate(output, line, line_index, count_inside)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,62 @@
 #!/usr/bin/python3
 
+import os
 import sys
 
-# Input comes from STDIN (standard input)
-for line in sys.stdin:
-    # Remove leading and trailing whitespace
-    line = line.strip()
-    # Split the line into words
-    words = line.split()
-    # Output the word with a count of 1
-    for word in words:
-        print(f"{word}\t1")
\ No newline at end of file
+from streaming_runtime import OutputBuffer, get_environment_flag, read_blocks, report_counter
+
+# In-mapper combining mode: instead of emitting "word\t1" for every token, partial counts are aggregated in a bounded
+# dictionary that is flushed whenever it reaches its entries / memory cap, and once more at the end of the input.
+# The output records stay (word, count) pairs, so reducer.py consumes them unchanged.
+# Hadoop streaming passes environment variables to the mapper using -cmdenv, e.g.:
+#   -cmdenv WORDCOUNT_IN_MAPPER_COMBINING=1 -cmdenv WORDCOUNT_MAX_ENTRIES=100000 -cmdenv WORDCOUNT_MAX_MEMORY_MB=64
+IN_MAPPER_COMBINING = get_environment_flag("WORDCOUNT_IN_MAPPER_COMBINING")
+MAX_ENTRIES = int(os.environ.get("WORDCOUNT_MAX_ENTRIES", 100_000))
+MAX_MEMORY_BYTES = int(float(os.environ.get("WORDCOUNT_MAX_MEMORY_MB", 64)) * 1024 * 1024)
+
+# Rough per-entry cost of a dict slot, its hash table share and the int counter (on top of the key string itself)
+DICT_ENTRY_OVERHEAD_BYTES = 100
+
+
+def run_in_mapper_combining(output: OutputBuffer):
+    counts = {}
+    approximate_bytes = 0
+    number_of_flushes = 0
+
+    # Input comes from STDIN (standard input), in large blocks of complete lines
+    for block in read_blocks():
+        for word in block.split():
+            if word in counts:
+                counts[word] += 1
+                continue
+
+            counts[word] = 1
+            approximate_bytes += sys.getsizeof(word) + DICT_ENTRY_OVERHEAD_BYTES
+            # The table is full - emit the partial counts, the reducer will sum them with the rest
+            if len(counts) >= MAX_ENTRIES or approximate_bytes >= MAX_MEMORY_BYTES:
+                output.emit_many(counts.items())
+                counts.clear()
+                approximate_bytes = 0
+                number_of_flushes += 1
+
+    # Output whatever is left at the end of the input
+    if counts:
+        output.emit_many(counts.items())
+        number_of_flushes += 1
+
+    report_counter("WordCount", "In-mapper combining flushes", number_of_flushes)
+
+
+def run_word_per_record(output: OutputBuffer):
+    # Input comes from STDIN (standard input), in large blocks of complete lines
+    for block in read_blocks():
+        # Output each word with a count of 1
+        output.emit_many((word, 1) for word in block.split())
+
+
+if __name__ == "__main__":
+    with OutputBuffer() as map_output:
+        if IN_MAPPER_COMBINING:
+            run_in_mapper_combining(map_output)
+        else:
+            run_word_per_record(map_output)
@@ -0,0 +1,340 @@
+"""
+Records the metrics of every Hadoop job run by the automatic experiments in a SQLite database: the wall time, exit
+code, application ID and Hadoop counters of the run, keyed by the job's configuration (HadoopJobConfig.stable_hash()),
+its session ID and the fields selected by the user. This way, sweeps can be compared with SQL instead of scraping logs.
+
+The counters are parsed from the output of the `hadoop jar` command (which is still printed to the terminal, or
+written to the job's log file by the job monitor):
+    ... INFO impl.YarnClientImpl: Submitted application application_1700000000000_0001
+    ... INFO mapreduce.Job: Counters: 54
+    <tab>Map-Reduce Framework
+    <tab><tab>Map input records=1000
+    ...
+
+Usage (a summary of the stored runs):
+    python3 metrics_store.py [database path] [--session_id <session id>]
+"""
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, TextIO, TYPE_CHECKING
+
+from pydantic import BaseModel
+
+from hadoop_job_config import HadoopJobConfig
+from job_submitters import JobSubmitter, SubmittedJob, SubprocessJobSubmitter
+
+if TYPE_CHECKING:
+    from job_monitor import JobMonitor
+
+DEFAULT_METRICS_DATABASE_PATH = Path("/home/experiments_metrics.sqlite")
+
+APPLICATION_ID_PATTERN = re.compile(r"\b(application_\d+_\d+)\b")
+COUNTERS_HEADER_PATTERN = re.compile(r"\bCounters: \d+\s*$")
+COUNTER_PATTERN = re.compile(r"^\t\t(.+?)=(-?\d+)\s*$")
+COUNTER_GROUP_PATTERN = re.compile(r"^\t(\S.*?)\s*$")
+
+MAP_REDUCE_FRAMEWORK_GROUP = "Map-Reduce Framework"
+# run columns -> counters of the Map-Reduce Framework group (all counters are stored in the counters table as well)
+SUMMARY_COUNTERS = {
+    "map_input_records": "Map input records",
+    "map_output_records": "Map output records",
+    "reduce_input_records": "Reduce input records",
+    "reduce_output_records": "Reduce output records",
+    "spilled_records": "Spilled Records",
+    "shuffle_bytes": "Reduce shuffle bytes",
+    "gc_time_ms": "GC time elapsed (ms)",
+    "cpu_time_ms": "CPU time spent (ms)",
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    config_hash TEXT NOT NULL,
+    session_id TEXT,
+    user_selected_fields TEXT NOT NULL,
+    config TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    wall_time_seconds REAL NOT NULL,
+    exit_code INTEGER,
+    application_id TEXT,
+    {", ".join(f"{column} INTEGER" for column in SUMMARY_COUNTERS)}
+);
+CREATE INDEX IF NOT EXISTS runs_config_hash ON runs (config_hash);
+CREATE INDEX IF NOT EXISTS runs_session_id ON runs (session_id);
+CREATE TABLE IF NOT EXISTS counters (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    counter_group TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (run_id, counter_group, name)
+);
+"""
+
+
+class JobOutputParser:
+    """
+    Extracts the application ID and the counters from the output lines of a Hadoop job, fed one by one.
+    """
+
+    def __init__(self):
+        self.application_id: Optional[str] = None
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self._in_counters = False
+        self._current_group: Optional[str] = None
+
+    def feed(self, line: str):
+        if self.application_id is None and (match := APPLICATION_ID_PATTERN.search(line)):
+            self.application_id = match.group(1)
+
+        if COUNTERS_HEADER_PATTERN.search(line):
+            self._in_counters = True
+            self._current_group = None
+            return
+        if not self._in_counters:
+            return
+
+        if match := COUNTER_PATTERN.match(line):
+            if self._current_group is not None:
+                self.counters[self._current_group][match.group(1).strip()] = int(match.group(2))
+        elif match := COUNTER_GROUP_PATTERN.match(line):
+            self._current_group = match.group(1)
+            self.counters.setdefault(self._current_group, {})
+        else:
+            self._in_counters = False
+
+    def feed_lines(self, lines: Iterable[str]) -> "JobOutputParser":
+        for line in lines:
+            self.feed(line)
+        return self
+
+
+class JobRunMetrics(BaseModel):
+    config_hash: str
+    session_id: Optional[str] = None
+    user_selected_fields: Dict[str, Any] = {}
+    config: Dict[str, Any] = {}
+    started_at: datetime
+    wall_time_seconds: float
+    exit_code: Optional[int] = None
+    application_id: Optional[str] = None
+    counters: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_job(
+            cls,
+            config: HadoopJobConfig,
+            session_id: Optional[str],
+            user_selected_fields: Dict[str, Any],
+            started_at: datetime,
+            wall_time_seconds: float,
+            exit_code: Optional[int],
+            parser: JobOutputParser,
+    ) -> "JobRunMetrics":
+        return cls(
+            config_hash=config.stable_hash(),
+            session_id=session_id,
+            user_selected_fields=user_selected_fields,
+            config=config.model_dump(mode="json"),
+            started_at=started_at,
+            wall_time_seconds=wall_time_seconds,
+            exit_code=exit_code,
+            application_id=parser.application_id,
+            counters=parser.counters,
+        )
+
+    def summary_counter(self, name: str) -> Optional[int]:
+        return self.counters.get(MAP_REDUCE_FRAMEWORK_GROUP, {}).get(name)
+
+
+class MetricsStore:
+    """
+    A SQLite database of job runs. Safe to use from multiple threads (e.g., parallel mode).
+    """
+
+    def __init__(self, database_path: Path = DEFAULT_METRICS_DATABASE_PATH):
+        self.database_path = database_path
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def record(self, metrics: JobRunMetrics) -> int:
+        """
+        :return: the ID of the new run
+        """
+        columns = {
+            "config_hash": metrics.config_hash,
+            "session_id": metrics.session_id,
+            "user_selected_fields": json.dumps(metrics.user_selected_fields, sort_keys=True, default=str),
+            "config": json.dumps(metrics.config, sort_keys=True),
+            "started_at": metrics.started_at.isoformat(),
+            "wall_time_seconds": metrics.wall_time_seconds,
+            "exit_code": metrics.exit_code,
+            "application_id": metrics.application_id,
+            **{column: metrics.summary_counter(counter) for column, counter in SUMMARY_COUNTERS.items()},
+        }
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                f"INSERT INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                list(columns.values()),
+            )
+            run_id = cursor.lastrowid
+            self._connection.executemany(
+                "INSERT INTO counters (run_id, counter_group, name, value) VALUES (?, ?, ?, ?)",
+                [
+                    (run_id, group, name, value)
+                    for group, counters in metrics.counters.items()
+                    for name, value in counters.items()
+                ],
+            )
+        return run_id
+
+    def runs(self, session_id: Optional[str] = None) -> List[sqlite3.Row]:
+        with self._lock:
+            self._connection.row_factory = sqlite3.Row
+            query = "SELECT * FROM runs" + (" WHERE session_id = ?" if session_id else "") + " ORDER BY id"
+            rows = self._connection.execute(query, [session_id] if session_id else []).fetchall()
+            self._connection.row_factory = None
+        return rows
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self) -> "MetricsStore":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class JobOutputCollector:
+    """
+    Echoes the output of a running Hadoop job (stdout and stderr, merged) to `echo_to`, and parses it on the way.
+    With a monitor (see job_monitor.py), the monitor follows the output instead, into the job's log file.
+    Jobs that were not submitted by a local client (see job_submitters.py) have no output, so only their application
+    ID is known.
+    """
+
+    def __init__(
+            self,
+            submitted_job: SubmittedJob,
+            echo_to: TextIO = sys.stdout,
+            monitor: Optional["JobMonitor"] = None,
+            name: Optional[str] = None,
+    ):
+        """
+        :param name: the name of the job in the monitor
+        """
+        self.submitted_job = submitted_job
+        self.parser = JobOutputParser()
+        self.parser.application_id = submitted_job.application_id
+        self.started_at = datetime.now(timezone.utc)
+        self._start_time = time.monotonic()
+        self._echo_to = echo_to
+        self._monitor = monitor
+        self._name = name
+        if monitor is not None:
+            self._followed = monitor.watch(name, submitted_job, on_line=self.parser.feed)
+        else:
+            self._thread = threading.Thread(target=self._collect, daemon=True)
+            self._thread.start()
+
+    def _collect(self):
+        for line in self.submitted_job.output:
+            self._echo_to.write(line)
+            self.parser.feed(line)
+        self._echo_to.flush()
+
+    def wait(self) -> int:
+        try:
+            exit_code = self.submitted_job.wait()
+        except KeyboardInterrupt:
+            # Jobs submitted through the REST API keep running in the cluster unless they are killed
+            self.submitted_job.kill()
+            raise
+        if self._monitor is not None:
+            self._followed.result()
+            self._monitor.finish(self._name, exit_code)
+        else:
+            self._thread.join()
+        return exit_code
+
+    def metrics(
+            self, config: HadoopJobConfig, session_id: Optional[str], user_selected_fields: Dict[str, Any]
+    ) -> JobRunMetrics:
+        """
+        Waits for the job to terminate, and returns the metrics of the run.
+        """
+        exit_code = self.wait()
+        return JobRunMetrics.from_job(
+            config,
+            session_id,
+            user_selected_fields,
+            self.started_at,
+            time.monotonic() - self._start_time,
+            exit_code,
+            self.parser,
+        )
+
+
+def start_job(
+        config: HadoopJobConfig,
+        submitter: Optional[JobSubmitter] = None,
+        monitor: Optional["JobMonitor"] = None,
+        run_index: Optional[int] = None,
+) -> JobOutputCollector:
+    """
+    Submits the Hadoop job (with a `hadoop jar` subprocess by default), and collects its output (through the monitor,
+    if given, where the job is named after its output directory).
+
+    :param run_index: the index of the run in the sweep, appended to the job's name in the monitor (so runs that share
+    an output directory don't overwrite each other's log)
+    """
+    submitted_job = (submitter or SubprocessJobSubmitter()).submit(config)
+    name = Path(config.output_path).name
+    if run_index is not None:
+        name = f"{name}_{run_index}"
+    return JobOutputCollector(submitted_job, monitor=monitor, name=name)
+
+
+def format_runs(rows: List[sqlite3.Row]) -> str:
+    """
+    :return: a table of the runs, grouped by configuration (mean wall time and counters of the successful runs)
+    """
+    groups: Dict[str, List[sqlite3.Row]] = {}
+    for row in rows:
+        groups.setdefault(row["config_hash"], []).append(row)
+
+    lines = [f"{'config':<16}  {'runs':>4}  {'failed':>6}  {'wall (s)':>9}  {'cpu (ms)':>10}  {'gc (ms)':>8}  fields"]
+    for config_hash, runs in sorted(groups.items(), key=lambda item: item[1][0]["id"]):
+        succeeded = [run for run in runs if run["exit_code"] == 0]
+
+        def mean(column: str) -> str:
+            values = [run[column] for run in succeeded if run[column] is not None]
+            return f"{sum(values) / len(values):.1f}" if values else "-"
+
+        fields = ", ".join(f"{name}={value}" for name, value in json.loads(runs[0]["user_selected_fields"]).items())
+        lines.append(
+            f"{config_hash:<16}  {len(runs):>4}  {len(runs) - len(succeeded):>6}  {mean('wall_time_seconds'):>9}  "
+            f"{mean('cpu_time_ms'):>10}  {mean('gc_time_ms'):>8}  {fields}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    arguments_parser = ArgumentParser(description="Print a summary of the runs in the experiments metrics database")
+    arguments_parser.add_argument("database_path", nargs="?", type=Path, default=DEFAULT_METRICS_DATABASE_PATH)
+    arguments_parser.add_argument("--session_id", type=str, default=None, help="Only print the runs of this session")
+    args = arguments_parser.parse_args()
+
+    if not args.database_path.exists():
+        sys.exit(f"No such database: {args.database_path}")
+    with MetricsStore(args.database_path) as store:
+        print(format_runs(store.runs(args.session_id)))
@@ -1,23 +1,23 @@
 #!/usr/bin/env python3
-import sys
+from streaming_runtime import OutputBuffer, group_by_key, read_records
 
-current_sig = None
-current_words = []
 
-for line in sys.stdin:
-    line = line.strip()
-    if '\t' not in line:
-        continue
-    sig, word = line.split('\t', 1)
+def parse_text_value(value: str):
+    # Either "word" (a single occurrence) or "word\tcount" (a deduplicated word)
+    word, _, count = value.partition('\t')
+    return (word, int(count)) if count else word
 
-    if current_sig == sig:
-        current_words.append(word)
-    else:
-        if current_sig and len(current_words) > 1:
-            print(f"{len(current_words)} {', '.join(sorted(current_words))}")
-        current_sig = sig
-        current_words = [word]
 
-# Handle last group
-if current_sig and len(current_words) > 1:
-    print(f"{len(current_words)} {', '.join(sorted(current_words))}")
+with OutputBuffer() as output:
+    for sig, values in group_by_key(read_records(parse_text_value=parse_text_value)):
+        # The same word may arrive several times (from different flushes or mappers), so merge the counts
+        word_counts = {}
+        for value in values:
+            word, count = (value, 1) if isinstance(value, str) else value
+            word_counts[word] = word_counts.get(word, 0) + count
+
+        number_of_words = sum(word_counts.values())
+        if number_of_words > 1:
+            # Every occurrence is listed, exactly as if the mappers had emitted a record per occurrence
+            words = (word for word in sorted(word_counts) for _ in range(word_counts[word]))
+            output.write_line(f"{number_of_words} {', '.join(words)}")
@@ -1,21 +1,25 @@
 #!/usr/bin/python3
-import sys
+from streaming_runtime import OutputBuffer, read_records
+
+
+def parse_text_value(value: str):
+    points, inside = value.split('\t')
+    return int(points), int(inside)
+
 
 # Reducer: Aggregate total points and inside points across mappers
 total_points = 0
 total_inside = 0
 
-for line in sys.stdin:
-    line = line.strip()
-    if line.startswith("pi_estimate"):
-        parts = line.split('\t')
-        if len(parts) == 3:
-            points = int(parts[1])
-            inside = int(parts[2])
-            total_points += points
-            total_inside += inside
+# Records are decoded according to the intermediate format (text / typed bytes) configured for the job
+for key, value in read_records(parse_text_value=parse_text_value):
+    if key == "pi_estimate" and len(value) == 2:
+        points, inside = value
+        total_points += points
+        total_inside += inside
 
 if total_points > 0:
     pi_estimate = 4.0 * total_inside / total_points
-    print(f"Estimated Pi: {pi_estimate}")
-    print(f"Using {total_points} total points")
+    with OutputBuffer() as output:
+        output.write_line(f"Estimated Pi: {pi_estimate}")
+        output.write_line(f"Using {total_points} total points")
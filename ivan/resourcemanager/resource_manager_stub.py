@@ -0,0 +1,346 @@
+"""
+A local stub of the ResourceManager REST API, for testing the launch pacing and the REST job submitter without
+a cluster.
+
+GET /ws/v1/cluster/metrics returns the current metrics. They can be changed with PUT /stub/metrics and a JSON body of
+the fields to set, e.g., {"appsRunning": 1, "containersAllocated": 3}. When --teardown_seconds is given, every running
+application (and its containers) finishes that number of seconds after it was set, which imitates a job tearing down.
+
+The applications API (new-application, submission, state and kill) runs every submitted application for
+--application_seconds, after which it succeeds, or fails if its launcher command contains --failing_pattern.
+The stub serves an in-memory WebHDFS as well (CREATE, GETFILESTATUS and DELETE), where the REST job submitter stages
+files.
+
+Usage:
+    python3 resource_manager_stub.py [--port 8088] [--teardown_seconds 5] [--application_seconds 2]
+                                     [--failing_pattern mapreduce.job.maps=3]
+    python3 automatic_experiments.py ...  (with resource_manager_address="http://localhost:8088")
+    python3 run_task.py --job_submitter rest --resource_manager_address http://localhost:8088
+                        --webhdfs_address http://localhost:8088 ...
+"""
+import json
+import re
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from hadoop_job_config import HDFS_NAMENODE
+from job_submitters import APPLICATIONS_PATH, NEW_APPLICATION_PATH, SHELL_COMMANDS_FILE
+from launch_pacing import CLUSTER_METRICS_PATH
+
+STUB_METRICS_PATH = "/stub/metrics"
+WEBHDFS_PREFIX = "/webhdfs/v1"
+APPLICATION_PATH_PATTERN = re.compile(rf"^{APPLICATIONS_PATH}/(application_\d+_\d+)(/state)?$")
+DEFAULT_PORT = 8088
+DEFAULT_APPLICATION_SECONDS = 1.0
+# The containers of a running application (the launcher's ApplicationMaster and its container)
+CONTAINERS_PER_APPLICATION = 2
+
+
+class ResourceManagerStub:
+    """
+    Serves the cluster metrics from a background thread. Use it as a context manager in tests:
+        with ResourceManagerStub() as stub:
+            stub.set_metrics(appsRunning=1)
+            ... ResourceManagerClient(stub.address) ...
+    """
+
+    def __init__(
+            self,
+            host: str = "localhost",
+            port: int = 0,
+            teardown_seconds: Optional[float] = None,
+            application_seconds: float = DEFAULT_APPLICATION_SECONDS,
+            failing_pattern: Optional[str] = None,
+    ):
+        self.teardown_seconds = teardown_seconds
+        self.application_seconds = application_seconds
+        self.failing_pattern = failing_pattern
+        self._metrics: Dict[str, Any] = {
+            "appsSubmitted": 0,
+            "appsPending": 0,
+            "appsRunning": 0,
+            "containersAllocated": 0,
+            "containersPending": 0,
+            "allocatedMB": 0,
+            "allocatedVirtualCores": 0,
+        }
+        self._busy_until: Optional[float] = None
+        self._cluster_timestamp = int(time.time() * 1000)
+        self._new_application_ids = []
+        # application ID -> {"state", "finalStatus", "command", "finishes_at"}
+        self.applications: Dict[str, Dict[str, Any]] = {}
+        # HDFS path -> content (the in-memory WebHDFS)
+        self.files: Dict[str, bytes] = {}
+        self._file_modification_times: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._busy_until is not None and time.monotonic() >= self._busy_until:
+                self._metrics.update(appsRunning=0, containersAllocated=0, allocatedMB=0, allocatedVirtualCores=0)
+                self._busy_until = None
+            self._update_applications()
+            metrics = dict(self._metrics)
+            running_applications = sum(app["state"] == "RUNNING" for app in self.applications.values())
+            metrics["appsSubmitted"] += len(self.applications)
+            metrics["appsRunning"] += running_applications
+            metrics["containersAllocated"] += running_applications * CONTAINERS_PER_APPLICATION
+            return metrics
+
+    def set_metrics(self, **values: Any):
+        with self._lock:
+            self._metrics.update(values)
+            if self.teardown_seconds is not None and self._metrics["appsRunning"]:
+                self._busy_until = time.monotonic() + self.teardown_seconds
+
+    def _update_applications(self):
+        """
+        Finishes the applications whose time is up. Must be called with the lock held.
+        """
+        now = time.monotonic()
+        for application in self.applications.values():
+            if application["state"] == "RUNNING" and now >= application["finishes_at"]:
+                failed = self.failing_pattern is not None and self.failing_pattern in application["command"]
+                application["state"] = "FAILED" if failed else "FINISHED"
+                application["finalStatus"] = "FAILED" if failed else "SUCCEEDED"
+
+    def new_application(self) -> Dict[str, Any]:
+        with self._lock:
+            application_id = (
+                f"application_{self._cluster_timestamp}_"
+                f"{len(self.applications) + len(self._new_application_ids) + 1:04d}"
+            )
+            self._new_application_ids.append(application_id)
+        return {"application-id": application_id, "maximum-resource-capability": {"memory": 3584, "vCores": 3}}
+
+    def submit_application(self, submission_context: Dict[str, Any]):
+        """
+        :raises ValueError: if the application ID was not created by new_application(), or was already submitted
+        """
+        application_id = submission_context["application-id"]
+        local_resources = submission_context["am-container-spec"].get("local-resources", {}).get("entry", [])
+        shell_commands = next(
+            (entry["value"]["resource"] for entry in local_resources if entry["key"] == SHELL_COMMANDS_FILE), None
+        )
+        with self._lock:
+            if application_id not in self._new_application_ids:
+                raise ValueError(f"Unknown application ID {application_id}")
+            self._new_application_ids.remove(application_id)
+            command_path = shell_commands.removeprefix(HDFS_NAMENODE) if shell_commands else None
+            self.applications[application_id] = {
+                "state": "RUNNING",
+                "finalStatus": "UNDEFINED",
+                "command": self.files.get(command_path, b"").decode(),
+                "finishes_at": time.monotonic() + self.application_seconds,
+            }
+
+    def application(self, application_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._update_applications()
+            application = self.applications.get(application_id)
+            if application is None:
+                return None
+            return {"id": application_id, "state": application["state"], "finalStatus": application["finalStatus"]}
+
+    def kill_application(self, application_id: str) -> bool:
+        with self._lock:
+            self._update_applications()
+            application = self.applications.get(application_id)
+            if application is None:
+                return False
+            if application["state"] == "RUNNING":
+                application.update(state="KILLED", finalStatus="KILLED")
+            return True
+
+    def write_file(self, path: str, content: bytes):
+        with self._lock:
+            self.files[path] = content
+            self._file_modification_times[path] = int(time.time() * 1000)
+
+    def file_status(self, path: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if path not in self.files:
+                return None
+            return {
+                "type": "FILE",
+                "length": len(self.files[path]),
+                "modificationTime": self._file_modification_times[path],
+            }
+
+    def delete_path(self, path: str) -> bool:
+        """
+        Deletes the file, or everything under the directory.
+        :return: whether anything was deleted
+        """
+        with self._lock:
+            deleted_paths = [
+                file_path for file_path in self.files
+                if file_path == path or file_path.startswith(path.rstrip("/") + "/")
+            ]
+            for file_path in deleted_paths:
+                del self.files[file_path]
+                del self._file_modification_times[file_path]
+            return bool(deleted_paths)
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                encoded = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def _send_not_found(self):
+                self._send_json(404, {"RemoteException": {"message": f"Unknown path {self.path}"}})
+
+            def _read_body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _webhdfs(self, method: str):
+                url = urlsplit(self.path)
+                path = url.path.removeprefix(WEBHDFS_PREFIX) or "/"
+                query = {name: values[0] for name, values in parse_qs(url.query).items()}
+                operation = query.get("op", "").upper()
+                if method == "PUT" and operation == "CREATE" and query.get("data") == "true":
+                    stub.write_file(path, self._read_body())
+                    self._send_json(201, {})
+                elif method == "PUT" and operation == "CREATE":
+                    # Redirect the content to the "datanode" (the stub itself)
+                    self._send_json(200, {"Location": f"{stub.address}{url.path}?{url.query}&data=true"})
+                elif method == "GET" and operation == "GETFILESTATUS":
+                    status = stub.file_status(path)
+                    if status is None:
+                        self._send_json(404, {"RemoteException": {"message": f"File does not exist: {path}"}})
+                    else:
+                        self._send_json(200, {"FileStatus": status})
+                elif method == "DELETE" and operation == "DELETE":
+                    self._send_json(200, {"boolean": stub.delete_path(path)})
+                else:
+                    self._send_json(400, {"RemoteException": {"message": f"Unsupported operation {operation}"}})
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == CLUSTER_METRICS_PATH:
+                    self._send_json(200, {"clusterMetrics": stub.metrics()})
+                elif path.startswith(WEBHDFS_PREFIX):
+                    self._webhdfs("GET")
+                elif (match := APPLICATION_PATH_PATTERN.match(path)) and not match.group(2):
+                    application = stub.application(match.group(1))
+                    if application is None:
+                        self._send_not_found()
+                    else:
+                        self._send_json(200, {"app": application})
+                else:
+                    self._send_not_found()
+
+            def do_POST(self):
+                if self.path == NEW_APPLICATION_PATH:
+                    self._send_json(200, stub.new_application())
+                elif self.path == APPLICATIONS_PATH:
+                    try:
+                        stub.submit_application(json.loads(self._read_body()))
+                    except (ValueError, KeyError) as e:
+                        self._send_json(400, {"RemoteException": {"message": str(e)}})
+                        return
+                    self.send_response(202)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                else:
+                    self._send_not_found()
+
+            def do_PUT(self):
+                path = self.path.split("?")[0]
+                if path.startswith(WEBHDFS_PREFIX):
+                    self._webhdfs("PUT")
+                elif (match := APPLICATION_PATH_PATTERN.match(path)) and match.group(2):
+                    if json.loads(self._read_body()).get("state") != "KILLED":
+                        self._send_json(400, {"RemoteException": {"message": "Only killing is supported"}})
+                    elif stub.kill_application(match.group(1)):
+                        self._send_json(200, {"state": "KILLED"})
+                    else:
+                        self._send_not_found()
+                elif path == STUB_METRICS_PATH:
+                    stub.set_metrics(**json.loads(self._read_body() or b"{}"))
+                    self._send_json(200, {"clusterMetrics": stub.metrics()})
+                else:
+                    self._send_not_found()
+
+            def do_DELETE(self):
+                if self.path.startswith(WEBHDFS_PREFIX):
+                    self._webhdfs("DELETE")
+                else:
+                    self._send_not_found()
+
+            def log_message(self, format: str, *args: Any):
+                pass
+
+        return Handler
+
+    def start(self) -> "ResourceManagerStub":
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serves from the calling thread, until interrupted.
+        """
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            self._server.server_close()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "ResourceManagerStub":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="A local stub of the ResourceManager cluster metrics REST API")
+    parser.add_argument("--host", type=str, default="localhost")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--teardown_seconds",
+        type=float,
+        default=None,
+        help="Running applications finish this number of seconds after they were set"
+    )
+    parser.add_argument(
+        "--application_seconds",
+        type=float,
+        default=DEFAULT_APPLICATION_SECONDS,
+        help="Submitted applications finish this number of seconds after their submission"
+    )
+    parser.add_argument(
+        "--failing_pattern",
+        type=str,
+        default=None,
+        help="Submitted applications whose launcher command contains this string fail"
+    )
+    args = parser.parse_args()
+
+    resource_manager_stub = ResourceManagerStub(
+        args.host, args.port, args.teardown_seconds, args.application_seconds, args.failing_pattern
+    )
+    print(f"Serving {resource_manager_stub.address}{CLUSTER_METRICS_PATH}")
+    resource_manager_stub.serve_forever()
@@ -1,5 +1,9 @@
-import subprocess
-from hadoop_job_config import HadoopJobConfig
+import sys
+
+from hadoop_job_config import HadoopJobConfig, SKIP_HDFS_VALIDATION_KEY
+from hdfs_backends import WEBHDFS_ADDRESS
+from job_submitters import JobSubmitterType, create_submitter
+from launch_pacing import RESOURCE_MANAGER_ADDRESS
 
 
 if __name__ == "__main__":
@@ -13,10 +17,44 @@ if __name__ == "__main__":
         help="Print the Hadoop command and exit"
     )
 
+    parser.add_argument(
+        "--job_submitter",
+        type=str.lower,  # parse lower-case user input
+        choices=[submitter.value for submitter in JobSubmitterType],
+        default=JobSubmitterType.SUBPROCESS.value,
+        help="How the job is submitted (see job_submitters.py). "
+             "Options: " + ", ".join(submitter.value for submitter in JobSubmitterType)
+    )
+
+    parser.add_argument(
+        "--resource_manager_address",
+        type=str,
+        default=RESOURCE_MANAGER_ADDRESS,
+        help="The ResourceManager REST API, for the rest submitter"
+    )
+
+    parser.add_argument(
+        "--webhdfs_address",
+        type=str,
+        default=WEBHDFS_ADDRESS,
+        help="The WebHDFS API of the namenode, where the rest submitter stages the job's files"
+    )
+
     args = parser.parse_args()
-    hadoop_job_config = HadoopJobConfig.from_argparse(args)
+    job_submitter = JobSubmitterType(args.job_submitter)
+    # Printing the command does not write the output path, so there is no need to check it against HDFS (which
+    # starts a JVM)
+    only_printing = args.print_command_only or job_submitter == JobSubmitterType.DRY_RUN
+    context = {SKIP_HDFS_VALIDATION_KEY: True} if only_printing else None
+    hadoop_job_config = HadoopJobConfig.from_argparse(args, context=context)
 
     if args.print_command_only:
         print(hadoop_job_config)
     else:
-        subprocess.run(hadoop_job_config.get_hadoop_job_args(), check=True)
+        submitter = create_submitter(
+            job_submitter, args.resource_manager_address, args.webhdfs_address, capture_output=False
+        )
+        submitted_job = submitter.submit(hadoop_job_config)
+        if submitted_job.application_id:
+            print(f"Submitted application {submitted_job.application_id}")
+        sys.exit(submitted_job.wait())
@@ -0,0 +1,368 @@
+"""
+Search strategies that decide which experiment of the grid runs next, within a budget of runs and / or cluster-hours.
+
+Instead of running the full cartesian product of all fields, the adaptive strategies use the measured runtime of the
+finished jobs (lower is better) to pick the next experiment:
+- GRID: every experiment in grid order (the original behaviour), until the budget is exhausted.
+- RANDOM: a uniform random sample of the grid, until the budget is exhausted.
+- SUCCESSIVE_HALVING: runs many experiments once, and repeatedly keeps the fastest 1/eta of them and runs them
+  eta times more. The runtime of a single job is noisy, so the "resource" that grows for the promising experiments is
+  the number of repetitions (i.e., how reliable their mean runtime is).
+- MODEL_BASED: after a few random experiments, predicts the runtime of untried experiments using their nearest measured
+  neighbours in the grid, and runs the experiment with the lowest predicted runtime (minus an exploration bonus for
+  experiments that are far from everything measured so far).
+
+A strategy works with grid positions (indices of the ExperimentsGrid), so it never validates (or checks, see
+config_rules.py) configurations it does not run. Usage:
+
+    strategy = create_search_strategy(SearchStrategyType.RANDOM, grid, SearchBudget(max_runs=20))
+    while (position := strategy.next_experiment()) is not None:
+        try:
+            experiment_config = grid[position]
+        except SkippedExperiment:
+            strategy.skip(position)
+            continue
+        runtime_seconds, succeeded = run(experiment_config)
+        strategy.report(position, runtime_seconds, succeeded)
+"""
+import math
+import random
+import statistics
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from numbers import Number
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence
+
+from case_insensitive_enum import CaseInsensitiveEnum
+
+SECONDS_PER_HOUR = 3600
+DEFAULT_ETA = 3
+DEFAULT_INITIAL_CANDIDATES = 27
+DEFAULT_INITIAL_RANDOM_RUNS = 5
+DEFAULT_NEIGHBOURS = 5
+DEFAULT_EXPLORATION_WEIGHT = 1.0
+# Number of untried experiments the model-based strategy scores before every run
+CANDIDATE_POOL_SIZE = 500
+
+
+class SearchStrategyType(CaseInsensitiveEnum):
+    GRID = "grid"
+    RANDOM = "random"
+    SUCCESSIVE_HALVING = "successive_halving"
+    MODEL_BASED = "model_based"
+
+
+@dataclass
+class SearchBudget:
+    """
+    The search stops when any of the limits is reached (None means unlimited).
+    Cluster-hours are the total runtime of the finished jobs.
+    """
+    max_runs: Optional[int] = None
+    max_cluster_hours: Optional[float] = None
+
+    def is_exhausted(self, runs: int, total_runtime_seconds: float) -> bool:
+        if self.max_runs is not None and runs >= self.max_runs:
+            return True
+        return (
+            self.max_cluster_hours is not None
+            and total_runtime_seconds >= self.max_cluster_hours * SECONDS_PER_HOUR
+        )
+
+
+@dataclass
+class Trial:
+    position: int
+    runtimes_seconds: List[float] = field(default_factory=list)
+    failures: int = 0
+
+    @property
+    def mean_runtime_seconds(self) -> float:
+        """
+        :return: the mean runtime of the successful runs (infinity if all runs failed)
+        """
+        if self.failures or not self.runtimes_seconds:
+            return math.inf
+        return statistics.fmean(self.runtimes_seconds)
+
+
+class SearchStrategy(ABC):
+    """
+    Decides which experiment (grid position) runs next, according to the results reported so far.
+    `grid` is an ExperimentsGrid (any sequence that supports `combination(position)` works).
+    """
+
+    def __init__(self, grid: Sequence, budget: SearchBudget, seed: Optional[int] = None):
+        self.grid = grid
+        self.budget = budget
+        self.rng = random.Random(seed)
+        self.trials: Dict[int, Trial] = {}
+        self.runs = 0
+        self.total_runtime_seconds = 0.0
+
+    def next_experiment(self) -> Optional[int]:
+        """
+        :return: the grid position of the next experiment to run, or None if the search is over
+        """
+        if self.budget.is_exhausted(self.runs, self.total_runtime_seconds):
+            return None
+        return self._next_position()
+
+    @abstractmethod
+    def _next_position(self) -> Optional[int]:
+        pass
+
+    def upcoming_experiment(self) -> Optional[int]:
+        """
+        :return: the grid position that next_experiment() is expected to return, if it does not depend on the results
+        that are not reported yet (None if it is unknown), so the experiment can be prepared ahead
+        """
+        return None
+
+    def repetition(self, position: Optional[int]) -> int:
+        """
+        :return: how many times the experiment at the given position already ran (0 before its first run)
+        """
+        trial = self.trials.get(position)
+        return 0 if trial is None else len(trial.runtimes_seconds) + trial.failures
+
+    def skip(self, position: int):
+        """
+        Records that the experiment cannot run (e.g., it was pruned by the pre-flight check), without counting a run:
+        it is never picked again, and never promoted.
+        """
+        self.trials.setdefault(position, Trial(position))
+
+    def report(self, position: int, runtime_seconds: float, succeeded: bool):
+        trial = self.trials.setdefault(position, Trial(position))
+        if succeeded:
+            trial.runtimes_seconds.append(runtime_seconds)
+        else:
+            trial.failures += 1
+        self.runs += 1
+        self.total_runtime_seconds += runtime_seconds
+
+    def planned_runs(self) -> Optional[int]:
+        """
+        :return: an upper bound on the number of runs (None if it is unknown, e.g., limited by cluster-hours only)
+        """
+        return self.budget.max_runs
+
+    def best_trials(self, number_of_trials: int = 5) -> List[Trial]:
+        """
+        :return: the trials with the lowest mean runtime
+        """
+        successful_trials = [trial for trial in self.trials.values() if math.isfinite(trial.mean_runtime_seconds)]
+        return sorted(successful_trials, key=lambda trial: trial.mean_runtime_seconds)[:number_of_trials]
+
+
+class GridSearch(SearchStrategy):
+    def __init__(self, grid: Sequence, budget: SearchBudget, seed: Optional[int] = None):
+        super().__init__(grid, budget, seed)
+        self._next = 0
+
+    def _next_position(self) -> Optional[int]:
+        if self._next >= len(self.grid):
+            return None
+        self._next += 1
+        return self._next - 1
+
+    def upcoming_experiment(self) -> Optional[int]:
+        return self._next if self._next < len(self.grid) else None
+
+    def planned_runs(self) -> Optional[int]:
+        return min(len(self.grid), self.budget.max_runs or len(self.grid))
+
+
+class RandomSearch(SearchStrategy):
+    def __init__(self, grid: Sequence, budget: SearchBudget, seed: Optional[int] = None):
+        super().__init__(grid, budget, seed)
+        sample_size = min(len(grid), budget.max_runs or len(grid))
+        self._positions = self.rng.sample(range(len(grid)), sample_size)
+        self._next = 0
+
+    def _next_position(self) -> Optional[int]:
+        if self._next >= len(self._positions):
+            return None
+        self._next += 1
+        return self._positions[self._next - 1]
+
+    def upcoming_experiment(self) -> Optional[int]:
+        return self._positions[self._next] if self._next < len(self._positions) else None
+
+    def planned_runs(self) -> Optional[int]:
+        return min(len(self.grid), self.budget.max_runs or len(self.grid))
+
+
+class SuccessiveHalving(SearchStrategy):
+    """
+    Rung 0 runs `initial_candidates` random experiments once. Every following rung keeps the fastest 1/eta of the
+    previous rung's candidates (failed experiments are dropped), and runs each of them until it has eta^rung runs.
+    The search ends when a single candidate is left.
+    Every run of a candidate writes to its own output path (see ExperimentsGrid.config).
+    """
+
+    def __init__(
+            self,
+            grid: Sequence,
+            budget: SearchBudget,
+            seed: Optional[int] = None,
+            eta: int = DEFAULT_ETA,
+            initial_candidates: int = DEFAULT_INITIAL_CANDIDATES,
+    ):
+        super().__init__(grid, budget, seed)
+        if eta < 2:
+            raise ValueError("eta must be at least 2")
+        self.eta = eta
+        self.rung = 0
+        self.candidates = self.rng.sample(range(len(grid)), min(initial_candidates, len(grid)))
+        self._initial_candidates = len(self.candidates)
+        self._pending = list(self.candidates)
+
+    def _runs_per_candidate(self) -> int:
+        return self.eta ** self.rung
+
+    def _promote(self) -> bool:
+        """
+        Keeps the fastest candidates for the next rung.
+        :return: False if the search is over
+        """
+        ranked = sorted(
+            (position for position in self.candidates if math.isfinite(self.trials[position].mean_runtime_seconds)),
+            key=lambda position: self.trials[position].mean_runtime_seconds
+        )
+        if len(ranked) <= 1:
+            return False
+
+        self.candidates = ranked[:max(len(ranked) // self.eta, 1)]
+        self.rung += 1
+        self._pending = [
+            position
+            for position in self.candidates
+            for _ in range(self._runs_per_candidate() - len(self.trials[position].runtimes_seconds))
+        ]
+        return True
+
+    def _next_position(self) -> Optional[int]:
+        if not self._pending and not self._promote():
+            return None
+        return self._pending.pop(0)
+
+    def planned_runs(self) -> Optional[int]:
+        planned = 0
+        candidates = self._initial_candidates
+        runs_per_candidate_before = 0
+        rung = 0
+        while True:
+            planned += candidates * (self.eta ** rung - runs_per_candidate_before)
+            runs_per_candidate_before = self.eta ** rung
+            if candidates <= 1:
+                break
+            candidates = max(candidates // self.eta, 1)
+            rung += 1
+        return min(planned, self.budget.max_runs or planned)
+
+
+class ModelBasedSearch(SearchStrategy):
+    """
+    A k-nearest-neighbours surrogate model of the runtime over the grid:
+    the distance between experiments sums, for every field that varies in the grid, the normalized difference of
+    numeric values (or 1 for different non-numeric values). The predicted runtime of an untried experiment is the
+    inverse-distance weighted mean runtime of its nearest measured neighbours, and the experiment with the lowest
+    (predicted runtime - exploration weight * runtime standard deviation * distance to its nearest neighbour) runs next.
+    """
+
+    def __init__(
+            self,
+            grid: Sequence,
+            budget: SearchBudget,
+            seed: Optional[int] = None,
+            initial_random_runs: int = DEFAULT_INITIAL_RANDOM_RUNS,
+            neighbours: int = DEFAULT_NEIGHBOURS,
+            exploration_weight: float = DEFAULT_EXPLORATION_WEIGHT,
+    ):
+        super().__init__(grid, budget, seed)
+        self.initial_random_runs = initial_random_runs
+        self.neighbours = neighbours
+        self.exploration_weight = exploration_weight
+        self._varying_fields = {
+            name: values for name, values in grid.parameters_grid.items() if len(values) > 1
+        }
+        self._numeric_ranges = {
+            name: (min(values), max(values)) for name, values in self._varying_fields.items()
+            if all(isinstance(value, Number) and not isinstance(value, bool) for value in values)
+            and min(values) < max(values)
+        }
+        self._features: Dict[int, Dict[str, Any]] = {}
+
+    def _features_of(self, position: int) -> Dict[str, Any]:
+        if position not in self._features:
+            combination = self.grid.combination(position)
+            self._features[position] = {name: combination[name] for name in self._varying_fields}
+        return self._features[position]
+
+    def _distance(self, first: int, second: int) -> float:
+        first_features, second_features = self._features_of(first), self._features_of(second)
+        distance = 0.0
+        for name in self._varying_fields:
+            if name in self._numeric_ranges:
+                low, high = self._numeric_ranges[name]
+                distance += abs(first_features[name] - second_features[name]) / (high - low)
+            else:
+                distance += first_features[name] != second_features[name]
+        return distance
+
+    def _untried_candidates(self) -> List[int]:
+        untried_count = len(self.grid) - len(self.trials)
+        if untried_count <= 0:
+            return []
+        if len(self.grid) <= CANDIDATE_POOL_SIZE:
+            return [position for position in range(len(self.grid)) if position not in self.trials]
+
+        candidates = set()
+        while len(candidates) < min(CANDIDATE_POOL_SIZE, untried_count):
+            position = self.rng.randrange(len(self.grid))
+            if position not in self.trials:
+                candidates.add(position)
+        return list(candidates)
+
+    def _acquisition(self, position: int, measured: List[Trial], runtime_spread: float) -> float:
+        nearest = sorted(
+            ((self._distance(position, trial.position), trial) for trial in measured), key=itemgetter(0)
+        )[:self.neighbours]
+        weights = [1 / (distance + 1e-9) for distance, _ in nearest]
+        predicted = sum(weight * trial.mean_runtime_seconds for weight, (_, trial) in zip(weights, nearest))
+        predicted /= sum(weights)
+        return predicted - self.exploration_weight * runtime_spread * nearest[0][0]
+
+    def _next_position(self) -> Optional[int]:
+        candidates = self._untried_candidates()
+        if not candidates:
+            return None
+
+        measured = [trial for trial in self.trials.values() if math.isfinite(trial.mean_runtime_seconds)]
+        if len(self.trials) < self.initial_random_runs or not measured:
+            return self.rng.choice(candidates)
+
+        runtimes = [trial.mean_runtime_seconds for trial in measured]
+        runtime_spread = statistics.pstdev(runtimes) if len(runtimes) > 1 else runtimes[0]
+        return min(candidates, key=lambda position: self._acquisition(position, measured, runtime_spread))
+
+    def planned_runs(self) -> Optional[int]:
+        return min(len(self.grid), self.budget.max_runs or len(self.grid))
+
+
+def create_search_strategy(
+        strategy_type: SearchStrategyType,
+        grid: Sequence,
+        budget: SearchBudget,
+        seed: Optional[int] = None
+) -> SearchStrategy:
+    strategies = {
+        SearchStrategyType.GRID: GridSearch,
+        SearchStrategyType.RANDOM: RandomSearch,
+        SearchStrategyType.SUCCESSIVE_HALVING: SuccessiveHalving,
+        SearchStrategyType.MODEL_BASED: ModelBasedSearch,
+    }
+    return strategies[strategy_type](grid, budget, seed)
@@ -0,0 +1,93 @@
+"""
+Overlaps the bookkeeping of the sequential mode with the running job, using a single background worker:
+- the next experiment is prepared while the current one runs (when the search strategy knows it ahead, see
+  SearchStrategy.upcoming_experiment()): its configuration is built and validated, which checks its output path
+  against HDFS, and its files are staged by the submitter (see JobSubmitter.prepare())
+- the output of every finished experiment is removed in the background (when the outputs are not kept), instead of
+  removing all outputs, one by one, at the end of the sweep
+
+Only the bookkeeping is overlapped: the jobs still run one at a time, and the measurement of every job is started
+and stopped around it (by the caller), so the measurement windows never overlap.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from hadoop_job_config import HadoopJobConfig
+from job_submitters import JobSubmitter
+
+if TYPE_CHECKING:
+    from jobs_configurator import ExperimentsGrid
+
+
+class SequentialPipeline:
+    """
+    Usage:
+        with SequentialPipeline(experiments, submitter, remove_output) as pipeline:
+            experiment_config = pipeline.config(position, repetition)
+            pipeline.prepare(upcoming_position, upcoming_repetition)
+            ... (run the job)
+            pipeline.remove_output(experiment_config.output_path)
+    """
+
+    def __init__(
+            self,
+            experiments: "ExperimentsGrid",
+            submitter: JobSubmitter,
+            remove_output: Optional[Callable[[str], bool]] = None,
+    ):
+        """
+        :param remove_output: removes the output of a finished experiment (None keeps the outputs)
+        """
+        self.experiments = experiments
+        self.submitter = submitter
+        self._remove_output = remove_output
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sequential_pipeline")
+        # (position, repetition) -> the preparation of the experiment
+        self._prepared: Dict[Tuple[int, int], Future] = {}
+        self._removals: List[Future] = []
+
+    def _prepare(self, position: int, repetition: int) -> HadoopJobConfig:
+        experiment_config = self.experiments.config(position, repetition)
+        self.submitter.prepare(experiment_config)
+        return experiment_config
+
+    def prepare(self, position: Optional[int], repetition: int = 0):
+        """
+        Starts preparing the experiment at the given position in the background (None does nothing).
+        An experiment that is prepared but never runs (e.g., the budget of the search ran out) is simply dropped.
+        :param repetition: see ExperimentsGrid.config
+        """
+        if position is not None and (position, repetition) not in self._prepared:
+            self._prepared[position, repetition] = self._executor.submit(self._prepare, position, repetition)
+
+    def config(self, position: int, repetition: int = 0) -> HadoopJobConfig:
+        """
+        :return: the prepared configuration of the experiment (waits for its preparation, or prepares it right away if
+        it was not prepared ahead). Validation errors are raised here, as if it was prepared right away.
+        """
+        prepared = self._prepared.pop((position, repetition), None)
+        if prepared is None:
+            return self._prepare(position, repetition)
+        return prepared.result()
+
+    def remove_output(self, output_path: str):
+        if self._remove_output is not None:
+            self._removals.append(self._executor.submit(self._remove_output, output_path))
+
+    def close(self) -> bool:
+        """
+        Waits for the pending removals, and drops the experiments that were prepared but did not run.
+        :return: whether all the removals succeeded
+        """
+        for prepared in self._prepared.values():
+            prepared.cancel()
+        self._prepared.clear()
+        self._executor.shutdown(wait=True)
+        return all(removal.result() for removal in self._removals)
+
+    def __enter__(self) -> "SequentialPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self.close():
+            print("There was an error while removing the outputs of finished experiments")
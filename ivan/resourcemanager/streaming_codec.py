@@ -0,0 +1,335 @@
+"""
+Encoding and decoding of the intermediate records (map output / reduce input) of the bundled streaming scripts.
+
+Hadoop streaming exports the job configuration into the environment of every mapper and reducer, where dots are
+replaced by underscores. Hence, each script finds the format selected in HadoopJobConfig.io_format inside the
+`stream_map_output` and `stream_reduce_input` environment variables, and picks the matching codec.
+
+In typed bytes mode, every record is a pair of typed objects (key and value), each starting with a single byte
+representing its type, followed by its binary payload. Numbers therefore cross the shuffle without being formatted
+and parsed as text.
+See: https://hadoop.apache.org/docs/stable/api/org/apache/hadoop/typedbytes/package-summary.html
+"""
+import os
+import struct
+from typing import Any, BinaryIO, Callable, Iterator, Tuple, Optional
+
+TEXT = "text"
+TYPED_BYTES = "typedbytes"
+
+MAP_OUTPUT_ENVIRONMENT_VARIABLE = "stream_map_output"
+REDUCE_INPUT_ENVIRONMENT_VARIABLE = "stream_reduce_input"
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Typed bytes type codes
+BYTES_CODE = 0
+BYTE_CODE = 1
+BOOL_CODE = 2
+INT_CODE = 3
+LONG_CODE = 4
+FLOAT_CODE = 5
+DOUBLE_CODE = 6
+STRING_CODE = 7
+VECTOR_CODE = 8
+LIST_CODE = 9
+MAP_CODE = 10
+LIST_END_CODE = 255
+
+_BYTE = struct.Struct(">b")
+_INT = struct.Struct(">i")
+_LONG = struct.Struct(">q")
+_FLOAT = struct.Struct(">f")
+_DOUBLE = struct.Struct(">d")
+_TYPE_AND_INT = struct.Struct(">Bi")
+_TYPE_AND_LONG = struct.Struct(">Bq")
+_TYPE_AND_DOUBLE = struct.Struct(">Bd")
+
+_INT_MIN = -2 ** 31
+_INT_MAX = 2 ** 31 - 1
+
+
+class _TruncatedBufferError(Exception):
+    """
+    Raised when the buffer ends in the middle of an object, and more data should be read before decoding it.
+    """
+
+
+def encode_typed_bytes(obj: Any) -> bytes:
+    """
+    :return: the typed bytes representation of the given python object.
+    Integers are encoded as int when possible and as long otherwise, floats as double, and sequences as vectors.
+    """
+    if isinstance(obj, str):
+        encoded = obj.encode()
+        return _TYPE_AND_INT.pack(STRING_CODE, len(encoded)) + encoded
+    if isinstance(obj, bool):
+        return bytes((BOOL_CODE, obj))
+    if isinstance(obj, int):
+        if _INT_MIN <= obj <= _INT_MAX:
+            return _TYPE_AND_INT.pack(INT_CODE, obj)
+        return _TYPE_AND_LONG.pack(LONG_CODE, obj)
+    if isinstance(obj, float):
+        return _TYPE_AND_DOUBLE.pack(DOUBLE_CODE, obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return _TYPE_AND_INT.pack(BYTES_CODE, len(obj)) + bytes(obj)
+    if isinstance(obj, (list, tuple)):
+        return _TYPE_AND_INT.pack(VECTOR_CODE, len(obj)) + b"".join(encode_typed_bytes(item) for item in obj)
+    if isinstance(obj, dict):
+        return _TYPE_AND_INT.pack(MAP_CODE, len(obj)) + b"".join(
+            encode_typed_bytes(key) + encode_typed_bytes(value) for key, value in obj.items()
+        )
+
+    raise TypeError(f"Cannot encode object of type {type(obj).__name__} as typed bytes")
+
+
+def _decode_sized(buffer: bytes, offset: int) -> Tuple[int, int]:
+    """
+    :return: the start and end offsets of the payload of a length-prefixed object (given the offset of its length)
+    """
+    length, = _INT.unpack_from(buffer, offset)
+    start = offset + 4
+    end = start + length
+    if end > len(buffer):
+        raise _TruncatedBufferError()
+    return start, end
+
+
+def decode_typed_bytes(buffer: bytes, offset: int = 0) -> Tuple[Any, int]:
+    """
+    Decodes a single typed bytes object from the buffer, starting at the given offset.
+    :return: the decoded object and the offset right after it.
+    :raises _TruncatedBufferError, IndexError or struct.error: if the buffer ends in the middle of the object.
+    """
+    type_code = buffer[offset]
+    offset += 1
+
+    if type_code == STRING_CODE:
+        start, end = _decode_sized(buffer, offset)
+        return buffer[start:end].decode(), end
+    if type_code == INT_CODE:
+        return _INT.unpack_from(buffer, offset)[0], offset + 4
+    if type_code == LONG_CODE:
+        return _LONG.unpack_from(buffer, offset)[0], offset + 8
+    if type_code == DOUBLE_CODE:
+        return _DOUBLE.unpack_from(buffer, offset)[0], offset + 8
+    if type_code == FLOAT_CODE:
+        return _FLOAT.unpack_from(buffer, offset)[0], offset + 4
+    if type_code == BOOL_CODE:
+        return buffer[offset] != 0, offset + 1
+    if type_code == BYTE_CODE:
+        return _BYTE.unpack_from(buffer, offset)[0], offset + 1
+    if type_code == BYTES_CODE:
+        start, end = _decode_sized(buffer, offset)
+        return buffer[start:end], end
+    if type_code == VECTOR_CODE:
+        length, = _INT.unpack_from(buffer, offset)
+        offset += 4
+        items = []
+        for _ in range(length):
+            item, offset = decode_typed_bytes(buffer, offset)
+            items.append(item)
+        return items, offset
+    if type_code == LIST_CODE:
+        items = []
+        while buffer[offset] != LIST_END_CODE:
+            item, offset = decode_typed_bytes(buffer, offset)
+            items.append(item)
+        return items, offset + 1
+    if type_code == MAP_CODE:
+        length, = _INT.unpack_from(buffer, offset)
+        offset += 4
+        items = {}
+        for _ in range(length):
+            key, offset = decode_typed_bytes(buffer, offset)
+            items[key], offset = decode_typed_bytes(buffer, offset)
+        return items, offset
+
+    raise ValueError(f"Unsupported typed bytes type code: {type_code}")
+
+
+def _iterate_buffered(stream: BinaryIO, decode_step: Callable[[bytes, int], Tuple[Any, int]]) -> Iterator[Any]:
+    """
+    Reads the stream in large chunks, and yields the items decoded by `decode_step` one after the other.
+    Items that cross the boundary of a chunk are decoded again once the next chunk arrives.
+    """
+    buffer = b""
+    offset = 0
+    while True:
+        try:
+            item, offset_after_item = decode_step(buffer, offset)
+        except (_TruncatedBufferError, IndexError, struct.error):
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                if offset < len(buffer):
+                    raise EOFError("Typed bytes stream ended in the middle of a record")
+                return
+            buffer = buffer[offset:] + chunk
+            offset = 0
+            continue
+
+        yield item
+        offset = offset_after_item
+
+
+def iterate_blocks(stream: BinaryIO, block_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Reads the stream in large chunks, and yields blocks that consist of complete lines only
+    (the last block may lack a trailing newline).
+    """
+    leftover = b""
+    while True:
+        chunk = stream.read(block_size)
+        if not chunk:
+            if leftover:
+                yield leftover
+            return
+
+        last_newline = chunk.rfind(b"\n")
+        if last_newline == -1:
+            leftover += chunk
+            continue
+
+        yield leftover + chunk[:last_newline + 1]
+        leftover = chunk[last_newline + 1:]
+
+
+def iterate_lines(stream: BinaryIO) -> Iterator[str]:
+    """
+    Reads the stream in large chunks, and yields its decoded lines (without the trailing newline).
+    """
+    for block in iterate_blocks(stream):
+        lines = block.decode().split("\n")
+        if block.endswith(b"\n"):
+            lines.pop()
+        yield from lines
+
+
+def _decode_record(buffer: bytes, offset: int) -> Tuple[Tuple[Any, Any], int]:
+    # Fast path for the most common records of our scripts (a string key with an int value)
+    if buffer[offset] == STRING_CODE:
+        _, length = _TYPE_AND_INT.unpack_from(buffer, offset)
+        key_end = offset + 5 + length
+        if buffer[key_end] == INT_CODE:
+            return (buffer[offset + 5:key_end].decode(), _INT.unpack_from(buffer, key_end + 1)[0]), key_end + 5
+
+    key, offset = decode_typed_bytes(buffer, offset)
+    value, offset = decode_typed_bytes(buffer, offset)
+    return (key, value), offset
+
+
+def _decode_raw_record(buffer: bytes, offset: int) -> Tuple[Tuple[bytes, bytes], int]:
+    _, key_end = decode_typed_bytes(buffer, offset)
+    _, record_end = decode_typed_bytes(buffer, key_end)
+    return (buffer[offset:key_end], buffer[offset:record_end]), record_end
+
+
+class TextCodec:
+    """
+    The default Hadoop streaming format: a line per record, where the key and the value are separated by a tab.
+    """
+    name = TEXT
+
+    @staticmethod
+    def encode_record(key: Any, value: Any) -> bytes:
+        if isinstance(value, (list, tuple)):
+            value = "\t".join(map(str, value))
+        return f"{key}\t{value}\n".encode()
+
+    def write_record(self, out: BinaryIO, key: Any, value: Any):
+        out.write(self.encode_record(key, value))
+
+    @staticmethod
+    def read_records(
+            stream: BinaryIO,
+            parse_text_value: Optional[Callable[[str], Any]] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Yields (key, value) pairs. Lines without a tab are skipped.
+        If `parse_text_value` is given, it converts the value, and records it fails to parse (raising ValueError)
+        are silently discarded.
+        """
+        for line in iterate_lines(stream):
+            key, separator, value = line.strip().partition("\t")
+            if not separator:
+                continue
+            if parse_text_value is not None:
+                try:
+                    value = parse_text_value(value)
+                except ValueError:
+                    continue
+            yield key, value
+
+    @staticmethod
+    def read_raw_records(stream: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        Yields (encoded key, encoded record) pairs, without decoding the records (used for sorting and partitioning).
+        """
+        for block in iterate_blocks(stream):
+            lines = block.split(b"\n")
+            if block.endswith(b"\n"):
+                lines.pop()
+            for line in lines:
+                yield line.split(b"\t", 1)[0], line + b"\n"
+
+
+class TypedBytesCodec:
+    """
+    Hadoop streaming's typed bytes format: each record is a typed key object followed by a typed value object.
+    """
+    name = TYPED_BYTES
+
+    @staticmethod
+    def encode_record(key: Any, value: Any) -> bytes:
+        # Fast path for the most common records of our scripts (a string key with an int value)
+        if type(key) is str and type(value) is int and _INT_MIN <= value <= _INT_MAX:
+            encoded_key = key.encode()
+            return (
+                _TYPE_AND_INT.pack(STRING_CODE, len(encoded_key)) + encoded_key +
+                _TYPE_AND_INT.pack(INT_CODE, value)
+            )
+        return encode_typed_bytes(key) + encode_typed_bytes(value)
+
+    def write_record(self, out: BinaryIO, key: Any, value: Any):
+        out.write(self.encode_record(key, value))
+
+    @staticmethod
+    def read_records(
+            stream: BinaryIO,
+            parse_text_value: Optional[Callable[[str], Any]] = None
+    ) -> Iterator[Tuple[Any, Any]]:
+        """
+        Yields (key, value) pairs. Values are already typed, so `parse_text_value` is ignored.
+        """
+        return _iterate_buffered(stream, _decode_record)
+
+    @staticmethod
+    def read_raw_records(stream: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        Yields (encoded key, encoded record) pairs, without decoding the records (used for sorting and partitioning).
+        """
+        return _iterate_buffered(stream, _decode_raw_record)
+
+
+CODECS = {codec.name: codec for codec in (TextCodec(), TypedBytesCodec())}
+
+
+def get_codec(format_name: str):
+    try:
+        return CODECS[format_name]
+    except KeyError:
+        raise ValueError(f"Unsupported streaming format: '{format_name}'. Options: {', '.join(CODECS)}")
+
+
+def map_output_codec():
+    """
+    :return: the codec that should be used for writing map output records, as configured for the current job.
+    """
+    return get_codec(os.environ.get(MAP_OUTPUT_ENVIRONMENT_VARIABLE, TEXT))
+
+
+def reduce_input_codec():
+    """
+    :return: the codec that should be used for reading reduce input records, as configured for the current job.
+    """
+    return get_codec(os.environ.get(REDUCE_INPUT_ENVIRONMENT_VARIABLE, TEXT))
@@ -0,0 +1,119 @@
+"""
+A shared runtime for the bundled streaming mappers and reducers.
+
+Iterating sys.stdin line by line and calling print() for every record costs a readline, several str allocations and a
+write call per record. Instead, this module:
+- reads sys.stdin.buffer in large blocks of complete lines (mappers can split a whole block at once).
+- groups the sorted reduce input by key, so reducers do not have to juggle the "current key" state themselves.
+- writes all output through a single large buffer.
+
+The intermediate records are encoded and decoded by the codec selected for the job (see streaming_codec.py).
+"""
+import os
+import sys
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Callable, Iterator, Optional, Tuple, Iterable
+
+from streaming_codec import iterate_blocks, iterate_lines, map_output_codec, reduce_input_codec
+
+OUTPUT_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+def read_blocks() -> Iterator[str]:
+    """
+    Yields the standard input as large decoded blocks that consist of complete lines.
+    """
+    for block in iterate_blocks(sys.stdin.buffer):
+        yield block.decode()
+
+
+def read_lines() -> Iterator[str]:
+    """
+    Yields the lines of the standard input (without the trailing newline), read in large blocks.
+    """
+    return iterate_lines(sys.stdin.buffer)
+
+
+def read_records(parse_text_value: Optional[Callable[[str], Any]] = None) -> Iterator[Tuple[Any, Any]]:
+    """
+    Yields the (key, value) records of the reduce input, decoded according to the intermediate format of the job.
+    In text mode, `parse_text_value` converts each value, and records it fails to parse are silently discarded.
+    """
+    return reduce_input_codec().read_records(sys.stdin.buffer, parse_text_value=parse_text_value)
+
+
+def group_by_key(records: Iterable[Tuple[Any, Any]]) -> Iterator[Tuple[Any, Iterator[Any]]]:
+    """
+    Yields (key, values) pairs, where `values` iterates over the values of all consecutive records with that key.
+    This only works because Hadoop sorts the reduce input by key.
+    """
+    get_value = itemgetter(1)
+    for key, group in groupby(records, key=itemgetter(0)):
+        yield key, map(get_value, group)
+
+
+class OutputBuffer:
+    """
+    Writes the output of a mapper / reducer through a single large buffer.
+    Should be used as a context manager, so the buffer is flushed at the end:
+
+        with OutputBuffer() as output:
+            output.emit(key, value)
+    """
+
+    def __init__(self, buffer_size: int = OUTPUT_BUFFER_SIZE):
+        self._file = open(sys.stdout.fileno(), "wb", buffering=buffer_size, closefd=False)
+        self._codec = map_output_codec()
+        self.write = self._file.write
+
+    def emit(self, key: Any, value: Any):
+        """
+        Writes an intermediate (map output) record, encoded according to the intermediate format of the job.
+        """
+        self.write(self._codec.encode_record(key, value))
+
+    def emit_many(self, records: Iterable[Tuple[Any, Any]]):
+        encode_record = self._codec.encode_record
+        self.write(b"".join(encode_record(key, value) for key, value in records))
+
+    def write_line(self, line: str):
+        """
+        Writes a final (reduce output) line of text.
+        """
+        self.write(f"{line}\n".encode())
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "OutputBuffer":
+        # Flush anything written to sys.stdout directly before this buffer, so the output keeps its order
+        sys.stdout.flush()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def report_counter(group: str, counter: str, amount: int):
+    """
+    Hadoop streaming turns these stderr lines into job counters.
+    """
+    sys.stderr.write(f"reporter:counter:{group},{counter},{amount}\n")
+
+
+def report_status(status: str):
+    """
+    Hadoop streaming turns these stderr lines into the status of the task.
+    """
+    sys.stderr.write(f"reporter:status:{status}\n")
+
+
+def get_environment_flag(name: str, default: bool = False) -> bool:
+    """
+    :return: the value of a boolean environment variable (passed to the scripts using -cmdenv)
+    """
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes")
@@ -0,0 +1,196 @@
+"""
+Sends the scanner triggers to all the receivers at once, without starting a new Python interpreter for every trigger
+(see TriggerTransport.IN_PROCESS in trigger_sender.py).
+
+The triggers are still sent by scanner_trigger.trigger_sender (from the Scanner repository), so they speak the
+receivers' protocol. A pool of worker processes, one per receiver, runs the sender in-process whenever a trigger is
+sent: the same command line as the sender's process, but for a single receiver. The workers are started once, and
+compile the sender (and import its dependencies) on their first trigger. They are processes rather than threads,
+since the sender reads its arguments from sys.argv.
+The sends to all receivers run at once (asyncio.gather), each with its own timeout and retries. The start time and
+the duration of every send are recorded, so the skew between the nodes can be measured.
+See trigger_receiver_stub.py for running a receiver with a fake scanner, for tests.
+"""
+import asyncio
+import importlib.util
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib.machinery import ModuleSpec
+from types import CodeType
+from typing import List, Optional, Sequence, Tuple
+
+from pydantic import BaseModel
+
+DEFAULT_TRIGGER_TIMEOUT_SECONDS = 10.0
+DEFAULT_TRIGGER_RETRIES = 1
+DEFAULT_TRIGGER_RETRY_DELAY_SECONDS = 0.5
+RECEIVERS_ADDRESSES_FLAG = "--receivers_addresses"
+
+# The sender, compiled by every worker on its first trigger
+_sender_spec: Optional[ModuleSpec] = None
+_sender_code: Optional[CodeType] = None
+
+
+def _load_sender(scanner_path: str, module: str):
+    global _sender_spec, _sender_code
+    if scanner_path not in sys.path:
+        sys.path.insert(0, scanner_path)
+    spec = importlib.util.find_spec(module)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {module!r} (in {scanner_path})")
+    _sender_code = spec.loader.get_code(module)
+    _sender_spec = spec
+
+
+def _send_to_receiver(scanner_path: str, module: str, arguments: List[str]) -> Tuple[float, float]:
+    """
+    Runs the sender in this worker, like `python -m <module> <arguments>` does.
+    :return: when the send started (time.time()), and how long it took in seconds
+    :raises RuntimeError: if the sender exited with an error
+    """
+    if _sender_code is None:
+        _load_sender(scanner_path, module)
+
+    sys.argv = [_sender_spec.origin, *arguments]
+    namespace = {
+        "__name__": "__main__",
+        "__file__": _sender_spec.origin,
+        "__package__": _sender_spec.parent,
+        "__spec__": _sender_spec,
+        "__loader__": _sender_spec.loader,
+    }
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        exec(_sender_code, namespace)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            raise RuntimeError(f"{module} exited with code {e.code}") from None
+    return started_at, time.perf_counter() - start
+
+
+class ReceiverSend(BaseModel):
+    address: str
+    succeeded: bool
+    attempts: int
+    sent_at: Optional[float] = None  # time.time() when the successful attempt started
+    latency_seconds: Optional[float] = None  # how long the successful attempt took
+    error: Optional[str] = None
+
+    @property
+    def delivered_at(self) -> Optional[float]:
+        return self.sent_at + self.latency_seconds if self.succeeded else None
+
+
+class TriggerBroadcast(BaseModel):
+    action: str
+    sends: List[ReceiverSend]
+
+    @property
+    def succeeded(self) -> bool:
+        return all(send.succeeded for send in self.sends)
+
+    @property
+    def failed_addresses(self) -> List[str]:
+        return [send.address for send in self.sends if not send.succeeded]
+
+    @property
+    def skew_seconds(self) -> Optional[float]:
+        """
+        :return: the time between the first and the last delivery
+        """
+        delivery_times = [send.delivered_at for send in self.sends if send.succeeded]
+        return max(delivery_times) - min(delivery_times) if delivery_times else None
+
+    def summary(self) -> str:
+        number_of_delivered = len(self.sends) - len(self.failed_addresses)
+        header = f"{self.action} reached {number_of_delivered} / {len(self.sends)} receivers"
+        if self.skew_seconds is not None:
+            header += f" (skew: {self.skew_seconds * 1000:.1f} ms)"
+        lines = [header]
+        for send in self.sends:
+            if send.succeeded:
+                lines.append(f"  {send.address}: {send.latency_seconds * 1000:.1f} ms ({send.attempts} attempts)")
+            else:
+                lines.append(f"  {send.address}: failed after {send.attempts} attempts ({send.error})")
+        return "\n".join(lines)
+
+
+def format_skews(broadcasts: Sequence[TriggerBroadcast]) -> str:
+    """
+    :return: the skew between the nodes of every action, over all of its broadcasts
+    """
+    lines = ["Trigger skew between the nodes:"]
+    for action in dict.fromkeys(broadcast.action for broadcast in broadcasts):
+        skews = [
+            broadcast.skew_seconds * 1000 for broadcast in broadcasts
+            if broadcast.action == action and broadcast.skew_seconds is not None
+        ]
+        if skews:
+            lines.append(
+                f"  {action}: mean {sum(skews) / len(skews):.1f} ms, max {max(skews):.1f} ms ({len(skews)} triggers)"
+            )
+    return "\n".join(lines)
+
+
+class InProcessTriggerClient:
+    """
+    Keeps a worker process per receiver, until close().
+    The workers run the current interpreter, which should be the one of the Scanner's virtual environment (like the
+    experiments in the images).
+    """
+
+    def __init__(
+            self,
+            addresses: Sequence[str],
+            scanner_path: str,
+            module: str,
+            timeout_seconds: float = DEFAULT_TRIGGER_TIMEOUT_SECONDS,
+            retries: int = DEFAULT_TRIGGER_RETRIES,
+            retry_delay_seconds: float = DEFAULT_TRIGGER_RETRY_DELAY_SECONDS,
+    ):
+        self.addresses = list(addresses)
+        self.scanner_path = scanner_path
+        self.module = module
+        self.timeout_seconds = timeout_seconds
+        self.retries = retries
+        self.retry_delay_seconds = retry_delay_seconds
+        # Spawned rather than forked, since the experiments process runs threads (e.g., the job monitor)
+        self._pool = multiprocessing.get_context("spawn").Pool(len(self.addresses))
+
+    async def _send(self, address: str, arguments: List[str]) -> ReceiverSend:
+        error = None
+        for attempt in range(1, self.retries + 2):
+            result = self._pool.apply_async(
+                _send_to_receiver, (self.scanner_path, self.module, [*arguments, RECEIVERS_ADDRESSES_FLAG, address])
+            )
+            try:
+                sent_at, latency_seconds = await asyncio.to_thread(result.get, self.timeout_seconds)
+                return ReceiverSend(
+                    address=address, succeeded=True, attempts=attempt, sent_at=sent_at, latency_seconds=latency_seconds
+                )
+            # Any error of the sender, or multiprocessing.TimeoutError (the worker keeps running the timed out send)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                if attempt <= self.retries:
+                    await asyncio.sleep(self.retry_delay_seconds)
+        return ReceiverSend(address=address, succeeded=False, attempts=self.retries + 1, error=error)
+
+    async def _broadcast(self, action: str, arguments: List[str]) -> TriggerBroadcast:
+        # A thread per receiver waits for its worker, so no send waits for another
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(len(self.addresses)))
+        sends = await asyncio.gather(*(self._send(address, arguments) for address in self.addresses))
+        return TriggerBroadcast(action=action, sends=list(sends))
+
+    def broadcast(self, action: str, arguments: List[str]) -> TriggerBroadcast:
+        """
+        Sends the trigger to all receivers at once, and waits for all of them to succeed (or fail).
+        :param arguments: the command line arguments of the sender, without the receivers' addresses
+        """
+        return asyncio.run(self._broadcast(action, arguments))
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
@@ -0,0 +1,84 @@
+"""
+A scanner trigger receiver with a fake scanner, for testing the triggers (and the experiments) without measuring.
+
+It runs the receiver of the Scanner repository, scanner_trigger.trigger_receiver, so it speaks the real protocol of
+the triggers. The scanner program it starts and stops is this script itself, which only appends to a log when it is
+started (with its arguments) and when it is stopped:
+    {"event": "started", "time": 1700000000.123, "pid": 1234, "arguments": [...]}
+    {"event": "stopped", "time": 1700000010.456, "pid": 1234}
+Comparing the start times of the fake scanners of several nodes measures the skew of the start triggers.
+
+Usage (instead of the receiver of run.sh, with the Scanner's virtual environment):
+    python3 trigger_receiver_stub.py [--log_path /tmp/fake_scanner.jsonl] [--scanner_repository <path>]
+                                     [-- <arguments of the receiver>]
+    python3 automatic_experiments.py ...  (with a TriggerSender(transport=TriggerTransport.IN_PROCESS) of its address)
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser, REMAINDER
+from pathlib import Path
+
+SCANNER_PATH = "/green_security_measurements/Scanner"
+RECEIVER_MODULE = "scanner_trigger.trigger_receiver"
+DEFAULT_LOG_PATH = Path("/tmp/fake_scanner.jsonl")
+# Set by the stub for the receiver, whose scanner processes inherit it: when it is set, this script is the scanner
+FAKE_SCANNER_LOG_ENV = "FAKE_SCANNER_LOG"
+
+
+def append_event(log_path: Path, event: dict):
+    with log_path.open("a") as log_file:
+        log_file.write(json.dumps(event) + "\n")
+
+
+def run_fake_scanner(log_path: Path):
+    """
+    Logs its start, and waits until it is stopped (SIGTERM or SIGINT).
+    """
+    def stop(signal_number, frame):
+        append_event(log_path, {"event": "stopped", "time": time.time(), "pid": os.getpid()})
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    append_event(log_path, {"event": "started", "time": time.time(), "pid": os.getpid(), "arguments": sys.argv[1:]})
+    while True:
+        signal.pause()
+
+
+def run_receiver(log_path: Path, receiver_arguments: list, scanner_repository: str = SCANNER_PATH) -> int:
+    """
+    Runs the real receiver, where the scanner is this script.
+    :return: the exit code of the receiver
+    """
+    if receiver_arguments[:1] == ["--"]:
+        receiver_arguments = receiver_arguments[1:]
+    command = [
+        sys.executable, "-m", RECEIVER_MODULE,
+        f"--python_path={sys.executable}",
+        f"--scanner_path={Path(__file__).resolve()}",
+        *receiver_arguments,
+    ]
+    environment = {
+        **os.environ,
+        "PYTHONPATH": scanner_repository,
+        FAKE_SCANNER_LOG_ENV: str(log_path.resolve()),
+    }
+    print(f"Running the receiver with a fake scanner, which logs to {log_path}")
+    return subprocess.run(command, env=environment).returncode
+
+
+if __name__ == "__main__":
+    if FAKE_SCANNER_LOG_ENV in os.environ:
+        run_fake_scanner(Path(os.environ[FAKE_SCANNER_LOG_ENV]))
+
+    parser = ArgumentParser(description="A scanner trigger receiver with a fake scanner")
+    parser.add_argument("--log_path", type=Path, default=DEFAULT_LOG_PATH)
+    parser.add_argument("--scanner_repository", type=str, default=SCANNER_PATH, help="Where scanner_trigger is")
+    parser.add_argument("receiver_arguments", nargs=REMAINDER, help="Passed to scanner_trigger.trigger_receiver")
+    args = parser.parse_args()
+
+    sys.exit(run_receiver(args.log_path, args.receiver_arguments, args.scanner_repository))
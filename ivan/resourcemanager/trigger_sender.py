@@ -1,9 +1,17 @@
+import logging
 import os
 import subprocess
 from enum import Enum
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field, PrivateAttr
+from case_insensitive_enum import CaseInsensitiveEnum
 from hadoop_job_config import HadoopJobConfig
+from trigger_client import (
+    DEFAULT_TRIGGER_RETRIES, DEFAULT_TRIGGER_TIMEOUT_SECONDS, format_skews, InProcessTriggerClient,
+    RECEIVERS_ADDRESSES_FLAG, TriggerBroadcast
+)
+
+logger = logging.getLogger(__name__)
 
 
 class TriggerAction(str, Enum):
@@ -12,6 +20,13 @@ class TriggerAction(str, Enum):
     STOP_PROGRAM = "stop_program"
 
 
+class TriggerTransport(CaseInsensitiveEnum):
+    # A new `scanner_trigger.trigger_sender` process for every trigger, which messages the receivers one by one
+    SUBPROCESS = "subprocess"
+    # scanner_trigger.trigger_sender runs in warm worker processes, for all receivers at once (see trigger_client.py)
+    IN_PROCESS = "in_process"
+
+
 class TriggerSender(BaseModel):
     session_id_prefix: str = Field("", description="Control the session id sent to the scanner")
     number_of_datanodes: int = Field(3, gt=0, description="number of hadoop_workers")
@@ -23,9 +38,18 @@ class TriggerSender(BaseModel):
     datanode_prefix: str = Field("datanode", description="Hostname prefix for each DataNode")
     datanode_port: int = Field(65432, description="Port for each DataNode")
 
+    transport: TriggerTransport = Field(TriggerTransport.SUBPROCESS, description="How the triggers are sent")
+    timeout_seconds: float = Field(
+        DEFAULT_TRIGGER_TIMEOUT_SECONDS, gt=0, description="Per-receiver timeout of the in-process transport"
+    )
+    retries: int = Field(DEFAULT_TRIGGER_RETRIES, ge=0, description="Per-receiver retries of the in-process transport")
+
     _python_path: str = PrivateAttr("/green_security_measurements/green_security_venv/bin/python")
     _module: str = PrivateAttr("scanner_trigger.trigger_sender")
     _env: dict = PrivateAttr({"PYTHONPATH": "/green_security_measurements/Scanner"})
+    _client: Optional[InProcessTriggerClient] = PrivateAttr(None)
+    # The per-receiver send times of every trigger sent by the in-process transport
+    _broadcasts: List[TriggerBroadcast] = PrivateAttr(default_factory=list)
 
     @property
     def datanodes_urls(self) -> List[str]:
@@ -37,23 +61,35 @@ class TriggerSender(BaseModel):
     def get_receivers_addresses(self) -> List[str]:
         return [self.resource_manager_url, self.namenode_url, self.history_server_url, *self.datanodes_urls]
 
+    @property
+    def broadcasts(self) -> List[TriggerBroadcast]:
+        return self._broadcasts
+
+    def _build_arguments(self, action: TriggerAction, *, session_id: Optional[str] = None) -> List[str]:
+        """
+        :return: the arguments of scanner_trigger.trigger_sender, without the receivers' addresses
+        """
+        arguments = [action.value]
+
+        full_session_id = self.session_id_prefix
+        if session_id:
+            full_session_id += f":{session_id}" if self.session_id_prefix else session_id
+
+        if full_session_id:
+            arguments.extend(["--session_id", f"{full_session_id}"])
+
+        return arguments
+
     # TODO: remove function when unifying repos
     def _build_cmd(self, action: TriggerAction, *, session_id: Optional[str] = None):
         cmd = [
             self._python_path,
             "-m",
             self._module,
-            action,
+            *self._build_arguments(action, session_id=session_id),
         ]
 
-        full_session_id = self.session_id_prefix
-        if session_id:
-            full_session_id += f":{session_id}" if self.session_id_prefix else session_id
-
-        if full_session_id:
-            cmd.extend(["--session_id", f"{full_session_id}"])
-
-        cmd.extend(["--receivers_addresses", ",".join(self.get_receivers_addresses())])
+        cmd.extend([RECEIVERS_ADDRESSES_FLAG, ",".join(self.get_receivers_addresses())])
 
         return cmd
 
@@ -68,12 +104,48 @@ class TriggerSender(BaseModel):
 
     # TODO: unify this functionality with scanner_trigger from the other repo
     def _run_trigger(self, action: TriggerAction, *, session_id: Optional[str] = None):
+        if self.transport == TriggerTransport.IN_PROCESS:
+            self._broadcast_trigger(action, session_id=session_id)
+            return
+
         subprocess.run(
             self._build_cmd(action, session_id=session_id),
             env={**os.environ, **self._env},
             check=True
         )
 
+    def _broadcast_trigger(self, action: TriggerAction, *, session_id: Optional[str] = None):
+        if self._client is None:
+            self._client = InProcessTriggerClient(
+                self.get_receivers_addresses(),
+                scanner_path=self._env["PYTHONPATH"],
+                module=self._module,
+                timeout_seconds=self.timeout_seconds,
+                retries=self.retries,
+            )
+        broadcast = self._client.broadcast(action.value, self._build_arguments(action, session_id=session_id))
+        self._broadcasts.append(broadcast)
+        logger.info(broadcast.summary())
+        # Like check=True of the subprocess transport
+        if not broadcast.succeeded:
+            raise ConnectionError(
+                f"Could not send {action.value} to: {', '.join(broadcast.failed_addresses)}\n{broadcast.summary()}"
+            )
+
+    def skew_summary(self) -> Optional[str]:
+        """
+        :return: the skew between the nodes of the triggers sent by the in-process transport (None if there are none)
+        """
+        return format_skews(self._broadcasts) if self._broadcasts else None
+
+    def close(self):
+        """
+        Stops the workers of the in-process transport (if it was used).
+        """
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
     # TODO: unify this functionality with scanner_trigger from the other repo
     def start_measurement(self, *, session_id: Optional[str] = None):
         self._run_trigger(TriggerAction.START_MEASUREMENT, session_id=session_id)